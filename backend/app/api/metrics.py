@@ -0,0 +1,127 @@
+import asyncio
+import time
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.services.container import services
+from app.utils.metrics import metrics
+from app.utils.profiler import SamplingProfiler
+
+router = APIRouter()
+profiler = SamplingProfiler()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds",
+    "Seconds to handle an HTTP request, by method, route and status",
+    ["method", "route", "status"]
+)
+
+
+def _brain_stats(stats: str) -> dict:
+    """One of the BrainService stats reports, empty while brains are still warming up"""
+    if not services.built("brain_service"):
+        return {}
+    return getattr(services.brain_service, stats)()
+
+
+# Scrapes never build the brain services, they read zero until those exist
+metrics.gauge("brains_live", "Brains held by this process, resident or spilled", lambda: [
+    ({}, len(services.brain_service.bank) if services.built("brain_service") else 0)
+])
+metrics.gauge("brains_resident", "Brains held in RAM", lambda: [
+    ({}, _brain_stats("cache_stats").get('resident', 0))
+])
+metrics.gauge("brain_parameter_bytes", "Storage bytes of the parameters of every live brain", lambda: [
+    ({}, len(services.brain_service.bank) * services.brain_service.bank.bytes_per_brain
+     if services.built("brain_service") else 0)
+])
+metrics.gauge("ws_connections", "Open /ws connections", lambda: [
+    ({}, len(services.manager.channels))
+])
+metrics.counter("decision_cache_hits_total", "Decisions answered from the decision cache", lambda: [
+    ({}, _brain_stats("decision_cache_stats").get('hits', 0))
+])
+metrics.counter("decision_cache_misses_total", "Decisions the decision cache had to compute", lambda: [
+    ({}, _brain_stats("decision_cache_stats").get('misses', 0))
+])
+metrics.gauge("decision_cache_entries", "Decisions held by the decision cache", lambda: [
+    ({}, _brain_stats("decision_cache_stats").get('entries', 0))
+])
+
+def _route_label(scope) -> str:
+    """
+    Path template of the matched route, router prefixes included:
+    /api/entities/5 becomes /api/entities/{entity_id}
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = route.path_format
+    # Depending on the FastAPI version, routes of included routers keep their
+    # own path without the prefix; the prefix is the part of the request path
+    # before the segments the template matched
+    covered = template.count("/")
+    segments = scope["path"].split("/")
+    return "/".join(segments[:len(segments) - covered]) + template
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every HTTP request into http_request_seconds, labelled with the
+    route's path template so /api/entities/1 and /api/entities/2 share a
+    series and unknown paths cannot blow up the label count. WebSocket
+    traffic is timed per message in the /ws handler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started
+            HTTP_REQUEST_SECONDS.observe(seconds, scope["method"], _route_label(scope), str(status))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of latencies, brain counts and connections"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/debug/profile", response_class=PlainTextResponse)
+async def record_profile(seconds: float = 10.0, interval_ms: float = settings.PROFILER_INTERVAL_MS):
+    """
+    Sample every thread's stack for `seconds` and return folded stacks,
+    ready for flamegraph.pl or speedscope. Needs PROFILER_ENABLED.
+    """
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled, set PROFILER_ENABLED to allow it")
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"seconds must be in (0, {settings.PROFILER_MAX_SECONDS}]")
+    if interval_ms <= 0:
+        raise HTTPException(status_code=422, detail="interval_ms must be positive")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already being recorded")
+
+    profiler.interval = interval_ms / 1000.0
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stacks = profiler.stop()
+    return PlainTextResponse(stacks)
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import List
 from app.models.entity import EntityResponse
-from app.models.requests import DecisionRequest, ReproductionRequest, EntityCreateRequest
-from app.services.entity_service import EntityService
-from app.services.brain_service import BrainService
+from app.models.requests import (
+    DecisionRequest,
+    BatchDecisionRequest,
+    ReproductionRequest,
+    ReproductionBatchRequest,
+    EntityCreateRequest
+)
+from app.services.container import services
+from app.services.entity_service import entity_service
+from app.utils.fast_json import ORJSONResponse, request_body_openapi, validate_body
 
 router = APIRouter()
-entity_service = EntityService()
-brain_service = BrainService()
 
 @router.get("/", response_model=List[int])
 async def get_all_entities():
@@ -17,7 +22,7 @@ async def get_all_entities():
 @router.post("/", response_model=EntityResponse)
 async def create_entity(request: EntityCreateRequest):
     """Create a new entity"""
-    entity_id = len(entity_service.get_all_entity_ids()) + 1
+    entity_id = entity_service.new_entity_id()
     entity_data = {
         "id": entity_id,
         "x": request.x,
@@ -46,28 +51,66 @@ async def get_entity(entity_id: int):
     entity = entity_service.get_entity(entity_id)
     if not entity:
         raise HTTPException(status_code=404, detail="Entity not found")
-    return entity
+    return EntityResponse(
+        id=entity_id,
+        generation=entity['generation'],
+        energy=entity['energy'],
+        age=entity['age'],
+        society=entity['society_name'],
+        is_hybrid=entity['is_hybrid'],
+        children_count=len(entity.get('children_ids', []))
+    )
 
-@router.post("/decision")
-async def make_decision(request: DecisionRequest):
+# The hot routes read their own bodies, see app/utils/fast_json.py
+@router.post("/decision", response_class=ORJSONResponse, openapi_extra=request_body_openapi(DecisionRequest))
+async def make_decision(raw: Request):
     """Make a decision for an entity"""
-    result = await brain_service.process_decision(
+    request = validate_body(DecisionRequest, await raw.body())
+    result = await services.cluster_service.process_decision(
         entity_id=request.id,
         inputs=request.inputs,
         state=request.state
     )
-    return result
+    return ORJSONResponse(result)
+
+@router.post("/decisions", response_class=ORJSONResponse, openapi_extra=request_body_openapi(BatchDecisionRequest))
+async def make_decisions(raw: Request):
+    """Make decisions for a batch of entities"""
+    request = validate_body(BatchDecisionRequest, await raw.body())
+    if not (len(request.ids) == len(request.inputs) == len(request.states)):
+        raise HTTPException(status_code=422, detail="ids, inputs and states must have the same length")
+    result = await services.cluster_service.process_decisions(
+        entity_ids=request.ids,
+        inputs=request.inputs,
+        states=request.states
+    )
+    return ORJSONResponse(result)
 
 @router.post("/reproduce")
 async def reproduce(request: ReproductionRequest):
     """Create offspring from two parents"""
-    result = await brain_service.reproduce(
+    result = await services.cluster_service.reproduce(
         parent1_id=request.parent1_id,
         parent2_id=request.parent2_id,
         child_id=request.child_id
     )
     return result
 
+@router.post("/reproduce-batch", response_class=ORJSONResponse,
+             openapi_extra=request_body_openapi(ReproductionBatchRequest))
+async def reproduce_batch(raw: Request):
+    """Create many offspring at once, child i from parent1_ids[i] and parent2_ids[i]"""
+    request = validate_body(ReproductionBatchRequest, await raw.body())
+    if not (len(request.parent1_ids) == len(request.parent2_ids) == len(request.child_ids)):
+        raise HTTPException(status_code=422, detail="parent1_ids, parent2_ids and child_ids must have the same length")
+    result = await services.cluster_service.reproduce_batch(
+        parent1_ids=request.parent1_ids,
+        parent2_ids=request.parent2_ids,
+        child_ids=request.child_ids,
+        seed=request.seed
+    )
+    return ORJSONResponse(result)
+
 @router.delete("/{entity_id}")
 async def delete_entity(entity_id: int):
     """Remove an entity"""
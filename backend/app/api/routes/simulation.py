@@ -1,24 +1,29 @@
 from fastapi import APIRouter
-from app.services.entity_service import EntityService
-from app.models.requests import SimulationControlRequest
+from app.services.container import services
+from app.services.entity_service import entity_service
 
 router = APIRouter()
-entity_service = EntityService()
 
 @router.post("/start")
 async def start_simulation():
     """Start the simulation"""
-    return {"status": "started"}
+    services.simulation.start()
+    return {"status": "started", "tick": services.simulation.tick}
 
 @router.post("/pause")
 async def pause_simulation():
     """Pause the simulation"""
-    return {"status": "paused"}
+    await services.simulation.pause()
+    return {"status": "paused", "tick": services.simulation.tick}
 
 @router.post("/reset")
 async def reset_simulation():
-    """Reset the simulation"""
+    """Reset the simulation: entities, brains, their memories and cached decisions"""
+    await services.simulation.pause()
     entity_service.clear_all()
+    services.brain_service.reset()
+    services.simulation.vision_service.clear()
+    services.simulation.reset()
     return {"status": "reset"}
 
 @router.get("/status")
@@ -26,5 +31,5 @@ async def get_status():
     """Get current simulation status"""
     return {
         "total_entities": len(entity_service.get_all_entity_ids()),
-        "running": True
-    }
\ No newline at end of file
+        **services.simulation.status()
+    }
@@ -1,20 +1,65 @@
-from fastapi import APIRouter
-from app.services.statistics_services import StatisticsService
+from fastapi import APIRouter, HTTPException
+from app.services.container import services
+from app.config import settings
 
 router = APIRouter()
-stats_service = StatisticsService()
 
 @router.get("/")
 async def get_statistics():
     """Get overall simulation statistics"""
-    return stats_service.get_overall_stats()
+    return services.stats_service.get_overall_stats()
 
 @router.get("/societies")
 async def get_society_stats():
     """Get per-society statistics"""
-    return stats_service.get_society_breakdown()
+    return services.stats_service.get_society_breakdown()
 
 @router.get("/evolution")
-async def get_evolution_stats():
-    """Get evolution metrics over time"""
-    return stats_service.get_evolution_metrics()
\ No newline at end of file
+async def get_evolution_stats(resolution: int = 0):
+    """Get evolution metrics over time, coarser resolutions cover longer history"""
+    return services.stats_service.get_evolution_metrics(resolution)
+
+@router.get("/precision")
+async def get_precision_report(storage_dtype: str = settings.BRAIN_STORAGE_DTYPE, brains: int = 256):
+    """Accuracy drift of reduced-precision brain storage against float32"""
+    # Needs torch, imported on first use
+    from app.core.brain_bank import precision_drift_report
+    try:
+        return precision_drift_report(storage_dtype, num_brains=brains, lowp_matmul=settings.BRAIN_LOWP_MATMUL)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/brain-cache")
+async def get_brain_cache_stats():
+    """Brains resident in RAM vs spilled to disk, with hit/miss/eviction counters"""
+    return services.brain_service.cache_stats()
+
+@router.get("/decision-batching")
+async def get_decision_batching_stats():
+    """Batch size and queueing latency histograms of cross-connection decision batching"""
+    return services.brain_service.batch_stats()
+
+@router.get("/decision-cache")
+async def get_decision_cache_stats():
+    """Hit rate, occupancy and quantization step of the decision cache"""
+    return services.brain_service.decision_cache_stats()
+
+@router.get("/memory")
+async def get_memory_stats():
+    """Entities remembered and size of the per-entity episodic memory"""
+    return services.brain_service.memory_stats()
+
+@router.get("/broadcast")
+async def get_broadcast_stats():
+    """Per-client outbound queue depth, coalesced and dropped broadcast messages"""
+    return services.manager.stats()
+
+@router.get("/cluster")
+async def get_cluster_stats():
+    """Node membership, brains held here, forwarded and migrated traffic"""
+    return services.cluster_service.stats()
+
+@router.get("/startup")
+async def get_startup_report():
+    """Seconds until the app accepted requests, and per step of warming up the brain services"""
+    return services.startup_report()
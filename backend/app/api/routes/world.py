@@ -1,22 +1,21 @@
 from fastapi import APIRouter, HTTPException
-from app.services.world_service import WorldService
-from app.models.requests import SaveWorldRequest, LoadWorldRequest
+from app.services.container import services
+from app.models.requests import SaveWorldRequest, LoadWorldRequest, SaveCheckpointRequest, LoadCheckpointRequest
 
 router = APIRouter()
-world_service = WorldService()
 
 @router.post("/save")
 async def save_world(request: SaveWorldRequest):
     """Save current world state"""
-    success = await world_service.save_world(request.world_state, request.filename)
-    if not success:
+    stats = await services.world_service.save_world(request.world_state, request.filename)
+    if not stats:
         raise HTTPException(status_code=500, detail="Failed to save world")
-    return {"status": "saved", "filename": request.filename}
+    return {"status": "saved", **stats}
 
 @router.post("/load")
 async def load_world(request: LoadWorldRequest):
     """Load a saved world state"""
-    world_state = await world_service.load_world(request.filename)
+    world_state = await services.world_service.load_world(request.filename)
     if not world_state:
         raise HTTPException(status_code=404, detail="World state not found")
     return world_state
@@ -24,5 +23,26 @@ async def load_world(request: LoadWorldRequest):
 @router.get("/saves")
 async def list_saves():
     """List all available save files"""
-    saves = world_service.list_saves()
-    return {"saves": saves}
\ No newline at end of file
+    saves = services.world_service.list_saves()
+    return {"saves": saves}
+
+@router.post("/checkpoints")
+async def save_checkpoint(request: SaveCheckpointRequest):
+    """Write an incremental checkpoint of the current world"""
+    stats = await services.world_service.save_checkpoint(request.world_state, request.name)
+    if not stats:
+        raise HTTPException(status_code=500, detail="Failed to save checkpoint")
+    return {"status": "saved", **stats}
+
+@router.post("/checkpoints/load")
+async def load_checkpoint(request: LoadCheckpointRequest):
+    """Restore the world from a checkpoint"""
+    world_state = await services.world_service.load_checkpoint(request.name)
+    if world_state is None:
+        raise HTTPException(status_code=404, detail="Checkpoint not found")
+    return world_state
+
+@router.get("/checkpoints")
+async def list_checkpoints():
+    """List checkpoints, oldest first"""
+    return {"checkpoints": services.world_service.list_checkpoints()}
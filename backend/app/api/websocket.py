@@ -1,53 +1,163 @@
+import json
+import time
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.utils.connection_manager import ConnectionManager
-from app.services.brain_service import BrainService
-from app.services.world_service import WorldService
+from app.utils.binary_protocol import (
+    PROTOCOL_VERSION,
+    decode_decision_request,
+    encode_decision_result
+)
+from app.core.decision_batcher import DECISION_PHASE_SECONDS
+from app.services.container import ServicesUnavailable, services
+from app.utils.metrics import metrics
 
 router = APIRouter()
-manager = ConnectionManager()
-brain_service = BrainService()
-world_service = WorldService()
+manager = services.manager
+vision_service = services.vision_service
+
+# Message types with their own latency series, anything else is counted as "unknown"
+MESSAGE_TYPES = {
+    "entity_decision", "entity_decisions_batch", "vision_update", "reproduce",
+    "reproduce_batch", "save_world", "load_world"
+}
+WS_MESSAGE_SECONDS = metrics.histogram(
+    "ws_message_seconds",
+    "Seconds to handle a /ws message, by message type",
+    ["type"]
+)
+
+async def handle_binary_decisions(websocket: WebSocket, frame: bytes):
+    """Answer a binary decision request frame with a binary result frame"""
+    entity_ids, inputs, states, sequence = decode_decision_request(frame)
+    ids = entity_ids.tolist()
+    if states is None:
+        states = vision_service.observe(ids)
+    # Frame views are read-only, torch needs its own writable copy of the inputs
+    action_index, target_x, target_y, has_target, probs = await services.cluster_service.decide(ids, inputs.copy(), states)
+    started = time.perf_counter()
+    frame = encode_decision_result(entity_ids, probs, action_index, target_x, target_y, has_target, sequence)
+    DECISION_PHASE_SECONDS.observe(time.perf_counter() - started, "serialize_binary")
+    await manager.send_bytes(frame, websocket)
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, protocol: str = "json"):
     await manager.connect(websocket)
+    # Clients opt into binary decision frames at connect time with /ws?protocol=binary,
+    # JSON messages keep working either way
+    binary = protocol == "binary"
+    # Replies go through the manager, which serializes them with this client's broadcasts
     
     try:
-        await websocket.send_json({
+        response = {
             "type": "connection_response",
-            "status": "connected"
-        })
+            "status": "connected",
+            "protocol": "binary" if binary else "json"
+        }
+        if binary:
+            response["binary_version"] = PROTOCOL_VERSION
+        await manager.send_personal_message(response, websocket)
         
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            started = time.perf_counter()
+            if message.get("bytes") is not None:
+                if not binary:
+                    await manager.send_personal_message(
+                        {"type": "error", "error": "Binary frames need /ws?protocol=binary"}, websocket
+                    )
+                    continue
+                try:
+                    await handle_binary_decisions(websocket, message["bytes"])
+                # Malformed frames and entities the server has no positions for
+                except ValueError as e:
+                    await manager.send_personal_message({"type": "error", "error": str(e)}, websocket)
+                WS_MESSAGE_SECONDS.observe(time.perf_counter() - started, "binary_decisions")
+                continue
+
+            data = json.loads(message["text"])
             message_type = data.get("type")
             
             if message_type == "entity_decision":
-                result = await brain_service.process_decision(
+                result = await services.cluster_service.process_decision(
                     entity_id=data['id'],
                     inputs=data['inputs'],
                     state=data['state']
                 )
-                await websocket.send_json(result)
+                await manager.send_personal_message(result, websocket)
+                
+            elif message_type == "entity_decisions_batch":
+                # Without client-side states, neighbours come from the server's spatial index
+                try:
+                    states = data.get('states') or vision_service.states(data['ids'])
+                except ValueError as e:
+                    await manager.send_personal_message({"type": "error", "error": str(e)}, websocket)
+                    continue
+                result = await services.cluster_service.process_decisions(
+                    entity_ids=data['ids'],
+                    inputs=data['inputs'],
+                    states=states
+                )
+                await manager.send_personal_message(result, websocket)
+                
+            elif message_type == "vision_update":
+                entities = data.get('entities', {})
+                resources = data.get('resources', {})
+                if entities.get('ids'):
+                    try:
+                        vision_service.update_entities(
+                            entities['ids'], entities['x'], entities['y'], entities.get('societies')
+                        )
+                    # Unknown society names
+                    except ValueError as e:
+                        await manager.send_personal_message({"type": "error", "error": str(e)}, websocket)
+                if resources.get('ids'):
+                    vision_service.update_resources(
+                        resources['ids'], resources['x'], resources['y'],
+                        resources.get('types'), resources.get('amounts')
+                    )
+                vision_service.remove_entities(data.get('removed_entities', []))
+                vision_service.remove_resources(data.get('removed_resources', []))
                 
             elif message_type == "reproduce":
-                result = await brain_service.reproduce(
+                result = await services.cluster_service.reproduce(
                     parent1_id=data['parent1_id'],
                     parent2_id=data['parent2_id'],
                     child_id=data['child_id']
                 )
-                await websocket.send_json(result)
+                await manager.send_personal_message(result, websocket)
+                
+            elif message_type == "reproduce_batch":
+                result = await services.cluster_service.reproduce_batch(
+                    parent1_ids=data['parent1_ids'],
+                    parent2_ids=data['parent2_ids'],
+                    child_ids=data['child_ids'],
+                    seed=data.get('seed')
+                )
+                await manager.send_personal_message(result, websocket)
                 
             elif message_type == "save_world":
-                result = await world_service.save_world(data.get('world_state', {}))
-                await websocket.send_json(result)
+                result = await services.world_service.save_world(data.get('world_state', {}))
+                # Completion is broadcast to every client, including this one
+                if result is None:
+                    await manager.send_personal_message({'type': 'world_saved', 'success': False}, websocket)
                 
             elif message_type == "load_world":
-                result = await world_service.load_world(data.get('filename'))
-                await websocket.send_json(result)
+                result = await services.world_service.load_world(data.get('filename'))
+                await manager.send_personal_message(result, websocket)
+
+            WS_MESSAGE_SECONDS.observe(
+                time.perf_counter() - started,
+                message_type if message_type in MESSAGE_TYPES else "unknown"
+            )
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+    except ServicesUnavailable as e:
+        # No brains to decide with, tell the client why before closing
+        await manager.send_personal_message({"type": "error", "error": str(e)}, websocket)
+        await manager.close(websocket, code=1011)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # API Settings
@@ -7,26 +7,67 @@ class Settings(BaseSettings):
     PORT: int = 8000
     DEBUG: bool = True
     
+    # Monitoring
+    PROFILER_ENABLED: bool = False  # Allow POST /debug/profile to record sampled stacks
+    PROFILER_INTERVAL_MS: float = 5.0  # Default time between stack samples
+    PROFILER_MAX_SECONDS: float = 60.0  # Longest recording window
+
     # CORS
     ALLOWED_ORIGINS: List[str] = ["*"]
     
     # Neural Network
     NN_INPUT_SIZE: int = 20
     NN_HIDDEN_SIZE: int = 64
-    NN_OUTPUT_SIZE: int = 10
+    NN_HIDDEN_LAYERS: int = 2
+    NN_HIDDEN_SIZES: List[int] = []  # Explicit layer widths, overrides HIDDEN_SIZE/HIDDEN_LAYERS
+    NN_OUTPUT_SIZE: int = 5  # One per action type
+    NN_LAYER_NORM: bool = True
+    NN_DROPOUT: float = 0.2
+    BRAIN_MEMORY_BUDGET_MB: float = 1024.0
+    BRAIN_STORAGE_DTYPE: str = "float32"  # float32, float16, bfloat16 or int8
+    BRAIN_LOWP_MATMUL: bool = False  # Run float16/bfloat16 matmuls natively instead of upcasting
+    BRAIN_HOT_SET_SIZE: int = 5000  # Brains kept in RAM, least recently used ones spill to disk; 0 keeps all in RAM
+    BRAIN_INFERENCE_WORKERS: int = 0  # Worker processes for CPU inference, entities sharded by ID; 0 runs it in-process
+    BRAIN_SHARD_RING_SLOTS: int = 4  # Chunks in flight per worker
+    BRAIN_SHARD_SLOT_ROWS: int = 1024  # Rows per chunk
+    DECISION_BATCH_MAX_SIZE: int = 4096  # Rows per batched forward pass across concurrent decision requests
+    DECISION_BATCH_MAX_WAIT_MS: float = 2.0  # Longest a request waits for others to join its batch, 0 only merges queued ones
+    BRAIN_EVAL_MODE: bool = False  # Run brains without dropout, so the same inputs always give the same decision
+    DECISION_CACHE_SIZE: int = 0  # Memoized decisions kept, least recently used go first; 0 disables, needs BRAIN_EVAL_MODE
+    DECISION_CACHE_QUANTUM: float = 0.01  # Inputs are rounded to this step for cache keys and for the forward pass
+    MEMORY_STEPS: int = 0  # Recent ticks each entity remembers (observation, action, reward); 0 disables
+    MEMORY_INPUT_STEPS: int = 0  # Remembered ticks appended to brain inputs, at most MEMORY_STEPS; changes the brain input size
+
+    # Cluster
+    CLUSTER_NODES: List[str] = []  # Node IDs sharing the brains, hashed by entity ID; empty runs a single node
+    CLUSTER_NODE_ID: str = ""  # This process's node, one of CLUSTER_NODES; empty claims the first one no other process holds
+    CLUSTER_SOCKET_DIR: str = "../data/cluster"  # Unix sockets the nodes of one host reach each other on
     
     # Genetics
     MUTATION_RATE: float = 0.15
     CROSSOVER_RATE: float = 0.7
+    GENETICS_SEED: Optional[int] = None  # Seed for crossover/mutation randomness, None seeds from the OS
     
     # Simulation
     MAX_ENTITIES: int = 5000
     RESOURCE_SPAWN_RATE: float = 0.2
+    SIM_TICK_RATE: float = 20.0  # Fixed timestep ticks per second
+    SIM_MAX_CATCHUP_TICKS: int = 5  # Ticks run back-to-back when behind, the rest are dropped
+    SIM_BROADCAST_EVERY: int = 2  # Broadcast world state every N ticks
+    BROADCAST_QUEUE_SIZE: int = 64  # Outbound messages queued per client; past it stale state updates are dropped, then the client
+    STATS_SAMPLE_EVERY: int = 20  # Record a statistics time series sample every N ticks
+    STATS_SAMPLE_INTERVAL: float = 1.0  # Seconds between samples while no simulation loop is sampling, 0 disables
     
     # Storage
     DATA_DIR: str = "../data"
     WORLD_STATES_DIR: str = "../data/world_states"
     NEURAL_MODELS_DIR: str = "../data/neural_models"
+    CHECKPOINTS_DIR: str = "../data/checkpoints"
+    CHECKPOINT_RETENTION: int = 10  # Newest checkpoints kept, older ones are pruned after each checkpoint
+    AUTOSAVE_INTERVAL: float = 300.0  # Seconds between background checkpoints, 0 disables
+    AUTOSAVE_RETENTION: int = 5  # Newest autosaves kept
+    BRAIN_SPILL_DIR: str = "../data/brain_spill"
+    SNAPSHOT_COMPRESSION: Optional[str] = None  # None or "zlib"; compressed snapshots cannot be memory-mapped
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,690 @@
+import itertools
+import math
+import numpy as np
+import torch
+import torch.nn.functional as F
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app.core.cold_store import ColdBrainStore, ColdView
+from app.core.neural_network import EntityBrain
+from app.core.quantization import (
+    resolve_storage_dtype,
+    is_quantized_param,
+    quantize_per_channel,
+    dequantize_per_channel,
+    storage_bytes
+)
+
+
+class BrainBank:
+    """
+    Population-wide brain store.
+
+    Every parameter of every brain lives in one stacked tensor per layer,
+    indexed by slot, so a forward pass for any subset of entities is a
+    single batched matmul per layer.
+
+    Weights can be stored as float32, float16, bfloat16 or per-channel int8.
+    Reads always hand back float32, so callers never see the storage format.
+
+    With max_resident set, only that many brains stay in the stacked tensors;
+    the least recently used ones are spilled to a memory-mapped file and
+    faulted back in when next asked for.
+    """
+
+    def __init__(
+        self,
+        template: EntityBrain,
+        device: torch.device,
+        capacity: int = 64,
+        storage_dtype: str = 'float32',
+        lowp_matmul: bool = False,
+        max_resident: int = 0,
+        spill_dir: Optional[str] = None
+    ):
+        self.device = device
+        self.brain_kwargs = template.config
+        self.shapes: Dict[str, torch.Size] = {
+            name: tensor.shape for name, tensor in template.state_dict().items()
+        }
+        self.dropout = template.dropout.p
+        self.training = True
+
+        self.storage_dtype = storage_dtype
+        dtype = resolve_storage_dtype(storage_dtype)
+        # Native fp16/bf16 matmuls only pay off where the hardware has them
+        self.compute_dtype = dtype if lowp_matmul and dtype in (torch.float16, torch.bfloat16) else torch.float32
+        self.dtypes: Dict[str, torch.dtype] = {}
+        for name, shape in self.shapes.items():
+            if is_quantized_param(name, shape, storage_dtype):
+                self.dtypes[name] = torch.int8
+            else:
+                self.dtypes[name] = torch.float32 if storage_dtype == 'int8' else dtype
+
+        # (linear name, norm name or None) in forward order, last one is the output layer
+        self.layers: List[Tuple[str, Optional[str]]] = []
+        index = 1
+        while f"fc{index}.weight" in self.shapes:
+            norm = f"ln{index}" if f"ln{index}.weight" in self.shapes else None
+            self.layers.append((f"fc{index}", norm))
+            index += 1
+
+        self.capacity = 0
+        self.params: Dict[str, torch.Tensor] = {
+            name: torch.empty((0, *shape), dtype=self.dtypes[name], device=device)
+            for name, shape in self.shapes.items()
+        }
+        # Per-output-channel scales for int8 weights
+        self.scales: Dict[str, torch.Tensor] = {
+            name: torch.empty((0, self.shapes[name][0]), device=device)
+            for name, dtype in self.dtypes.items() if dtype == torch.int8
+        }
+        self.slots: Dict[int, int] = {}
+        self.free_slots: List[int] = []
+        # Bumped on every write to a brain, so checkpoints can skip unchanged ones
+        self.versions: Dict[int, int] = {}
+        self._write_counter = itertools.count(1)
+        # Stacked tensors still referenced by outstanding snapshots, copied before the next write
+        self._shared: Set[str] = set()
+        self._snapshots = 0
+
+        # Byte layout of one brain as a spill record: (key, dtype, per-brain shape, offset, nbytes)
+        self.record_layout: List[Tuple[str, torch.dtype, torch.Size, int, int]] = []
+        offset = 0
+        for key, dtype, shape in [(name, self.dtypes[name], self.shapes[name]) for name in self.shapes] + [
+            (f"{name}.scale", torch.float32, self.shapes[name][:1]) for name, dtype in self.dtypes.items() if dtype == torch.int8
+        ]:
+            nbytes = math.prod(shape) * torch.empty(0, dtype=dtype).element_size()
+            self.record_layout.append((key, dtype, shape, offset, nbytes))
+            offset += nbytes
+
+        # Hot set bookkeeping, only when spilling is enabled
+        self.max_resident = max_resident
+        self.cold: Optional[ColdBrainStore] = ColdBrainStore(spill_dir, offset) if max_resident and spill_dir else None
+        self.lru: "OrderedDict[int, None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._grow(min(capacity, max_resident) if self.cold is not None else capacity)
+
+    def __len__(self) -> int:
+        return len(self.slots) + (len(self.cold) if self.cold is not None else 0)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self.slots or (self.cold is not None and entity_id in self.cold)
+
+    @property
+    def bytes_per_brain(self) -> int:
+        """Storage bytes for one brain in this bank"""
+        return storage_bytes(self.shapes, self.storage_dtype)
+
+    def entity_ids(self) -> List[int]:
+        """Get list of entity IDs with a brain"""
+        if self.cold is not None:
+            return list(self.slots) + self.cold.entity_ids()
+        return list(self.slots.keys())
+
+    def cache_stats(self) -> dict:
+        """Hot set occupancy and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.cold is not None,
+            'max_resident': self.max_resident,
+            'resident': len(self.slots),
+            'spilled': len(self.cold) if self.cold is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'resident_bytes': self.capacity * self.bytes_per_brain,
+            'spill_file_bytes': self.cold.file_bytes if self.cold is not None else 0
+        }
+
+    def _grow(self, capacity: int):
+        """Reallocate the stacked tensors with room for `capacity` brains"""
+        for tensors in (self.params, self.scales):
+            for name, stacked in tensors.items():
+                grown = torch.zeros((capacity, *stacked.shape[1:]), dtype=stacked.dtype, device=self.device)
+                grown[:self.capacity] = stacked
+                tensors[name] = grown
+        # Free slots are popped from the end, so keep the lowest slot last
+        self.free_slots = list(range(capacity - 1, self.capacity - 1, -1)) + self.free_slots
+        self.capacity = capacity
+        # Every tensor is new, snapshots keep the old ones
+        self._shared = set()
+
+    def _claim(self, entity_id: int) -> int:
+        """Get the resident slot for an entity, claiming a free one if needed"""
+        slot = self.slots.get(entity_id)
+        if slot is None:
+            if not self.free_slots:
+                self._make_room(1, (entity_id,))
+            slot = self.free_slots.pop()
+            self.slots[entity_id] = slot
+        if self.cold is not None:
+            self.lru[entity_id] = None
+            self.lru.move_to_end(entity_id)
+        return slot
+
+    def _allocate(self, entity_id: int) -> int:
+        """Get the slot for an entity about to be written, claiming a free one if needed"""
+        if self.cold is not None:
+            # The old weights are about to be overwritten, no need to fault them in
+            self.cold.remove(entity_id)
+        slot = self._claim(entity_id)
+        self.versions[entity_id] = next(self._write_counter)
+        return slot
+
+    def _make_room(self, count: int, pinned: Iterable[int] = ()):
+        """Free slots for `count` more resident brains, spilling least recently used ones past max_resident"""
+        if self.cold is not None:
+            excess = len(self.slots) + count - self.max_resident
+            if excess > 0:
+                pinned = set(pinned)
+                victims = []
+                for entity_id in self.lru:
+                    if len(victims) == excess:
+                        break
+                    if entity_id not in pinned:
+                        victims.append(entity_id)
+                self._spill(victims)
+            if self.capacity > self.max_resident and len(self.slots) + count <= self.max_resident:
+                self._compact()
+        if len(self.free_slots) < count:
+            needed = len(self.slots) + count
+            capacity = max(self.capacity * 2, needed)
+            if self.cold is not None:
+                # Only a request larger than the hot set grows past it
+                capacity = max(min(capacity, self.max_resident), needed)
+            self._grow(capacity)
+
+    def _compact(self):
+        """Shrink the stacked tensors back to max_resident after a request larger than the hot set"""
+        moved = [(entity_id, slot) for entity_id, slot in self.slots.items() if slot >= self.max_resident]
+        free = sorted(slot for slot in self.free_slots if slot < self.max_resident)
+        targets = free[:len(moved)]
+        source = torch.tensor([slot for _, slot in moved], dtype=torch.long, device=self.device)
+        target = torch.tensor(targets, dtype=torch.long, device=self.device)
+        for tensors in (self.params, self.scales):
+            for name, stacked in tensors.items():
+                # A fresh tensor, so outstanding snapshots keep the old one
+                compacted = stacked[:self.max_resident].clone()
+                compacted[target] = stacked[source]
+                tensors[name] = compacted
+        for (entity_id, _), slot in zip(moved, targets):
+            self.slots[entity_id] = slot
+        self.free_slots = sorted(free[len(moved):], reverse=True)
+        self.capacity = self.max_resident
+        self._shared = set()
+
+    def _encode(self, packed: Dict[str, torch.Tensor]) -> np.ndarray:
+        """Packed [n, ...] tensors as [n, record_bytes] uint8 records"""
+        count = len(next(iter(packed.values())))
+        return torch.cat([
+            packed[key].detach().contiguous().cpu().view(torch.uint8).reshape(count, -1)
+            for key, *_ in self.record_layout
+        ], dim=1).numpy()
+
+    def _decode(self, records: np.ndarray) -> Dict[str, torch.Tensor]:
+        """[n, record_bytes] uint8 records back to packed [n, ...] tensors"""
+        rows = torch.from_numpy(np.ascontiguousarray(records))
+        return {
+            key: rows[:, offset:offset + nbytes].contiguous().view(dtype).reshape(len(rows), *shape).to(self.device)
+            for key, dtype, shape, offset, nbytes in self.record_layout
+        }
+
+    def _spill(self, entity_ids: List[int]):
+        """Move resident brains to the cold store"""
+        if not entity_ids:
+            return
+        _, packed = self.packed(entity_ids)
+        self.cold.write(entity_ids, self._encode(packed))
+        for entity_id in entity_ids:
+            self.free_slots.append(self.slots.pop(entity_id))
+            self.lru.pop(entity_id, None)
+        self.evictions += len(entity_ids)
+
+    def _fault_in(self, entity_ids: List[int], pinned: Iterable[int] = ()):
+        """Bring spilled brains back into the stacked tensors, without touching their versions"""
+        packed = self._decode(self.cold.read(entity_ids))
+        for entity_id in entity_ids:
+            self.cold.remove(entity_id)
+        self._make_room(len(entity_ids), pinned)
+        slots = torch.tensor([self._claim(entity_id) for entity_id in entity_ids], dtype=torch.long, device=self.device)
+        for name in self.params:
+            self._unshare(name)
+            self.params[name][slots] = packed[name]
+        for name in self.scales:
+            self.scales[name][slots] = packed[f"{name}.scale"]
+
+    def _resident(self, entity_ids: List[int]):
+        """Make brains resident and mark them recently used, counting hits and misses"""
+        if self.cold is None:
+            return
+        unique = list(dict.fromkeys(entity_ids))
+        spilled = [entity_id for entity_id in unique if entity_id not in self.slots and entity_id in self.cold]
+        self.hits += len(unique) - len(spilled)
+        self.misses += len(spilled)
+        if spilled:
+            # Keep the rest of this request resident while making room
+            self._fault_in(spilled, unique)
+        elif self.capacity > self.max_resident:
+            # Shrink back after an earlier request larger than the hot set
+            self._make_room(0, unique)
+        for entity_id in unique:
+            if entity_id in self.lru:
+                self.lru.move_to_end(entity_id)
+
+    def slots_for(self, entity_ids: List[int]) -> torch.Tensor:
+        """
+        Slot index tensor for a list of entity IDs, faulting in spilled brains.
+        A request larger than the hot set stays resident so the slots remain
+        valid; call trim() once done with them.
+        """
+        self._resident(entity_ids)
+        return torch.tensor([self.slots[entity_id] for entity_id in entity_ids], dtype=torch.long, device=self.device)
+
+    def trim(self):
+        """
+        Spill least recently used brains and shrink the stacked tensors back
+        to max_resident after a request larger than the hot set. Slots from
+        earlier slots_for calls are invalid afterwards; tensors read before
+        keep their values.
+        """
+        if self.cold is not None and (len(self.slots) > self.max_resident or self.capacity > self.max_resident):
+            self._make_room(0)
+
+    def _unshare(self, name: str):
+        """Copy-on-write: give the bank its own copy of a tensor a snapshot still reads"""
+        if name in self._shared:
+            self.params[name] = self.params[name].clone()
+            self._shared.discard(name)
+        scale_name = f"{name}.scale"
+        if scale_name in self._shared:
+            self.scales[name] = self.scales[name].clone()
+            self._shared.discard(scale_name)
+
+    def _write(self, name: str, slots, values: torch.Tensor):
+        """Store float32 values for one parameter, quantizing if needed"""
+        self._unshare(name)
+        if name in self.scales:
+            quantized, scale = quantize_per_channel(values)
+            self.params[name][slots] = quantized
+            self.scales[name][slots] = scale
+        else:
+            self.params[name][slots] = values.to(self.dtypes[name])
+
+    def _read(self, name: str, selector) -> torch.Tensor:
+        """float32 values for one parameter at the selected slots"""
+        stored = self._gather(self.params[name], selector)
+        if name in self.scales:
+            return dequantize_per_channel(stored, self._gather(self.scales[name], selector))
+        return stored.to(torch.float32)
+
+    @torch.no_grad()
+    def add_random(self, entity_ids: List[int]):
+        """Create freshly initialized brains, matching nn.Linear/nn.LayerNorm defaults"""
+        new = sum(1 for entity_id in entity_ids if entity_id not in self.slots)
+        if new > len(self.free_slots):
+            self._make_room(new, entity_ids)
+        slots = torch.tensor([self._allocate(entity_id) for entity_id in entity_ids], dtype=torch.long, device=self.device)
+        for linear, norm in self.layers:
+            weight_shape = self.shapes[f"{linear}.weight"]
+            bound = 1.0 / math.sqrt(weight_shape[1])
+            self._write(f"{linear}.weight", slots, torch.empty(
+                (len(slots), *weight_shape), device=self.device
+            ).uniform_(-bound, bound))
+            self._write(f"{linear}.bias", slots, torch.empty(
+                (len(slots), weight_shape[0]), device=self.device
+            ).uniform_(-bound, bound))
+            if norm:
+                self._write(f"{norm}.weight", slots, torch.ones((len(slots), weight_shape[0]), device=self.device))
+                self._write(f"{norm}.bias", slots, torch.zeros((len(slots), weight_shape[0]), device=self.device))
+        self.trim()
+
+    @torch.no_grad()
+    def put(self, entity_id: int, state_dict: Dict[str, torch.Tensor]):
+        """
+        Store a brain's float weights, replacing any existing ones.
+        int8 weights are re-quantized with fresh per-channel scales, so
+        brains produced by crossover/mutation in float32 stay exact up to
+        one rounding step.
+        """
+        slot = self._allocate(entity_id)
+        for name in self.params:
+            self._write(name, slot, state_dict[name].to(self.device, torch.float32))
+
+    @torch.no_grad()
+    def put_many(self, entity_ids: List[int], params: Dict[str, torch.Tensor]):
+        """Store several brains from float32 [n, ...] tensors, same as put for each"""
+        new = sum(1 for entity_id in dict.fromkeys(entity_ids) if entity_id not in self.slots)
+        if new > len(self.free_slots):
+            self._make_room(new, entity_ids)
+        slots = torch.tensor([self._allocate(entity_id) for entity_id in entity_ids], dtype=torch.long, device=self.device)
+        for name in self.params:
+            self._write(name, slots, params[name].to(self.device, torch.float32))
+        self.trim()
+
+    def read_stacked(self, entity_ids: List[int]) -> Dict[str, torch.Tensor]:
+        """
+        float32 weights of several brains, one [n, ...] tensor per parameter,
+        in request order. These may be views of float32 storage, so copy them
+        before writing to the bank if they need to keep their values.
+        """
+        slots = self._slot_selector(self.slots_for(entity_ids))
+        stacked = {name: self._read(name, slots) for name in self.params}
+        self.trim()
+        return stacked
+
+    def state_dict(self, entity_id: int) -> Dict[str, torch.Tensor]:
+        """float32 copy of one brain's weights, keyed like EntityBrain.state_dict()"""
+        self._resident([entity_id])
+        slot = self.slots[entity_id]
+        return {name: self._read(name, slot).clone() for name in self.params}
+
+    def export(self, entity_id: int) -> Dict[str, torch.Tensor]:
+        """One brain's weights in storage format, with '<name>.scale' entries for int8"""
+        self._resident([entity_id])
+        slot = self.slots[entity_id]
+        packed = {name: stacked[slot].clone() for name, stacked in self.params.items()}
+        for name, scales in self.scales.items():
+            packed[f"{name}.scale"] = scales[slot].clone()
+        return packed
+
+    def packed(self, entity_ids: Optional[List[int]] = None) -> Tuple[List[int], Dict[str, torch.Tensor]]:
+        """
+        Brains in storage format (every live brain by default): entity IDs plus
+        one [n, ...] tensor per parameter (and '<name>.scale' for int8), in the same order.
+        Spilled brains are read from the cold store without being faulted in.
+        """
+        return _pack(self, self.params, self.scales, self.slots, self.cold, entity_ids)
+
+    def export_records(self, entity_ids: List[int]) -> np.ndarray:
+        """Brains as exact storage-format byte records [n, record_bytes], as spilled to the cold store"""
+        _, packed = self.packed(entity_ids)
+        return self._encode(packed)
+
+    @torch.no_grad()
+    def import_records(self, entity_ids: List[int], records: np.ndarray):
+        """Store brains given as records from export_records of a bank with the same layout"""
+        packed = self._decode(records)
+        new = sum(1 for entity_id in entity_ids if entity_id not in self.slots)
+        if new > len(self.free_slots):
+            self._make_room(new, entity_ids)
+        slots = torch.tensor([self._allocate(entity_id) for entity_id in entity_ids], dtype=torch.long, device=self.device)
+        for name in self.params:
+            self._unshare(name)
+            self.params[name][slots] = packed[name]
+        for name in self.scales:
+            self.scales[name][slots] = packed[f"{name}.scale"]
+        self.trim()
+
+    def snapshot(self) -> "BankSnapshot":
+        """
+        Consistent read-only view of every brain, safe to read from another
+        thread. Nothing is copied up front: until release() is called, the
+        bank clones a stacked tensor before writing to it instead.
+        """
+        self._snapshots += 1
+        self._shared = set(self.params) | {f"{name}.scale" for name in self.scales}
+        if self.cold is not None:
+            self.cold.pin()
+        return BankSnapshot(self)
+
+    def share_memory(self) -> bool:
+        """
+        Move the stacked tensors into shared memory so worker processes can
+        read them in place. Returns True if any tensor was replaced, after
+        which workers need the new ones.
+        """
+        moved = False
+        for tensors, suffix in ((self.params, ""), (self.scales, ".scale")):
+            for name, stacked in tensors.items():
+                if not stacked.is_shared():
+                    # A fresh tensor, so outstanding snapshots keep the old one
+                    tensors[name] = stacked.clone().share_memory_()
+                    self._shared.discard(f"{name}{suffix}")
+                    moved = True
+        return moved
+
+    def release(self):
+        """Mark a snapshot as no longer read, so writes go in place again"""
+        if self._snapshots and self.cold is not None:
+            self.cold.unpin()
+        self._snapshots = max(self._snapshots - 1, 0)
+        if not self._snapshots:
+            self._shared = set()
+
+    def check_compatible(self, brain_config: dict, packed: Dict[str, torch.Tensor], count: int):
+        """
+        Raise ValueError unless packed brains saved with brain_config fit this
+        bank's architecture. Dropout is not compared, it has no parameters.
+        """
+        saved = {key: value for key, value in brain_config.items() if key != 'dropout'}
+        current = {key: value for key, value in self.brain_kwargs.items() if key != 'dropout'}
+        if saved != current:
+            changed = sorted(key for key in saved.keys() | current.keys() if saved.get(key) != current.get(key))
+            raise ValueError(
+                "Brains were saved with a different architecture: "
+                + ", ".join(f"{key} {saved.get(key)!r} (configured {current.get(key)!r})" for key in changed)
+            )
+        expected = dict(self.shapes)
+        for name, shape in self.shapes.items():
+            # Only int8 saves have per-channel scales
+            if f"{name}.scale" in packed:
+                expected[f"{name}.scale"] = shape[:1]
+        for name, shape in expected.items():
+            if name not in packed:
+                raise ValueError(f"Saved brains have no {name}")
+            if len(packed[name]) != count or tuple(packed[name].shape[1:]) != tuple(shape):
+                raise ValueError(
+                    f"Saved {name} is {tuple(packed[name].shape)}, expected {(count, *shape)}"
+                )
+
+    def adopt(self, entity_ids: List[int], packed: Dict[str, torch.Tensor], storage_dtype: str):
+        """
+        Replace the bank's contents with packed brains. When the storage
+        format and device match, the given tensors become the bank's storage
+        as they are (no copy); otherwise each brain is converted through float32.
+        Callers check the brains with check_compatible first.
+        """
+        self.slots = {}
+        self.free_slots = []
+        self.versions = {}
+        self._shared = set()
+        self.lru = OrderedDict()
+        if self.cold is not None:
+            self.cold.clear()
+        if storage_dtype == self.storage_dtype and self.device.type == "cpu":
+            self.params = {name: packed[name] for name in self.params}
+            self.scales = {name: packed[f"{name}.scale"] for name in self.scales}
+            self.capacity = len(entity_ids)
+            self.slots = {entity_id: slot for slot, entity_id in enumerate(entity_ids)}
+            self.versions = {entity_id: next(self._write_counter) for entity_id in entity_ids}
+            if self.cold is not None:
+                self.lru = OrderedDict.fromkeys(entity_ids)
+                if len(entity_ids) > self.max_resident:
+                    # Everything past the hot set goes straight to the cold store
+                    self._spill(list(entity_ids[self.max_resident:]))
+                    self.params = {name: stacked[:self.max_resident] for name, stacked in self.params.items()}
+                    self.scales = {name: stacked[:self.max_resident] for name, stacked in self.scales.items()}
+                    self.capacity = self.max_resident
+                    self.free_slots = []
+            return
+
+        for name, stacked in self.params.items():
+            self.params[name] = stacked[:0]
+        for name, scales in self.scales.items():
+            self.scales[name] = scales[:0]
+        self.capacity = 0
+        self._grow(max(1, min(len(entity_ids), self.max_resident) if self.cold is not None else len(entity_ids)))
+        for slot, entity_id in enumerate(entity_ids):
+            state_dict = {}
+            for name in self.params:
+                value = packed[name][slot]
+                if f"{name}.scale" in packed:
+                    value = dequantize_per_channel(value, packed[f"{name}.scale"][slot])
+                state_dict[name] = value
+            self.put(entity_id, state_dict)
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, torch.Tensor]]]:
+        """Iterate over (entity_id, state_dict) pairs"""
+        for entity_id in self.entity_ids():
+            yield entity_id, self.state_dict(entity_id)
+
+    def get_brain(self, entity_id: int) -> Optional[EntityBrain]:
+        """Materialize a standalone float32 EntityBrain (a copy) for one entity"""
+        if entity_id not in self:
+            return None
+        brain = EntityBrain(**self.brain_kwargs).to(self.device)
+        brain.load_state_dict(self.state_dict(entity_id))
+        # Same dropout behaviour as the bank's own forward pass
+        brain.train(self.training)
+        return brain
+
+    def remove(self, entity_id: int) -> bool:
+        """Free an entity's slot (or spill record) for reuse"""
+        slot = self.slots.pop(entity_id, None)
+        if slot is None:
+            if self.cold is None or not self.cold.remove(entity_id):
+                return False
+        else:
+            self.free_slots.append(slot)
+            self.lru.pop(entity_id, None)
+        self.versions.pop(entity_id, None)
+        return True
+
+    @staticmethod
+    def _slot_selector(slots: torch.Tensor):
+        """A slice when slots are one contiguous run (no copy), else the index tensor"""
+        if len(slots) > 0:
+            start = int(slots[0])
+            if torch.equal(slots, torch.arange(start, start + len(slots), device=slots.device)):
+                return slice(start, start + len(slots))
+        return slots
+
+    @staticmethod
+    def _gather(stacked: torch.Tensor, selector) -> torch.Tensor:
+        if isinstance(selector, (slice, int)):
+            return stacked[selector]
+        return stacked.index_select(0, selector)
+
+    def _weight(self, name: str, selector) -> torch.Tensor:
+        """Linear weight in compute dtype, skipping the float32 round trip for native low precision"""
+        if self.compute_dtype != torch.float32:
+            return self._gather(self.params[name], selector)
+        return self._read(name, selector)
+
+    @torch.no_grad()
+    def forward(self, slots: torch.Tensor, x: torch.Tensor) -> torch.Tensor:
+        """Action probabilities for inputs x[i] through the brain in slots[i]"""
+        slots = self._slot_selector(slots)
+        h = x.unsqueeze(1)
+        last = len(self.layers) - 1
+        for index, (linear, norm) in enumerate(self.layers):
+            weight = self._weight(f"{linear}.weight", slots)
+            bias = self._read(f"{linear}.bias", slots)
+            h = torch.baddbmm(
+                bias.unsqueeze(1).to(weight.dtype), h.to(weight.dtype), weight.transpose(1, 2)
+            ).to(torch.float32)
+            if index == last:
+                break
+            if norm:
+                h = F.layer_norm(h, h.shape[-1:])
+                h = h * self._read(f"{norm}.weight", slots).unsqueeze(1) + self._read(f"{norm}.bias", slots).unsqueeze(1)
+            h = F.relu(h)
+            # EntityBrain applies dropout after every second hidden layer
+            if self.training and self.dropout > 0 and index % 2 == 1:
+                h = F.dropout(h, p=self.dropout, training=True)
+        return F.softmax(h.squeeze(1), dim=-1)
+
+
+class BankSnapshot:
+    """Frozen view of a BrainBank's brains, see BrainBank.snapshot()"""
+
+    def __init__(self, bank: BrainBank):
+        self.bank = bank
+        self.storage_dtype = bank.storage_dtype
+        self.brain_kwargs = bank.brain_kwargs
+        self.params = dict(bank.params)
+        self.scales = dict(bank.scales)
+        self.slots = dict(bank.slots)
+        self.cold = bank.cold.view() if bank.cold is not None else None
+        self.versions = dict(bank.versions)
+
+    def __len__(self) -> int:
+        return len(self.slots) + (len(self.cold) if self.cold is not None else 0)
+
+    def entity_ids(self) -> List[int]:
+        return list(self.slots) + (self.cold.entity_ids() if self.cold is not None else [])
+
+    def packed(self, entity_ids: Optional[List[int]] = None) -> Tuple[List[int], Dict[str, torch.Tensor]]:
+        """Same as BrainBank.packed, as of the snapshot"""
+        return _pack(self.bank, self.params, self.scales, self.slots, self.cold, entity_ids)
+
+
+def _pack(bank: BrainBank, params: Dict[str, torch.Tensor], scales: Dict[str, torch.Tensor], slots: Dict[int, int],
+          cold: Optional[ColdView], entity_ids: Optional[List[int]]) -> Tuple[List[int], Dict[str, torch.Tensor]]:
+    if entity_ids is None:
+        entity_ids = list(slots) + (cold.entity_ids() if cold else [])
+    entity_ids = list(entity_ids)
+    resident = [row for row, entity_id in enumerate(entity_ids) if entity_id in slots]
+    selector = BrainBank._slot_selector(torch.tensor(
+        [slots[entity_ids[row]] for row in resident], dtype=torch.long, device=bank.device
+    ))
+    packed = {name: BrainBank._gather(stacked, selector) for name, stacked in params.items()}
+    for name, stacked in scales.items():
+        packed[f"{name}.scale"] = BrainBank._gather(stacked, selector)
+    if len(resident) == len(entity_ids):
+        return entity_ids, packed
+
+    # Some brains are spilled: merge their records in at their positions
+    spilled = [row for row, entity_id in enumerate(entity_ids) if entity_id not in slots]
+    from_cold = bank._decode(cold.read([entity_ids[row] for row in spilled]))
+    resident_rows = torch.tensor(resident, dtype=torch.long, device=bank.device)
+    spilled_rows = torch.tensor(spilled, dtype=torch.long, device=bank.device)
+    merged = {}
+    for key, tensor in packed.items():
+        out = torch.empty((len(entity_ids), *tensor.shape[1:]), dtype=tensor.dtype, device=bank.device)
+        out[resident_rows] = tensor
+        out[spilled_rows] = from_cold[key]
+        merged[key] = out
+    return entity_ids, merged
+
+
+def precision_drift_report(storage_dtype: str, num_brains: int = 256, lowp_matmul: bool = False, seed: int = 0) -> dict:
+    """
+    Compare action_probabilities from a reduced-precision bank against the
+    float32 reference, using the same random brains and inputs.
+    """
+    with torch.random.fork_rng():
+        torch.manual_seed(seed)
+        template = EntityBrain.from_settings()
+        device = torch.device("cpu")
+        entity_ids = list(range(num_brains))
+
+        reference = BrainBank(template, device, capacity=num_brains)
+        reference.add_random(entity_ids)
+        candidate = BrainBank(
+            template, device, capacity=num_brains, storage_dtype=storage_dtype, lowp_matmul=lowp_matmul
+        )
+        for entity_id, state_dict in reference.items():
+            candidate.put(entity_id, state_dict)
+        reference.training = candidate.training = False
+
+        inputs = torch.rand(num_brains, template.config['input_size'])
+        expected = reference.forward(reference.slots_for(entity_ids), inputs)
+        actual = candidate.forward(candidate.slots_for(entity_ids), inputs)
+
+    error = (expected - actual).abs()
+    return {
+        'storage_dtype': storage_dtype,
+        'lowp_matmul': candidate.compute_dtype != torch.float32,
+        'brains': num_brains,
+        'max_abs_error': float(error.max()),
+        'mean_abs_error': float(error.mean()),
+        'argmax_agreement': float((expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean()),
+        'bytes_per_brain': candidate.bytes_per_brain,
+        'reference_bytes_per_brain': reference.bytes_per_brain,
+        'compression_ratio': reference.bytes_per_brain / candidate.bytes_per_brain
+    }
@@ -0,0 +1,252 @@
+import atexit
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence
+from app.core.brain_bank import BrainBank
+from app.core.neural_network import EntityBrain
+
+
+class ShardWorkerError(RuntimeError):
+    """A shard worker process is gone"""
+
+
+class ShardRing:
+    """
+    Request/result slots of one shard worker in a single shared memory block.
+    Each slot holds up to slot_rows rows:
+
+        slots   int64[slot_rows]                 bank slot of each row
+        inputs  float32[slot_rows, input_size]
+        probs   float32[slot_rows, output_size]  written by the worker
+    """
+
+    def __init__(self, ring_slots: int, slot_rows: int, input_size: int, output_size: int,
+                 name: Optional[str] = None):
+        self.config = (ring_slots, slot_rows, input_size, output_size)
+        self.ring_slots = ring_slots
+        self.slot_rows = slot_rows
+        slot_bytes = slot_rows * (8 + 4 * input_size + 4 * output_size)
+        if name is None:
+            self.shm = SharedMemory(create=True, size=ring_slots * slot_bytes)
+        else:
+            self.shm = SharedMemory(name=name)
+
+        block = np.ndarray((ring_slots, slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+        inputs_at = 8 * slot_rows
+        probs_at = inputs_at + 4 * slot_rows * input_size
+        self.slot_index = block[:, :inputs_at].view(np.int64)
+        self.inputs = block[:, inputs_at:probs_at].view(np.float32).reshape(ring_slots, slot_rows, input_size)
+        self.probs = block[:, probs_at:].view(np.float32).reshape(ring_slots, slot_rows, output_size)
+
+    def close(self, unlink: bool = False):
+        # Views into the block must go before it can be unmapped
+        self.slot_index = self.inputs = self.probs = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _serve(shard: int, connection, ring_name: str, ring_config: tuple, bank_config: dict):
+    """Worker process: run forward passes for the rows the parent puts in this shard's ring"""
+    torch.set_num_threads(1)
+    ring = ShardRing(*ring_config, name=ring_name)
+    bank = BrainBank(
+        EntityBrain(**bank_config['brain_kwargs']),
+        torch.device("cpu"),
+        capacity=0,
+        storage_dtype=bank_config['storage_dtype'],
+        lowp_matmul=bank_config['lowp_matmul']
+    )
+    try:
+        while True:
+            message = connection.recv()
+            kind = message[0]
+            if kind == "weights":
+                # Shared memory tensors of the parent's bank, read in place
+                _, bank.params, bank.scales = message
+                connection.send(("ready",))
+            elif kind == "decide":
+                _, slot, count, training = message
+                bank.training = training
+                try:
+                    probs = bank.forward(
+                        torch.from_numpy(ring.slot_index[slot, :count]),
+                        torch.from_numpy(ring.inputs[slot, :count])
+                    )
+                    ring.probs[slot, :count] = probs.numpy()
+                    connection.send(("done", slot))
+                except Exception as e:
+                    connection.send(("error", slot, f"{type(e).__name__}: {e}"))
+            elif kind == "stop":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        ring.close()
+
+
+class ShardedInference:
+    """
+    Brain inference spread over worker processes, entities sharded by
+    entity_id % workers.
+
+    The parent's BrainBank stays the only owner of the weights: its stacked
+    tensors are moved into shared memory and every worker reads them in
+    place, so adding, reproducing or removing brains needs no messages, and
+    parents and child may sit on any shards. Workers are only sent new
+    tensor handles when the bank reallocates (growth, compaction, copy-on-
+    write during a save).
+
+    Rows travel through a shared memory ring per worker; the pipe only
+    carries slot numbers. Workers start on first use.
+    """
+
+    def __init__(self, bank: BrainBank, workers: int, ring_slots: int = 4, slot_rows: int = 1024):
+        self.bank = bank
+        self.workers = workers
+        self.ring_slots = max(ring_slots, 1)
+        self.slot_rows = max(slot_rows, 1)
+        self.input_size = bank.shapes[f"{bank.layers[0][0]}.weight"][1]
+        self.output_size = bank.shapes[f"{bank.layers[-1][0]}.weight"][0]
+        self.rings: List[ShardRing] = []
+        self.connections = []
+        self.processes = []
+        # Tensors the workers currently hold, by parameter key
+        self._published: Dict[str, torch.Tensor] = {}
+        self._next_slot: List[int] = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self.processes)
+
+    def start(self):
+        context = mp.get_context("spawn")
+        bank_config = {
+            'brain_kwargs': self.bank.brain_kwargs,
+            'storage_dtype': self.bank.storage_dtype,
+            'lowp_matmul': self.bank.compute_dtype != torch.float32
+        }
+        for shard in range(self.workers):
+            ring = ShardRing(self.ring_slots, self.slot_rows, self.input_size, self.output_size)
+            parent_end, child_end = context.Pipe()
+            process = context.Process(
+                target=_serve,
+                args=(shard, child_end, ring.shm.name, ring.config, bank_config),
+                name=f"brain-shard-{shard}",
+                daemon=True
+            )
+            process.start()
+            child_end.close()
+            self.rings.append(ring)
+            self.connections.append(parent_end)
+            self.processes.append(process)
+        self._next_slot = [0] * self.workers
+        atexit.register(self.close)
+        print(f"BrainService: Inference sharded over {self.workers} worker processes")
+
+    def _send(self, shard: int, message: tuple):
+        try:
+            self.connections[shard].send(message)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            raise ShardWorkerError(f"Brain shard {shard} is not running: {e}")
+
+    def _receive(self, shard: int) -> tuple:
+        try:
+            message = self.connections[shard].recv()
+        except (EOFError, OSError) as e:
+            raise ShardWorkerError(f"Brain shard {shard} exited: {e}")
+        return message
+
+    def _publish(self):
+        """Hand workers the bank's tensors if they changed since the last call"""
+        self.bank.share_memory()
+        tensors = {**self.bank.params, **{f"{name}.scale": scales for name, scales in self.bank.scales.items()}}
+        if len(tensors) == len(self._published) and all(
+            self._published.get(key) is tensor for key, tensor in tensors.items()
+        ):
+            return
+        for shard in range(self.workers):
+            self._send(shard, ("weights", self.bank.params, self.bank.scales))
+        for shard in range(self.workers):
+            self._receive(shard)
+        self._published = tensors
+
+    def forward(self, entity_ids: Sequence[int], slots: torch.Tensor, x: torch.Tensor) -> torch.Tensor:
+        """Same as BrainBank.forward, each row run by the worker of its entity's shard"""
+        # Checked before any worker is sent rows, so a bad request leaves no replies pending
+        if x.dim() != 2 or x.shape[1] != self.input_size:
+            raise ValueError(f"Expected inputs of shape [n, {self.input_size}], got {list(x.shape)}")
+        if not self.started:
+            self.start()
+        self._publish()
+
+        slots = slots.cpu().numpy()
+        x = x.detach().cpu().numpy()
+        out = np.empty((len(slots), self.output_size), dtype=np.float32)
+        shard_of = np.asarray(entity_ids, dtype=np.int64) % self.workers
+
+        queued = []
+        for shard in range(self.workers):
+            rows = np.flatnonzero(shard_of == shard)
+            queued.append(deque(rows[start:start + self.slot_rows] for start in range(0, len(rows), self.slot_rows)))
+        in_flight = [deque() for _ in range(self.workers)]
+
+        def submit(shard: int):
+            rows = queued[shard].popleft()
+            slot = self._next_slot[shard]
+            self._next_slot[shard] = (slot + 1) % self.ring_slots
+            ring = self.rings[shard]
+            ring.slot_index[slot, :len(rows)] = slots[rows]
+            ring.inputs[slot, :len(rows)] = x[rows]
+            self._send(shard, ("decide", slot, len(rows), self.bank.training))
+            in_flight[shard].append((slot, rows))
+
+        # Keep up to ring_slots chunks queued per worker, refill as results come back
+        for shard in range(self.workers):
+            while queued[shard] and len(in_flight[shard]) < self.ring_slots:
+                submit(shard)
+        errors = []
+        active = {self.connections[shard]: shard for shard in range(self.workers) if in_flight[shard]}
+        while active:
+            for connection in wait(list(active)):
+                shard = active[connection]
+                message = self._receive(shard)
+                # A worker answers its slots in the order they were sent
+                slot, rows = in_flight[shard].popleft()
+                if message[0] == "error":
+                    # Stop feeding this shard but drain what it still owes, so the next call starts clean
+                    errors.append(f"Brain shard {shard} failed: {message[2]}")
+                    queued[shard].clear()
+                else:
+                    out[rows] = self.rings[shard].probs[slot, :len(rows)]
+                if queued[shard]:
+                    submit(shard)
+                if not in_flight[shard]:
+                    del active[connection]
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return torch.from_numpy(out)
+
+    def close(self):
+        """Stop the workers and free the rings"""
+        for shard, process in enumerate(self.processes):
+            if process.is_alive():
+                try:
+                    self.connections[shard].send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self.connections:
+            connection.close()
+        for ring in self.rings:
+            ring.close(unlink=True)
+        self.rings, self.connections, self.processes = [], [], []
+        self._published = {}
+        atexit.unregister(self.close)
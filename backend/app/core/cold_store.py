@@ -0,0 +1,107 @@
+import os
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class ColdView:
+    """Read-only view of a ColdBrainStore as of one moment, see ColdBrainStore.view()"""
+
+    def __init__(self, records: Dict[int, int], data: Optional[np.memmap]):
+        self.records = records
+        self.data = data
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def entity_ids(self) -> List[int]:
+        return list(self.records)
+
+    def read(self, entity_ids: List[int]) -> np.ndarray:
+        """Records of the given brains as a [n, record_bytes] uint8 copy"""
+        return self.data[[self.records[entity_id] for entity_id in entity_ids]]
+
+
+class ColdBrainStore(ColdView):
+    """
+    Brains spilled out of RAM, one fixed-size byte record per brain in a
+    memory-mapped file. The file is created on the first spill and removed
+    as soon as it is mapped, so it never outlives the process.
+
+    While views are pinned, freed records are not reused, so a view keeps
+    reading the bytes it saw even as brains move in and out.
+    """
+
+    def __init__(self, directory: str, record_bytes: int):
+        super().__init__({}, None)
+        self.directory = directory
+        self.record_bytes = record_bytes
+        self.capacity = 0
+        self.free: List[int] = []
+        self._pending_free: List[int] = []
+        self._pins = 0
+        self._file = None
+
+    @property
+    def file_bytes(self) -> int:
+        return self.capacity * self.record_bytes
+
+    def _grow(self, capacity: int):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix="brains_", suffix=".spill", dir=self.directory)
+            self._file = os.fdopen(fd, "r+b")
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._file.truncate(capacity * self.record_bytes)
+        # Views taken before the remap keep the old mapping, which stays valid
+        self.data = np.memmap(self._file, dtype=np.uint8, mode="r+", shape=(capacity, self.record_bytes))
+        self.free = list(range(capacity - 1, self.capacity - 1, -1)) + self.free
+        self.capacity = capacity
+
+    def _release_record(self, record: int):
+        (self._pending_free if self._pins else self.free).append(record)
+
+    def write(self, entity_ids: List[int], rows: np.ndarray):
+        """Store [n, record_bytes] records, replacing any existing ones for these IDs"""
+        if len(self.free) < len(entity_ids):
+            self._grow(max(self.capacity * 2, self.capacity + len(entity_ids) - len(self.free), 64))
+        records = []
+        for entity_id in entity_ids:
+            previous = self.records.pop(entity_id, None)
+            if previous is not None:
+                self._release_record(previous)
+            record = self.free.pop()
+            self.records[entity_id] = record
+            records.append(record)
+        self.data[records] = rows
+
+    def remove(self, entity_id: int) -> bool:
+        record = self.records.pop(entity_id, None)
+        if record is None:
+            return False
+        self._release_record(record)
+        return True
+
+    def clear(self):
+        for record in self.records.values():
+            self._release_record(record)
+        self.records = {}
+
+    def view(self) -> ColdView:
+        """Consistent view for another thread, hold it with pin()/unpin()"""
+        return ColdView(dict(self.records), self.data)
+
+    def pin(self):
+        self._pins += 1
+
+    def unpin(self):
+        self._pins = max(self._pins - 1, 0)
+        if not self._pins:
+            self.free.extend(self._pending_free)
+            self._pending_free = []
@@ -0,0 +1,160 @@
+import asyncio
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+from app.utils.metrics import Histogram, metrics
+
+# Histogram bounds: rows per forward pass, and milliseconds spent queued
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+QUEUE_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+# Where decision time goes: forward pass, action selection/masking, and result
+# serialization. Defined here rather than with the brains, so the /ws handler
+# can time its part without importing torch.
+DECISION_PHASE_SECONDS = metrics.histogram(
+    "decision_phase_seconds",
+    "Seconds per decision batch spent in each phase",
+    ["phase"]
+)
+
+
+class PendingDecisions:
+    """One caller's decision request, waiting for the next batch"""
+
+    def __init__(self, entity_ids: List[int], inputs: np.ndarray, states: Dict[str, np.ndarray],
+                 future: asyncio.Future):
+        self.entity_ids = entity_ids
+        self.inputs = inputs
+        self.states = states
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class DecisionBatcher:
+    """
+    Server-side micro-batching of decision requests.
+
+    Callers from every connection submit their requests here. A single worker
+    task collects them and runs one batched forward pass once the queued rows
+    reach max_batch_size or the oldest request has waited max_wait seconds,
+    then hands each caller back its own rows. With max_wait 0 only requests
+    already queued are merged.
+
+    decide(entity_ids, inputs, states) is BrainService.decide, and columns turns
+    a caller's states into per-key arrays so batches can be concatenated.
+    """
+
+    def __init__(self, decide: Callable, columns: Callable, max_batch_size: int = 4096, max_wait: float = 0.002):
+        self.decide = decide
+        self.columns = columns
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max(max_wait, 0.0)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_latency_ms = Histogram(QUEUE_LATENCY_BUCKETS)
+        self.requests = 0
+        self.batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, entity_ids: List[int], inputs, states):
+        """Queue one request and wait for its slice of the batch, same result arrays as decide"""
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            # Nothing to batch, and an empty input cannot be reshaped to a row width
+            return self.decide(entity_ids, np.zeros((0, 0), dtype=np.float32), {})
+        self._ensure_worker()
+        inputs = np.asarray(inputs, dtype=np.float32).reshape(len(entity_ids), -1)
+        future = self._loop.create_future()
+        self._queue.put_nowait(PendingDecisions(entity_ids, inputs, self.columns(states, len(entity_ids)), future))
+        return await future
+
+    async def _collect(self) -> List[PendingDecisions]:
+        """Wait for a request, then gather more until the batch is full or the oldest times out"""
+        first = await self._queue.get()
+        batch = [first]
+        rows = len(first.entity_ids)
+        deadline = first.enqueued + self.max_wait
+        while rows < self.max_batch_size:
+            if self._queue.empty():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                pending = self._queue.get_nowait()
+            batch.append(pending)
+            rows += len(pending.entity_ids)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            for pending in batch:
+                self.queue_latency_ms.observe((started - pending.enqueued) * 1000.0)
+            self.requests += len(batch)
+
+            # Requests with a different input width cannot share a matmul, and a
+            # malformed one must not fail everyone else's
+            groups: Dict[int, List[PendingDecisions]] = {}
+            for pending in batch:
+                groups.setdefault(pending.inputs.shape[1], []).append(pending)
+            for group in groups.values():
+                self._run_group(group)
+
+    def _run_group(self, group: List[PendingDecisions]):
+        rows = sum(len(pending.entity_ids) for pending in group)
+        self.batch_sizes.observe(rows)
+        self.batches += 1
+        try:
+            if len(group) == 1:
+                pending = group[0]
+                results = self.decide(pending.entity_ids, pending.inputs, pending.states)
+            else:
+                entity_ids = [entity_id for pending in group for entity_id in pending.entity_ids]
+                inputs = np.concatenate([pending.inputs for pending in group])
+                states = {
+                    key: np.concatenate([pending.states[key] for pending in group])
+                    for key in group[0].states
+                }
+                results = self.decide(entity_ids, inputs, states)
+        except Exception as e:
+            if len(group) > 1:
+                # Find the culprit by running each request alone, the others still get their decisions
+                for pending in group:
+                    self._run_group([pending])
+                return
+            if not group[0].future.done():
+                group[0].future.set_exception(e)
+            return
+
+        offset = 0
+        for pending in group:
+            count = len(pending.entity_ids)
+            # Callers that gave up (e.g. a closed connection) are skipped
+            if not pending.future.done():
+                pending.future.set_result(tuple(values[offset:offset + count] for values in results))
+            offset += count
+
+    def stats(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'requests': self.requests,
+            'batches': self.batches,
+            'requests_per_batch': self.requests / self.batches if self.batches else 0.0,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_latency_ms': self.queue_latency_ms.snapshot()
+        }
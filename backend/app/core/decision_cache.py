@@ -0,0 +1,97 @@
+import numpy as np
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+
+class DecisionCache:
+    """
+    LRU memo of action probabilities keyed by entity, brain version and
+    quantized inputs.
+
+    Inputs are snapped to a grid of step `quantum` and callers run misses
+    on the snapped inputs, so a hit returns exactly what a fresh forward
+    pass would. Brain versions change on every write to a brain, so
+    replaced or re-bred brains never hit entries of their old weights;
+    those age out of the LRU like any other entry.
+
+    Only valid while brains run deterministically (no dropout).
+    """
+
+    def __init__(self, max_entries: int, quantum: float):
+        if max_entries <= 0:
+            raise ValueError("A decision cache needs room for at least one entry")
+        if quantum <= 0:
+            raise ValueError("The quantization step must be positive")
+        self.max_entries = max_entries
+        self.quantum = quantum
+        self.entries: "OrderedDict[Tuple[int, int, bytes], np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def quantize(self, inputs: np.ndarray) -> np.ndarray:
+        """Grid coordinates of each input row"""
+        return np.rint(inputs / self.quantum).astype(np.int32)
+
+    def snap(self, grid: np.ndarray) -> np.ndarray:
+        """Inputs at the given grid coordinates, what misses are computed on"""
+        return (grid * self.quantum).astype(np.float32)
+
+    def _keys(self, entity_ids: Sequence[int], versions: Sequence[int], grid: np.ndarray) -> List[tuple]:
+        grid = np.ascontiguousarray(grid)
+        row_bytes = grid.shape[1] * grid.itemsize
+        buffer = grid.tobytes()
+        return [
+            (entity_id, version, buffer[row * row_bytes:(row + 1) * row_bytes])
+            for row, (entity_id, version) in enumerate(zip(entity_ids, versions))
+        ]
+
+    def lookup(self, entity_ids: Sequence[int], versions: Sequence[int],
+               grid: np.ndarray) -> Tuple[List[tuple], List[np.ndarray], np.ndarray]:
+        """
+        Keys of every row, cached probabilities (None for misses) and the
+        row indices that missed.
+        """
+        keys = self._keys(entity_ids, versions, grid)
+        found = []
+        missed = []
+        for row, key in enumerate(keys):
+            probs = self.entries.get(key)
+            if probs is None:
+                missed.append(row)
+            else:
+                self.entries.move_to_end(key)
+            found.append(probs)
+        self.misses += len(missed)
+        self.hits += len(keys) - len(missed)
+        return keys, found, np.array(missed, dtype=np.int64)
+
+    def store(self, keys: Sequence[tuple], probs: np.ndarray):
+        """Remember probabilities for the given keys, evicting least recently used entries"""
+        for key, row in zip(keys, probs):
+            # Copies, so one entry does not pin the whole batch result in memory
+            self.entries[key] = row.copy()
+            self.entries.move_to_end(key)
+        excess = len(self.entries) - self.max_entries
+        for _ in range(max(excess, 0)):
+            self.entries.popitem(last=False)
+        self.evictions += max(excess, 0)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'max_entries': self.max_entries,
+            'entries': len(self.entries),
+            'quantum': self.quantum,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
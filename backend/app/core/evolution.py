@@ -0,0 +1,284 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+from app.config import settings
+from app.services.entity_service import GENE_NAMES
+
+# Speed multiplier per action when steering towards its target (matches the frontend)
+ACTION_SPEEDS = np.array([1.0, 1.2, 1.3, 0.9, 1.0])  # wander, gather, fight, mate, socialize
+GENE_INDEX = {name: index for index, name in enumerate(GENE_NAMES)}
+
+
+def build_inputs(columns: Dict[str, np.ndarray], observation: Dict[str, np.ndarray]) -> np.ndarray:
+    """The 20 brain inputs per entity, in the same order as the frontend"""
+    return np.column_stack([
+        columns['energy'] / 100,
+        columns['age'] / 1000,
+        columns['genes'],
+        observation['nearby_food'] / 10,
+        observation['nearby_enemies'] / 10,
+        observation['nearby_allies'] / 10,
+        columns['generation'] / 50,
+        columns['is_hybrid'],
+        columns['diet_bonus'],
+        columns['reproduction_cooldown'] / 20,
+        columns['communication_cooldown'] / 10
+    ]).astype(np.float32)
+
+
+class SimulationLoop:
+    """
+    Server-authoritative fixed-timestep simulation.
+
+    Ticks are scheduled against the event loop clock, so the world advances
+    at SIM_TICK_RATE no matter how fast clients render. When a tick overruns,
+    the loop catches up with back-to-back ticks, up to SIM_MAX_CATCHUP_TICKS;
+    anything beyond that is dropped rather than letting the schedule drift.
+
+    A tick covers decisions, movement, energy drain and starvation only.
+    Food, gathering and reproduction are still simulated by the frontend
+    (through /ws and the reproduce routes), not by this loop.
+
+    With a multi-node cluster_service, decisions, rewards and brain removal
+    go to each entity's owning node instead of the local brain_service.
+    """
+
+    def __init__(
+        self,
+        entity_service,
+        brain_service,
+        vision_service,
+        broadcast: Optional[Callable[[dict], Awaitable[None]]] = None,
+        statistics_service=None,
+        tick_rate: Optional[float] = None,
+        max_catchup_ticks: Optional[int] = None,
+        cluster_service=None
+    ):
+        self.entity_service = entity_service
+        self.brain_service = brain_service
+        self.vision_service = vision_service
+        self.broadcast = broadcast
+        self.statistics_service = statistics_service
+        self.cluster_service = cluster_service
+        self.tick_rate = tick_rate or settings.SIM_TICK_RATE
+        self.dt = 1.0 / self.tick_rate
+        self.max_catchup_ticks = max_catchup_ticks or settings.SIM_MAX_CATCHUP_TICKS
+
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._next_tick = 0.0
+        # Entities buried this tick whose brains live on other nodes
+        self._buried: List[int] = []
+        self.reset()
+
+    @property
+    def routed(self) -> bool:
+        """Whether brains are spread over several nodes"""
+        return self.cluster_service is not None and not self.cluster_service.single_node
+
+    def reset(self):
+        """Reset clocks and counters"""
+        self.tick = 0
+        self.simulation_time = 0.0
+        self.dropped_ticks = 0
+        self.deaths = 0
+        self._tick_started = deque(maxlen=100)
+        self._tick_durations = deque(maxlen=100)
+
+    def start(self) -> bool:
+        """Start ticking, returns False if already running"""
+        if self.running:
+            return False
+        self.running = True
+        self._next_tick = asyncio.get_running_loop().time()
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    async def pause(self) -> bool:
+        """Stop ticking, returns False if not running"""
+        if not self.running:
+            return False
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            now = loop.time()
+            if now < self._next_tick:
+                await asyncio.sleep(self._next_tick - now)
+                continue
+
+            due = int((now - self._next_tick) / self.dt) + 1
+            if due > self.max_catchup_ticks:
+                # Too far behind: drop the backlog instead of drifting further
+                skipped = due - self.max_catchup_ticks
+                self.dropped_ticks += skipped
+                self._next_tick += skipped * self.dt
+                due = self.max_catchup_ticks
+
+            for _ in range(due):
+                try:
+                    await self.step()
+                except Exception as e:
+                    print(f"Simulation tick error: {e}")
+                self._next_tick += self.dt
+
+            # Let websocket and REST handlers run between bursts
+            await asyncio.sleep(0)
+
+    async def step(self):
+        """Advance the world by one fixed timestep"""
+        started = time.perf_counter()
+        store = self.entity_service
+
+        if store.count:
+            entity_ids = store.get_all_entity_ids()
+            columns = store.columns()
+            self.vision_service.update_entities(
+                entity_ids, columns['x'], columns['y'], store.society_name_array()
+            )
+            observation = self.vision_service.observe(entity_ids)
+            inputs = build_inputs(columns, observation)
+            if self.routed:
+                decisions = await self.cluster_service.decide(entity_ids, inputs, observation)
+            else:
+                decisions = self.brain_service.decide(entity_ids, inputs, observation)
+            action_index, target_x, target_y, has_target, _ = decisions
+            energy_before = columns['energy'].copy()
+            self._apply(columns, action_index, target_x, target_y, has_target)
+            if self._buried:
+                dead, self._buried = self._buried, []
+                await self.cluster_service.remove_brains(dead)
+            if self.brain_service.memory is not None:
+                await self._reward(np.asarray(entity_ids), energy_before)
+
+        self.tick += 1
+        self.simulation_time += self.dt
+        self._tick_started.append(started)
+        self._tick_durations.append(time.perf_counter() - started)
+
+        if self.statistics_service and self.tick % settings.STATS_SAMPLE_EVERY == 0:
+            self.statistics_service.record_sample(self.simulation_time)
+
+        if self.broadcast and self.tick % settings.SIM_BROADCAST_EVERY == 0:
+            await self.broadcast(self.snapshot())
+
+    def _apply(self, columns: Dict[str, np.ndarray], action_index: np.ndarray,
+               target_x: np.ndarray, target_y: np.ndarray, has_target: np.ndarray):
+        """Apply actions and integrate movement and energy for one tick, for every entity at once"""
+        dt = self.dt
+        x, y = columns['x'], columns['y']
+        vx, vy = columns['velocity_x'], columns['velocity_y']
+        columns['action'][:] = action_index
+
+        # Steer towards targets
+        dx = np.where(has_target, target_x - x, 0.0)
+        dy = np.where(has_target, target_y - y, 0.0)
+        dist = np.hypot(dx, dy)
+        steering = dist > 0
+        scale = np.divide(ACTION_SPEEDS[action_index], dist, out=np.zeros_like(dist), where=steering)
+        vx[steering] = (dx * scale)[steering]
+        vy[steering] = (dy * scale)[steering]
+
+        # Wanderers occasionally pick a new random heading
+        wandering = (action_index == 0) & (np.random.random(len(x)) < 0.03)
+        vx[wandering] = (np.random.random(wandering.sum()) - 0.5) * 0.6
+        vy[wandering] = (np.random.random(wandering.sum()) - 0.5) * 0.6
+
+        genes = columns['genes']
+        speed = 10 * (0.5 + genes[:, GENE_INDEX['speed']] * 0.5) * (1 + columns['diet_bonus'] * 0.3)
+        x += vx * dt * speed
+        y += vy * dt * speed
+        # Friction (Drag)
+        vx *= 0.95
+        vy *= 0.95
+
+        columns['age'] += dt
+        np.maximum(columns['reproduction_cooldown'] - dt, 0.0, out=columns['reproduction_cooldown'])
+        np.maximum(columns['communication_cooldown'] - dt, 0.0, out=columns['communication_cooldown'])
+        # Natural energy drain, more efficient means less drain
+        energy = columns['energy']
+        energy -= 2.0 * (1.0 - genes[:, GENE_INDEX['efficiency']] * 0.5) * dt
+        np.minimum(energy, 150.0, out=energy)
+
+        dead = self.entity_service.entity_ids()[energy <= 0].tolist()
+        if dead:
+            self._bury(dead)
+
+    async def _reward(self, entity_ids: np.ndarray, energy_before: np.ndarray):
+        """Credit each survivor's decision with its energy change over the tick"""
+        store = self.entity_service
+        survivors = store.entity_ids()
+        if not survivors.size:
+            return
+        order = np.argsort(entity_ids)
+        rows = order[np.searchsorted(entity_ids, survivors, sorter=order).clip(max=len(order) - 1)]
+        decided = entity_ids[rows] == survivors
+        energy = store.columns()['energy']
+        survivors, rewards = survivors[decided].tolist(), (energy - energy_before[rows])[decided]
+        if self.routed:
+            await self.cluster_service.reward(survivors, rewards)
+        else:
+            self.brain_service.reward(survivors, rewards)
+
+    def _bury(self, dead: List[int]):
+        """Remove entities that starved this tick, with their brains"""
+        for entity_id in dead:
+            self.entity_service.remove_entity(entity_id)
+            if not self.routed:
+                self.brain_service.remove_brain(entity_id)
+        if self.routed:
+            # Removed on their owners once the tick's arrays are applied
+            self._buried.extend(dead)
+        self.vision_service.remove_entities(dead)
+        self.deaths += len(dead)
+
+    def snapshot(self) -> dict:
+        """Positions and actions of every entity for viewers, as columns"""
+        columns = self.entity_service.columns()
+        return {
+            'type': 'world_state',
+            'tick': self.tick,
+            'simulation_time': self.simulation_time,
+            'entities': {
+                'ids': self.entity_service.get_all_entity_ids(),
+                'x': columns['x'].tolist(),
+                'y': columns['y'].tolist(),
+                'energy': columns['energy'].tolist(),
+                'action': columns['action'].tolist()
+            }
+        }
+
+    def status(self) -> dict:
+        """Scheduler health: achieved tick rate, tick cost and lag behind schedule"""
+        started = self._tick_started
+        durations = self._tick_durations
+        achieved = 0.0
+        if len(started) > 1 and started[-1] > started[0]:
+            achieved = (len(started) - 1) / (started[-1] - started[0])
+        lag = 0.0
+        if self.running:
+            lag = max(0.0, asyncio.get_running_loop().time() - self._next_tick)
+        return {
+            'running': self.running,
+            'tick': self.tick,
+            'simulation_time': self.simulation_time,
+            'target_tick_rate': self.tick_rate,
+            'tick_rate': achieved,
+            'tick_duration_ms': {
+                'mean': float(np.mean(durations)) * 1000 if durations else 0.0,
+                'max': float(np.max(durations)) * 1000 if durations else 0.0
+            },
+            'lag_ms': lag * 1000,
+            'dropped_ticks': self.dropped_ticks,
+            'deaths': self.deaths
+        }
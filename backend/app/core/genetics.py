@@ -0,0 +1,78 @@
+import math
+import torch
+from typing import Dict, Optional
+
+
+class GeneticsEngine:
+    """
+    Crossover and mutation for many parent pairs at once.
+
+    Each brain is handled as one flat genome row, the concatenation of all
+    its parameter tensors, so a whole reproduction wave is a few kernel
+    calls however many children it has. Semantics match EntityBrain:
+    uniform crossover picks every weight from either parent, and mutation
+    adds Gaussian noise to a whole parameter tensor of a child with
+    probability mutation_rate.
+
+    Random numbers come from a torch.Generator, so a given seed always
+    produces the same children from the same parents.
+    """
+
+    def __init__(self, shapes: Dict[str, torch.Size], device: torch.device, seed: Optional[int] = None):
+        self.device = device
+        self.names = list(shapes)
+        self.shapes = dict(shapes)
+        self.sizes = [math.prod(shape) for shape in self.shapes.values()]
+        # Parameter tensor index of every genome position
+        self.segments = torch.repeat_interleave(
+            torch.arange(len(self.sizes), device=device), torch.tensor(self.sizes, device=device)
+        )
+        self.generator = self._generator(seed)
+
+    def _generator(self, seed: Optional[int]) -> torch.Generator:
+        generator = torch.Generator(device=self.device)
+        if seed is None:
+            generator.seed()
+        else:
+            generator.manual_seed(seed)
+        return generator
+
+    def flatten(self, params: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Stacked [n, ...] parameter tensors as float32 genomes [n, total parameters]"""
+        count = len(params[self.names[0]])
+        return torch.cat([params[name].reshape(count, -1).to(torch.float32) for name in self.names], dim=1)
+
+    def unflatten(self, genomes: torch.Tensor) -> Dict[str, torch.Tensor]:
+        count = len(genomes)
+        return {
+            name: part.reshape(count, *self.shapes[name])
+            for name, part in zip(self.names, torch.split(genomes, self.sizes, dim=1))
+        }
+
+    def crossover(self, parents1: torch.Tensor, parents2: torch.Tensor,
+                  generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """Uniform crossover of genome rows, child i from parents1[i] and parents2[i]"""
+        generator = generator or self.generator
+        mask = torch.rand(parents1.shape, generator=generator, device=self.device) < 0.5
+        return torch.where(mask, parents1, parents2)
+
+    def mutate(self, genomes: torch.Tensor, mutation_rate: float = 0.1, mutation_strength: float = 0.05,
+               generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """Add noise to each (child, parameter tensor) with probability mutation_rate, in place"""
+        generator = generator or self.generator
+        chosen = torch.rand((len(genomes), len(self.sizes)), generator=generator, device=self.device) < mutation_rate
+        noise = torch.randn(genomes.shape, generator=generator, device=self.device)
+        genomes.add_(noise * chosen[:, self.segments] * mutation_strength)
+        return genomes
+
+    @torch.no_grad()
+    def reproduce(self, parents1: Dict[str, torch.Tensor], parents2: Dict[str, torch.Tensor],
+                  mutation_rate: float = 0.1, mutation_strength: float = 0.05,
+                  seed: Optional[int] = None) -> Dict[str, torch.Tensor]:
+        """
+        Children of stacked parent weights, row i from parents1 row i and
+        parents2 row i. With a seed the result does not depend on earlier calls.
+        """
+        generator = self._generator(seed) if seed is not None else self.generator
+        genomes = self.crossover(self.flatten(parents1), self.flatten(parents2), generator)
+        return self.unflatten(self.mutate(genomes, mutation_rate, mutation_strength, generator))
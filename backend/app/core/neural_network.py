@@ -1,48 +1,85 @@
 import torch
 import torch.nn as nn
 import numpy as np
+from typing import List, Optional
+from app.config import settings
+from app.core.quantization import storage_bytes
 
 class EntityBrain(nn.Module):
     """Neural network model for entity decision making."""
 
-    def __init__(self, input_size: int = 20, hidden_size: int = 64, output_size: int = 5):
+    def __init__(
+        self,
+        input_size: int = 20,
+        hidden_size: int = 64,
+        output_size: int = 5,
+        num_layers: int = 2,
+        hidden_sizes: Optional[List[int]] = None,
+        layer_norm: bool = True,
+        dropout: float = 0.2
+    ):
         super(EntityBrain, self).__init__()
+        self.config = {
+            'input_size': input_size,
+            'hidden_size': hidden_size,
+            'output_size': output_size,
+            'num_layers': num_layers,
+            'hidden_sizes': list(hidden_sizes) if hidden_sizes else None,
+            'layer_norm': layer_norm,
+            'dropout': dropout
+        }
 
-        
-        self.fc1 = nn.Linear(input_size, 128)     
-        self.ln1 = nn.LayerNorm(128)
-        self.fc2 = nn.Linear(128, 256)    
-        self.ln2 = nn.LayerNorm(256)
-        self.fc3 = nn.Linear(256, 512)    
-        self.ln3 = nn.LayerNorm(512)
-        self.fc4 = nn.Linear(512, 256)    
-        self.ln4 = nn.LayerNorm(256)
-        self.fc5 = nn.Linear(256, 128)    
-        self.ln5 = nn.LayerNorm(128)
-        self.fc6 = nn.Linear(128, 5)      
+        # Explicit widths win, otherwise num_layers layers of hidden_size
+        widths = list(hidden_sizes) if hidden_sizes else [hidden_size] * num_layers
+        sizes = [input_size] + widths
+        self.hidden_layers = len(widths)
+
+        # Layers are registered as fc1/ln1 ... fcN so state_dict keys stay stable
+        for index, (fan_in, fan_out) in enumerate(zip(sizes, sizes[1:]), start=1):
+            setattr(self, f"fc{index}", nn.Linear(fan_in, fan_out))
+            if layer_norm:
+                setattr(self, f"ln{index}", nn.LayerNorm(fan_out))
+        setattr(self, f"fc{self.hidden_layers + 1}", nn.Linear(sizes[-1], output_size))
 
         self.relu = nn.ReLU()
-        self.dropout = nn.Dropout(p=0.2)
+        self.dropout = nn.Dropout(p=dropout)
         self.softmax = nn.Softmax(dim=-1)
 
+    @classmethod
+    def from_settings(cls) -> 'EntityBrain':
+        """Build a brain with the architecture configured in settings"""
+        return cls(
+            # Matches JS inputs (20), plus remembered ticks of observation, action one-hot and reward
+            input_size=settings.NN_INPUT_SIZE
+            + settings.MEMORY_INPUT_STEPS * (settings.NN_INPUT_SIZE + settings.NN_OUTPUT_SIZE + 1),
+            hidden_size=settings.NN_HIDDEN_SIZE,
+            output_size=settings.NN_OUTPUT_SIZE,
+            num_layers=settings.NN_HIDDEN_LAYERS,
+            hidden_sizes=settings.NN_HIDDEN_SIZES,
+            layer_norm=settings.NN_LAYER_NORM,
+            dropout=settings.NN_DROPOUT
+        )
+
     def forward(self, x):
         """Process inputs and return action probabilities."""
-        x = self.relu(self.ln1(self.fc1(x)))
-        x = self.relu(self.ln2(self.fc2(x)))
-        x = self.dropout(x)
-        x = self.relu(self.ln3(self.fc3(x)))
-        x = self.relu(self.ln4(self.fc4(x)))
-        x = self.dropout(x)
-        x = self.relu(self.ln5(self.fc5(x)))
-        x = self.softmax(self.fc6(x))
+        for index in range(1, self.hidden_layers + 1):
+            x = getattr(self, f"fc{index}")(x)
+            if self.config['layer_norm']:
+                x = getattr(self, f"ln{index}")(x)
+            x = self.relu(x)
+            # Dropout after every second hidden layer
+            if index % 2 == 0:
+                x = self.dropout(x)
+        x = self.softmax(getattr(self, f"fc{self.hidden_layers + 1}")(x))
         return x
 
     def mutate(self, mutation_rate: float = 0.1, mutation_strength: float = 0.05):
         with torch.no_grad():
             for param in self.parameters():
                 if np.random.random() < mutation_rate:
-                    noise = torch.randn_like(param) * mutation_strength
-                    param.add_(noise)
+                    # Add noise in float32 so small steps survive half-precision params
+                    noise = torch.randn(param.shape, device=param.device) * mutation_strength
+                    param.copy_(param.float() + noise)
 
     @staticmethod
     def crossover(parent1: 'EntityBrain', parent2: 'EntityBrain') -> 'EntityBrain':
@@ -50,7 +87,8 @@ class EntityBrain(nn.Module):
         Create a child brain from two parents via crossover.
         Randomly selects weights from each parent.
         """
-        child = EntityBrain()
+        reference = next(parent1.parameters())
+        child = EntityBrain(**parent1.config).to(reference.device, reference.dtype)
         with torch.no_grad():
             for child_param, p1_param, p2_param in zip(
                 child.parameters(), parent1.parameters(), parent2.parameters()
@@ -60,3 +98,36 @@ class EntityBrain(nn.Module):
         return child
 
 
+def brain_memory_report(brain: EntityBrain, population: int, storage_dtype: str = 'float32') -> dict:
+    """Bytes per brain and for a whole population of them"""
+    param_count = sum(p.numel() for p in brain.parameters())
+    shapes = {name: tensor.shape for name, tensor in brain.state_dict().items()}
+    bytes_per_brain = storage_bytes(shapes, storage_dtype)
+    return {
+        'parameters_per_brain': param_count,
+        'storage_dtype': storage_dtype,
+        'bytes_per_brain': bytes_per_brain,
+        'population': population,
+        'population_bytes': bytes_per_brain * population,
+        'budget_bytes': int(settings.BRAIN_MEMORY_BUDGET_MB * 1024 * 1024)
+    }
+
+
+def check_brain_memory_budget(population: Optional[int] = None) -> dict:
+    """
+    Report brain memory for the configured architecture at MAX_ENTITIES,
+    or at the hot set size when brains past it spill to disk.
+    Raises ValueError if the population would not fit in the memory budget.
+    """
+    if population is None:
+        population = settings.MAX_ENTITIES
+        if settings.BRAIN_HOT_SET_SIZE:
+            population = min(population, settings.BRAIN_HOT_SET_SIZE)
+    report = brain_memory_report(EntityBrain.from_settings(), population, settings.BRAIN_STORAGE_DTYPE)
+    if report['population_bytes'] > report['budget_bytes']:
+        raise ValueError(
+            f"Brain population needs {report['population_bytes'] / 1024 ** 2:.1f} MB "
+            f"({report['bytes_per_brain']} bytes x {report['population']}), "
+            f"over BRAIN_MEMORY_BUDGET_MB={settings.BRAIN_MEMORY_BUDGET_MB}"
+        )
+    return report
@@ -0,0 +1,53 @@
+import torch
+from typing import Dict, Tuple
+
+# Supported BRAIN_STORAGE_DTYPE values
+STORAGE_DTYPES = {
+    'float32': torch.float32,
+    'float16': torch.float16,
+    'bfloat16': torch.bfloat16,
+    'int8': torch.int8
+}
+
+
+def resolve_storage_dtype(name: str) -> torch.dtype:
+    """Look up a storage dtype by its settings name"""
+    if name not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown brain storage dtype '{name}', expected one of {list(STORAGE_DTYPES)}")
+    return STORAGE_DTYPES[name]
+
+
+def is_quantized_param(name: str, shape: torch.Size, storage_dtype: str) -> bool:
+    """int8 storage only applies to linear weights; biases and norms stay float32"""
+    return storage_dtype == 'int8' and name.endswith('.weight') and len(shape) == 2
+
+
+def quantize_per_channel(weight: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Symmetric int8 quantization with one scale per output channel.
+    Works on a single [out, in] weight or a stacked [n, out, in] batch.
+    """
+    scale = weight.abs().amax(dim=-1).clamp(min=1e-8) / 127.0
+    quantized = torch.round(weight / scale.unsqueeze(-1)).clamp(-127, 127).to(torch.int8)
+    return quantized, scale.to(torch.float32)
+
+
+def dequantize_per_channel(quantized: torch.Tensor, scale: torch.Tensor) -> torch.Tensor:
+    """Inverse of quantize_per_channel, returns float32"""
+    return quantized.to(torch.float32) * scale.unsqueeze(-1)
+
+
+def storage_bytes(shapes: Dict[str, torch.Size], storage_dtype: str) -> int:
+    """Bytes one brain takes in a bank using the given storage dtype"""
+    dtype = resolve_storage_dtype(storage_dtype)
+    total = 0
+    for name, shape in shapes.items():
+        numel = shape.numel()
+        if is_quantized_param(name, shape, storage_dtype):
+            # int8 codes plus one float32 scale per output channel
+            total += numel + shape[0] * 4
+        elif storage_dtype == 'int8':
+            total += numel * 4
+        else:
+            total += numel * torch.empty((), dtype=dtype).element_size()
+    return total
@@ -0,0 +1,379 @@
+"""
+Headless evolution runner: the whole loop in-process, with no HTTP,
+WebSockets or browser involved. Run from backend/:
+
+    python -m app.headless --generations 50 --scale 5
+    python -m app.headless --mutation-rates 0.05 0.15 0.3 --crossover-rates 0.5 0.7 0.9 --seeds 3
+
+Every (mutation rate, crossover rate, seed) candidate evolves its own world
+from SOCIETIES. Candidates run in parallel, one process each, and write one
+JSON line of metrics per generation to --out, plus a summary.json ranking
+them once all are done.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+import numpy as np
+import torch
+from app.config import settings
+from app.core.evolution import GENE_INDEX, SimulationLoop
+from app.models.society import SOCIETIES
+from app.services.brain_service import BrainService
+from app.services.entity_service import GENE_NAMES, EntityService
+from app.services.vision_service import RESOURCE_CODES, RESOURCE_TYPES, VisionService
+
+# Food, matching the frontend: collision radius, amount per resource and what a bite is worth
+EAT_RADIUS = 15.0
+RESOURCE_AMOUNT = 100.0
+BITE = np.array([
+    [20.0 if resource == 'universal' else 25.0 for resource in RESOURCE_TYPES]
+    for _ in SOCIETIES
+])
+PLANT_ENERGY_BONUS = 5.0
+MEAT_DIET_BONUS = 0.3
+MINERAL_EFFICIENCY_GAIN = 0.01
+
+# Fittest share of each society that parents the next generation
+PARENT_FRACTION = 0.25
+# Spread of the uniform noise added to inherited genes (the frontend's inherit())
+GENE_NOISE = 0.15
+
+
+class HeadlessEvolution(SimulationLoop):
+    """
+    Generational evolution on top of SimulationLoop.
+
+    Each generation is an episode of generation_ticks fixed timesteps (or
+    until everyone has starved) in a freshly laid out world. Entities eat
+    whatever edible food they touch; fitness is the energy gathered plus
+    the seconds survived. The fittest PARENT_FRACTION of every society
+    then parents a full new population: brains through
+    BrainService.reproduce_batch, genes the way the frontend inherits them.
+    With probability 1 - crossover_rate a child has a single parent.
+
+    Brains of entities that starve stay in the bank until the generation
+    ends, since they can still be picked as parents.
+    """
+
+    def __init__(self, mutation_rate: float, crossover_rate: float, scale: int = 1,
+                 generation_ticks: int = 600, seed: Optional[int] = None):
+        super().__init__(EntityService(), BrainService(), VisionService())
+        self.mutation_rate = mutation_rate
+        self.crossover_rate = crossover_rate
+        self.generation_ticks = generation_ticks
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        if seed is not None:
+            # SimulationLoop and fresh brains use the global generators
+            np.random.seed(seed)
+            torch.manual_seed(seed)
+
+        self.society_names = list(SOCIETIES)
+        self.population = {name: society.starting_population * scale for name, society in SOCIETIES.items()}
+        self.scale = scale
+        # Larger populations get a proportionally larger map, keeping the browser world's densities
+        self.stretch = math.sqrt(scale)
+        self.generation = 0
+        self.next_entity_id = 0
+        self.next_resource_id = 0
+
+        # Per-entity bookkeeping of the current generation, by entity_id - first_id
+        self.first_id = 0
+        self.society = np.zeros(0, dtype=np.int64)
+        self.genes = np.zeros((0, len(GENE_NAMES)), dtype=np.float32)
+        self.gathered = np.zeros(0)
+        self.lifetime = np.zeros(0)
+
+    def _scatter(self, territory, count: int):
+        """Random positions inside a territory, stretched with the map"""
+        x = (territory.x + self.rng.random(count) * territory.width) * self.stretch
+        y = (territory.y + self.rng.random(count) * territory.height) * self.stretch
+        return x, y
+
+    def _lay_out_food(self):
+        """Fresh resources as the frontend spawns them, scaled with the population"""
+        xs, ys, types = [], [], []
+        for society in SOCIETIES.values():
+            for food_type, count in ((society.preferred_food[0], 30), ('universal', 100)):
+                count *= self.scale
+                x, y = self._scatter(society.territory, count)
+                xs.append(x)
+                ys.append(y)
+                types += [food_type] * count
+        count = 500 * self.scale
+        xs.append((self.rng.random(count) * 1600 - 800) * self.stretch)
+        ys.append((self.rng.random(count) * 1200 - 600) * self.stretch)
+        types += [RESOURCE_TYPES[code] for code in self.rng.integers(len(RESOURCE_TYPES), size=count)]
+
+        ids = list(range(self.next_resource_id, self.next_resource_id + len(types)))
+        self.next_resource_id += len(types)
+        self.vision_service.update_resources(
+            ids, np.concatenate(xs), np.concatenate(ys), types, np.full(len(types), RESOURCE_AMOUNT)
+        )
+
+    def _populate(self, society: np.ndarray, genes: np.ndarray,
+                  parent1_ids: Optional[np.ndarray] = None, parent2_ids: Optional[np.ndarray] = None):
+        """Replace the world with a new generation of entities"""
+        count = len(society)
+        self.generation += 1
+        self.first_id = self.next_entity_id
+        self.next_entity_id += count
+        self.society = society
+        self.genes = genes
+        self.gathered = np.zeros(count)
+        self.lifetime = np.zeros(count)
+
+        x = np.zeros(count)
+        y = np.zeros(count)
+        lifespan = np.zeros(count)
+        for code, society_model in enumerate(SOCIETIES.values()):
+            rows = society == code
+            x[rows], y[rows] = self._scatter(society_model.territory, rows.sum())
+            lifespan[rows] = society_model.base_lifespan
+
+        columns = {
+            'x': x,
+            'y': y,
+            'lifespan': lifespan,
+            'generation': np.full(count, self.generation),
+            'society': society,
+            'genes': genes
+        }
+        if parent1_ids is not None:
+            columns['parent1_id'] = parent1_ids
+            columns['parent2_id'] = parent2_ids
+        entity_ids = np.arange(self.first_id, self.first_id + count)
+        self.entity_service.load_columns(entity_ids, columns, self.society_names)
+        self.vision_service.clear()
+        self._lay_out_food()
+        self.reset()
+
+    def seed_world(self):
+        """First generation: starting populations of every society with random genes and brains"""
+        society = np.repeat(np.arange(len(self.society_names)), list(self.population.values()))
+        genes = self.rng.random((len(society), len(GENE_NAMES))).astype(np.float32)
+        self._populate(society, genes)
+
+    def _apply(self, columns: Dict[str, np.ndarray], action_index: np.ndarray,
+               target_x: np.ndarray, target_y: np.ndarray, has_target: np.ndarray):
+        super()._apply(columns, action_index, target_x, target_y, has_target)
+        store = self.entity_service
+        if not store.count:
+            return
+        columns = store.columns()
+        rows = store.entity_ids() - self.first_id
+        self.lifetime[rows] = columns['age']
+
+        eaten, taken = self.vision_service.consume_food(
+            columns['x'], columns['y'], store.society_name_array(), BITE, EAT_RADIUS
+        )
+        columns['energy'] += taken
+        columns['energy'][eaten == RESOURCE_CODES['plant']] += PLANT_ENERGY_BONUS
+        columns['diet_bonus'][eaten == RESOURCE_CODES['meat']] = MEAT_DIET_BONUS
+        self.gathered[rows] += taken
+
+        minerals = np.flatnonzero(eaten == RESOURCE_CODES['mineral'])
+        if minerals.size:
+            genes = columns['genes'][minerals].copy()
+            efficiency = GENE_INDEX['efficiency']
+            genes[:, efficiency] = np.minimum(1.0, genes[:, efficiency] + MINERAL_EFFICIENCY_GAIN)
+            store.update_entities(store.entity_ids()[minerals].tolist(), genes=genes)
+
+    def _bury(self, dead: List[int]):
+        for entity_id in dead:
+            self.entity_service.remove_entity(entity_id)
+        self.vision_service.remove_entities(dead)
+        self.deaths += len(dead)
+
+    def fitness(self) -> np.ndarray:
+        """Energy gathered plus seconds survived, per entity of the current generation"""
+        return self.gathered + self.lifetime
+
+    async def run_generation(self) -> dict:
+        """Run one episode, breed the next generation and return this one's metrics"""
+        started = time.perf_counter()
+        for _ in range(self.generation_ticks):
+            if not self.entity_service.count:
+                break
+            await self.step()
+        metrics = self.metrics(time.perf_counter() - started)
+        await self.breed()
+        metrics['seconds'] = time.perf_counter() - started
+        return metrics
+
+    async def breed(self):
+        """Replace the population with children of the fittest of each society"""
+        fitness = self.fitness()
+        parent1_rows, parent2_rows, societies = [], [], []
+        for code, name in enumerate(self.society_names):
+            members = np.flatnonzero(self.society == code)
+            if members.size == 0:
+                continue
+            pool_size = max(2, math.ceil(len(members) * PARENT_FRACTION))
+            pool = members[np.argsort(-fitness[members], kind='stable')[:pool_size]]
+            count = self.population[name]
+            parent1 = pool[self.rng.integers(len(pool), size=count)]
+            parent2 = pool[self.rng.integers(len(pool), size=count)]
+            single = self.rng.random(count) >= self.crossover_rate
+            parent2[single] = parent1[single]
+            parent1_rows.append(parent1)
+            parent2_rows.append(parent2)
+            societies.append(np.full(count, code))
+
+        parent1 = np.concatenate(parent1_rows)
+        parent2 = np.concatenate(parent2_rows)
+        society = np.concatenate(societies)
+        genes = (self.genes[parent1] + self.genes[parent2]) / 2
+        genes += (self.rng.random(genes.shape) - 0.5) * GENE_NOISE
+        genes = np.clip(genes, 0.0, 1.0).astype(np.float32)
+
+        parent1_ids = parent1 + self.first_id
+        parent2_ids = parent2 + self.first_id
+        child_ids = list(range(self.next_entity_id, self.next_entity_id + len(society)))
+        seed = None if self.seed is None else self.seed * 1_000_003 + self.generation
+        await self.brain_service.reproduce_batch(
+            parent1_ids.tolist(), parent2_ids.tolist(), child_ids, seed=seed, mutation_rate=self.mutation_rate
+        )
+        for entity_id in range(self.first_id, self.first_id + len(self.society)):
+            self.brain_service.remove_brain(entity_id)
+        self._populate(society, genes, parent1_ids, parent2_ids)
+
+    def metrics(self, seconds: float) -> dict:
+        """Per-generation results, overall and per society"""
+        fitness = self.fitness()
+        alive = np.zeros(len(fitness), dtype=bool)
+        alive[self.entity_service.entity_ids() - self.first_id] = True
+        societies = {}
+        for code, name in enumerate(self.society_names):
+            rows = self.society == code
+            if rows.any():
+                societies[name] = {
+                    'survivors': int(alive[rows].sum()),
+                    'fitness_mean': float(fitness[rows].mean()),
+                    'fitness_max': float(fitness[rows].max())
+                }
+        return {
+            'generation': self.generation,
+            'population': len(fitness),
+            'survivors': int(alive.sum()),
+            'ticks': self.tick,
+            'fitness_mean': float(fitness.mean()),
+            'fitness_max': float(fitness.max()),
+            'food_gathered': float(self.gathered.sum()),
+            'lifetime_mean': float(self.lifetime.mean()),
+            'genes_mean': dict(zip(GENE_NAMES, self.genes.mean(axis=0).tolist())),
+            'societies': societies,
+            'ticks_per_second': self.tick / seconds if seconds > 0 else 0.0
+        }
+
+
+async def _evolve(candidate: dict) -> dict:
+    run = HeadlessEvolution(
+        candidate['mutation_rate'],
+        candidate['crossover_rate'],
+        scale=candidate['scale'],
+        generation_ticks=candidate['ticks'],
+        seed=candidate['seed']
+    )
+    run.seed_world()
+    path = os.path.join(candidate['out'], f"{candidate['name']}.jsonl")
+    started = time.perf_counter()
+    last = {}
+    with open(path, 'w') as f:
+        for _ in range(candidate['generations']):
+            last = await run.run_generation()
+            f.write(json.dumps(last) + "\n")
+            f.flush()
+    elapsed = time.perf_counter() - started
+    run.brain_service.close()
+    return {
+        'name': candidate['name'],
+        'mutation_rate': candidate['mutation_rate'],
+        'crossover_rate': candidate['crossover_rate'],
+        'seed': candidate['seed'],
+        'generations': candidate['generations'],
+        'final_fitness_mean': last.get('fitness_mean', 0.0),
+        'final_fitness_max': last.get('fitness_max', 0.0),
+        'generations_per_second': candidate['generations'] / elapsed if elapsed > 0 else 0.0,
+        'metrics': path
+    }
+
+
+def run_candidate(candidate: dict) -> dict:
+    """Evolve one candidate to completion, the unit of work of a worker process"""
+    torch.set_num_threads(candidate['threads'])
+    return asyncio.run(_evolve(candidate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=600, help="Ticks per generation, at SIM_TICK_RATE per simulated second")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Multiplier on every society's starting population and food, the map grows to match")
+    parser.add_argument("--mutation-rates", type=float, nargs="+", default=[settings.MUTATION_RATE])
+    parser.add_argument("--crossover-rates", type=float, nargs="+", default=[settings.CROSSOVER_RATE])
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per rate combination, seeded 0..n-1")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Candidates evolved in parallel")
+    parser.add_argument("--out", default=os.path.join(settings.DATA_DIR, "headless", time.strftime("%Y%m%d_%H%M%S")))
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    combinations = list(itertools.product(args.mutation_rates, args.crossover_rates, range(args.seeds)))
+    workers = max(1, min(args.workers, len(combinations)))
+    # Split the cores between workers so they do not oversubscribe them
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    candidates = [
+        {
+            'name': f"m{mutation_rate:g}_c{crossover_rate:g}_s{seed}",
+            'mutation_rate': mutation_rate,
+            'crossover_rate': crossover_rate,
+            'seed': seed,
+            'scale': args.scale,
+            'ticks': args.ticks,
+            'generations': args.generations,
+            'threads': threads,
+            'out': args.out
+        }
+        for mutation_rate, crossover_rate, seed in combinations
+    ]
+    print(f"{len(candidates)} candidates, {args.generations} generations each, "
+          f"{workers} workers x {threads} threads, metrics in {args.out}")
+
+    started = time.perf_counter()
+    summaries = []
+    if workers == 1:
+        for candidate in candidates:
+            summaries.append(run_candidate(candidate))
+            print(f"{candidate['name']}: {summaries[-1]['generations_per_second']:.2f} gen/s, "
+                  f"fitness {summaries[-1]['final_fitness_mean']:.1f}")
+    else:
+        # spawn, since forking a process that already initialized torch is unsafe
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for future in as_completed([pool.submit(run_candidate, candidate) for candidate in candidates]):
+                summary = future.result()
+                summaries.append(summary)
+                print(f"{summary['name']}: {summary['generations_per_second']:.2f} gen/s, "
+                      f"fitness {summary['final_fitness_mean']:.1f}")
+    elapsed = time.perf_counter() - started
+
+    summaries.sort(key=lambda summary: summary['final_fitness_mean'], reverse=True)
+    total_generations = args.generations * len(candidates)
+    with open(os.path.join(args.out, "summary.json"), 'w') as f:
+        json.dump({
+            'generations_per_second': total_generations / elapsed if elapsed > 0 else 0.0,
+            'seconds': elapsed,
+            'candidates': summaries
+        }, f, indent=2)
+    print(f"{total_generations} generations in {elapsed:.1f}s, {total_generations / elapsed:.2f} gen/s overall")
+
+
+if __name__ == "__main__":
+    main()
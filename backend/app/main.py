@@ -1,14 +1,68 @@
+import time
+
+# Cold start is measured from here, the first line the server runs of the app
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import settings
 from app.api.routes import entities, simulation, statistics, world
 from app.api.websocket import router as websocket_router
-from app.services.entity_service import EntityService
+from app.api.metrics import RequestMetricsMiddleware, router as metrics_router
+from app.services.container import ServicesUnavailable, services
+from app.services.entity_service import entity_service
+
+
+async def warm_up():
+    """Import torch and build the brain services in the background, then start autosaves"""
+    try:
+        report = await asyncio.to_thread(services.warm_up)
+    except Exception as e:
+        print(f"Startup failed: {e}")
+        return
+    print(
+        f"Brain memory: {report['parameters_per_brain']} params, "
+        f"{report['bytes_per_brain'] / 1024:.1f} KB per brain as {report['storage_dtype']}, "
+        f"{report['population_bytes'] / 1024 ** 2:.1f} MB for {report['population']} entities "
+        f"(budget {report['budget_bytes'] / 1024 ** 2:.0f} MB)"
+    )
+    steps = ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in services.timings.items())
+    print(f"Startup: brain services ready ({steps})")
+    # Other nodes can reach this one's brains from here on
+    await services.cluster_service.start()
+    # Periodic background checkpoints of the simulated world
+    services.world_service.start_autosave(services.simulation.status)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requests are served straight away, torch loads while /health already answers
+    warm_up_task = asyncio.create_task(warm_up())
+    # Evolution time series for worlds the browser drives, not just the simulation loop
+    services.stats_service.start_sampler()
+    services.app_ready_seconds = time.perf_counter() - IMPORT_STARTED
+    print(f"Startup: accepting requests {services.app_ready_seconds * 1000:.0f} ms after import")
+    yield
+    await warm_up_task
+    await services.stats_service.stop_sampler()
+    if services.built("world_service"):
+        await services.world_service.stop_autosave()
+    if services.built("simulation"):
+        await services.simulation.pause()
+    if services.built("cluster_service"):
+        await services.cluster_service.close()
+    if services.built("brain_service"):
+        services.brain_service.close()
+
 
 app = FastAPI(
     title="Evolving Societies API",
     description="Neural network-based artificial life simulation",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 
@@ -19,6 +73,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route latency histograms for /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
 
 app.include_router(entities.router, prefix="/api/entities", tags=["entities"])
@@ -26,8 +82,12 @@ app.include_router(simulation.router, prefix="/api/simulation", tags=["simulatio
 app.include_router(statistics.router, prefix="/api/statistics", tags=["statistics"])
 app.include_router(world.router, prefix="/api/world", tags=["world"])
 app.include_router(websocket_router)
+app.include_router(metrics_router, tags=["monitoring"])
 
-entity_service = EntityService()
+@app.exception_handler(ServicesUnavailable)
+async def services_unavailable(request, exc: ServicesUnavailable):
+    # Over the brain memory budget (or otherwise unbuildable): serve no decisions at all
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 @app.get("/")
 async def root():
@@ -42,5 +102,8 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    """Liveness without touching the brains; 503 if warming them up failed"""
+    if services.warm_error is not None:
+        return JSONResponse(status_code=503, content={"status": "unhealthy", "error": services.warm_error})
+    return {"status": "healthy", "brains": "ready" if services.ready else "warming"}
 
@@ -1,17 +1,45 @@
 from pydantic import BaseModel
 from typing import List, Optional
-from app.models.entity import EntityState
+# Pydantic only accepts typing_extensions' TypedDict before Python 3.12
+from typing_extensions import TypedDict
+
+class DecisionState(TypedDict, total=False):
+    """
+    The state fields a decision reads: what is nearby and where. Validated
+    to plain dicts, other fields a client sends are dropped and missing
+    ones count as nothing nearby.
+    """
+    nearby_food: int
+    food_x: float
+    food_y: float
+    nearby_enemies: int
+    enemy_x: float
+    enemy_y: float
+    nearby_allies: int
+    ally_x: float
+    ally_y: float
 
 class DecisionRequest(BaseModel):
     id: int
     inputs: List[float]
-    state: EntityState
+    state: DecisionState
+
+class BatchDecisionRequest(BaseModel):
+    ids: List[int]
+    inputs: List[List[float]]
+    states: List[DecisionState]
 
 class ReproductionRequest(BaseModel):
     parent1_id: int
     parent2_id: int
     child_id: int
 
+class ReproductionBatchRequest(BaseModel):
+    parent1_ids: List[int]
+    parent2_ids: List[int]
+    child_ids: List[int]
+    seed: Optional[int] = None
+
 class EntityCreateRequest(BaseModel):
     x: float
     y: float
@@ -27,5 +55,12 @@ class SaveWorldRequest(BaseModel):
 class LoadWorldRequest(BaseModel):
     filename: str
 
+class SaveCheckpointRequest(BaseModel):
+    world_state: dict
+    name: Optional[str] = None
+
+class LoadCheckpointRequest(BaseModel):
+    name: str
+
 class SimulationControlRequest(BaseModel):
     action: str  
@@ -1,13 +1,110 @@
+import time
 import torch
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from app.core.neural_network import EntityBrain
+from app.core.brain_bank import BrainBank
+from app.core.brain_shards import ShardedInference, ShardWorkerError
 from app.core.decision_engine import DecisionEngine
+from app.core.decision_batcher import DECISION_PHASE_SECONDS, DecisionBatcher
+from app.core.decision_cache import DecisionCache
+from app.core.genetics import GeneticsEngine
+from app.services.memory_service import MemoryService
 from app.config import settings
 
+# Map action index to action type
+ACTION_TYPES = ['wander', 'gather', 'fight', 'mate', 'socialize']
+
+# Actions that need something nearby: action index -> (count key, target x key, target y key)
+TARGETED_ACTIONS = {
+    1: ('nearby_food', 'food_x', 'food_y'),
+    2: ('nearby_enemies', 'enemy_x', 'enemy_y'),
+    3: ('nearby_allies', 'ally_x', 'ally_y'),
+}
+
+
+# Per-entity state dicts, or one array per state key
+States = Union[List[dict], Dict[str, np.ndarray]]
+
+# Every state key select_actions reads
+STATE_KEYS = [key for keys in TARGETED_ACTIONS.values() for key in keys]
+
+def _state_values(states: States, key: str, rows: np.ndarray) -> np.ndarray:
+    """Values of one state key at the given rows"""
+    if isinstance(states, dict):
+        return np.asarray(states[key], dtype=float)[rows]
+    return np.array([states[row].get(key, 0) for row in rows], dtype=float)
+
+
+def state_columns(states: States, count: int) -> Dict[str, np.ndarray]:
+    """States as one array per key select_actions reads"""
+    rows = np.arange(count)
+    return {key: _state_values(states, key, rows) for key in STATE_KEYS}
+
+
+def select_actions(decision_probs: np.ndarray, states: States) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pick an action per row of probabilities and resolve its target.
+    Actions whose target is missing from the state fall back to 'wander'.
+    """
+    count = len(decision_probs)
+    action_index = np.minimum(np.argmax(decision_probs, axis=1), len(ACTION_TYPES) - 1)
+    target_x = np.zeros(count)
+    target_y = np.zeros(count)
+    has_target = np.zeros(count, dtype=bool)
+
+    for index, (count_key, x_key, y_key) in TARGETED_ACTIONS.items():
+        chosen = np.flatnonzero(action_index == index)
+        if chosen.size == 0:
+            continue
+        nearby = _state_values(states, count_key, chosen)
+        action_index[chosen[nearby == 0]] = 0
+
+        targeted = chosen[nearby > 0]
+        target_x[targeted] = _state_values(states, x_key, targeted)
+        target_y[targeted] = _state_values(states, y_key, targeted)
+        has_target[targeted] = True
+
+    return action_index, target_x, target_y, has_target
+
+
+def no_decisions() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """BrainService.decide's arrays for an empty batch"""
+    return (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), np.zeros(0, dtype=bool),
+            np.zeros((0, settings.NN_OUTPUT_SIZE), dtype=np.float32))
+
+
+def decisions_result(entity_ids: Sequence[int], action_index: np.ndarray, target_x: np.ndarray,
+                     target_y: np.ndarray, has_target: np.ndarray, decision_probs: np.ndarray) -> dict:
+    """decisions_batch_result message for arrays as returned by BrainService.decide"""
+    started = time.perf_counter()
+    decisions = []
+    for row, (entity_id, probs) in enumerate(zip(entity_ids, decision_probs.tolist())):
+        #action response
+        action = {
+            'type': ACTION_TYPES[action_index[row]],
+            'vx': 0.0,
+            'vy': 0.0
+        }
+        if has_target[row]:
+            action['target_x'] = float(target_x[row])
+            action['target_y'] = float(target_y[row])
+
+        decisions.append({
+            'entity_id': entity_id,
+            'action': action,
+            'action_probabilities': probs
+        })
+
+    DECISION_PHASE_SECONDS.observe(time.perf_counter() - started, "serialize_json")
+    return {
+        'type': 'decisions_batch_result',
+        'decisions': decisions
+    }
+
+
 class BrainService:
     def __init__(self):
-        self.entity_brains: Dict[int, EntityBrain] = {}
         self.decision_engine = DecisionEngine()
         
         if torch.backends.mps.is_available():
@@ -20,96 +117,204 @@ class BrainService:
             self.device = torch.device("cpu")
             print(f"BrainService: Running on CPU ")
 
+        # Initialize brains using settings architecture
+        self.bank = BrainBank(
+            EntityBrain.from_settings(),
+            self.device,
+            storage_dtype=settings.BRAIN_STORAGE_DTYPE,
+            lowp_matmul=settings.BRAIN_LOWP_MATMUL,
+            max_resident=settings.BRAIN_HOT_SET_SIZE,
+            spill_dir=settings.BRAIN_SPILL_DIR
+        )
+
+        # Without dropout decisions are a pure function of weights and inputs
+        self.bank.training = not settings.BRAIN_EVAL_MODE
+        self.decision_cache: Optional[DecisionCache] = None
+        if settings.DECISION_CACHE_SIZE > 0:
+            if settings.BRAIN_EVAL_MODE:
+                self.decision_cache = DecisionCache(settings.DECISION_CACHE_SIZE, settings.DECISION_CACHE_QUANTUM)
+            else:
+                print("BrainService: The decision cache needs BRAIN_EVAL_MODE (dropout makes decisions random), caching disabled")
+
+        # Recent ticks of every entity, optionally fed back to its brain
+        self.memory: Optional[MemoryService] = None
+        if settings.MEMORY_INPUT_STEPS > settings.MEMORY_STEPS:
+            raise ValueError(
+                f"MEMORY_INPUT_STEPS={settings.MEMORY_INPUT_STEPS} needs at least as many MEMORY_STEPS, "
+                f"got {settings.MEMORY_STEPS}"
+            )
+        if settings.MEMORY_STEPS > 0:
+            self.memory = MemoryService(
+                settings.MEMORY_STEPS, settings.NN_INPUT_SIZE, settings.NN_OUTPUT_SIZE,
+                capacity=settings.MAX_ENTITIES
+            )
+
+        # Batched crossover/mutation on stacked weights, seeded for reproducible runs
+        self.genetics = GeneticsEngine(self.bank.shapes, self.device, seed=settings.GENETICS_SEED)
+
+        # Optional multi-process inference, CPU only since workers read the bank's shared memory
+        self.shards: Optional[ShardedInference] = None
+        if settings.BRAIN_INFERENCE_WORKERS > 0:
+            if self.device.type == "cpu":
+                self.shards = ShardedInference(
+                    self.bank,
+                    settings.BRAIN_INFERENCE_WORKERS,
+                    ring_slots=settings.BRAIN_SHARD_RING_SLOTS,
+                    slot_rows=settings.BRAIN_SHARD_SLOT_ROWS
+                )
+            else:
+                print(f"BrainService: Inference workers need the CPU device, running in-process on {self.device.type}")
+
+        # Decision requests from every connection share forward passes
+        self.batcher = DecisionBatcher(
+            self.decide,
+            state_columns,
+            max_batch_size=settings.DECISION_BATCH_MAX_SIZE,
+            max_wait=settings.DECISION_BATCH_MAX_WAIT_MS / 1000.0
+        )
+
     async def process_decision(self, entity_id: int, inputs: list, state: dict):
         """Process entity decision using neural network"""
-        
-        
-        if entity_id not in self.entity_brains:
-            # Initialize brain using settings dimensions
-            brain = EntityBrain(
-                input_size=settings.NN_INPUT_SIZE,   # Matches JS inputs (20)
-                hidden_size=settings.NN_HIDDEN_SIZE,
-                output_size=settings.NN_OUTPUT_SIZE
+        result = await self.process_decisions([entity_id], [inputs], [state])
+        decision = result['decisions'][0]
+        return {'type': 'decision_result', **decision}
+
+    def decide(self, entity_ids: Sequence[int], inputs, states: States):
+        """
+        Batched decisions as arrays: action index, target x/y, whether a
+        target was set, and the action probabilities.
+        """
+        if len(entity_ids) == 0:
+            return no_decisions()
+        missing = [entity_id for entity_id in dict.fromkeys(entity_ids) if entity_id not in self.bank]
+        if missing:
+            self.bank.add_random(missing)
+
+        inputs = np.asarray(inputs, dtype=np.float32).reshape(len(entity_ids), -1)
+        observations = inputs
+        if self.memory is not None and settings.MEMORY_INPUT_STEPS:
+            inputs = np.hstack([inputs, self.memory.window(entity_ids, settings.MEMORY_INPUT_STEPS)])
+        # Dropout can be switched back on at runtime, the cache only applies while it is off
+        if self.decision_cache is not None and not self.bank.training:
+            decision_probs = self._forward_cached(self.decision_cache, entity_ids, inputs)
+        else:
+            decision_probs = self._forward(entity_ids, inputs)
+
+        started = time.perf_counter()
+        action_index, target_x, target_y, has_target = select_actions(decision_probs, states)
+        DECISION_PHASE_SECONDS.observe(time.perf_counter() - started, "select")
+        if self.memory is not None:
+            self.memory.record(entity_ids, observations, action_index)
+        return action_index, target_x, target_y, has_target, decision_probs
+
+    def _forward(self, entity_ids: Sequence[int], inputs: np.ndarray) -> np.ndarray:
+        """Action probabilities of the given brains, one batched matmul per layer"""
+        started = time.perf_counter()
+        input_tensor = torch.as_tensor(inputs, device=self.device)
+        slots = self.bank.slots_for(entity_ids)
+        decision_tensor = None
+        if self.shards is not None:
+            try:
+                decision_tensor = self.shards.forward(entity_ids, slots, input_tensor)
+            except ShardWorkerError as e:
+                print(f"BrainService: {e}, falling back to in-process inference")
+                self.shards.close()
+                self.shards = None
+        if decision_tensor is None:
+            decision_tensor = self.bank.forward(slots, input_tensor)
+        self.bank.trim()
+
+        # Move result back to CPU for NumPy processing (.cpu())
+        decision_probs = decision_tensor.cpu().numpy()
+        DECISION_PHASE_SECONDS.observe(time.perf_counter() - started, "forward")
+        return decision_probs
+
+    def _forward_cached(self, cache: DecisionCache, entity_ids: Sequence[int], inputs: np.ndarray) -> np.ndarray:
+        """_forward on quantized inputs, running only the rows the cache does not have"""
+        started = time.perf_counter()
+        grid = cache.quantize(inputs)
+        versions = [self.bank.versions[entity_id] for entity_id in entity_ids]
+        keys, found, missed = cache.lookup(entity_ids, versions, grid)
+        DECISION_PHASE_SECONDS.observe(time.perf_counter() - started, "cache")
+
+        if missed.size:
+            computed = self._forward([entity_ids[row] for row in missed], cache.snap(grid[missed]))
+            cache.store([keys[row] for row in missed], computed)
+            for row, probs in zip(missed, computed):
+                found[row] = probs
+        return np.stack(found)
+
+    async def decide_batched(self, entity_ids: Sequence[int], inputs, states: States):
+        """Same as decide, run together with concurrent requests from other callers"""
+        if len(entity_ids) == 0:
+            return no_decisions()
+        return await self.batcher.submit(entity_ids, inputs, states)
+
+    async def process_decisions(self, entity_ids: List[int], inputs: List[list], states: States):
+        """Process decisions for a batch of entities in one pass"""
+        return decisions_result(entity_ids, *await self.decide_batched(entity_ids, inputs, states))
+
+    async def reproduce(self, parent1_id: int, parent2_id: int, child_id: int):
+        """Create child brain from two parents"""
+        result = await self.reproduce_batch([parent1_id], [parent2_id], [child_id])
+        return {'type': 'child_created', **result['children'][0]}
+
+    async def reproduce_batch(self, parent1_ids: List[int], parent2_ids: List[int], child_ids: List[int],
+                              seed: Optional[int] = None, mutation_rate: Optional[float] = None):
+        """
+        Create many children at once, child i from parent1_ids[i] and parent2_ids[i].
+        mutation_rate defaults to settings.MUTATION_RATE.
+        """
+        children = []
+        valid = []
+        for row, (parent1_id, parent2_id, child_id) in enumerate(zip(parent1_ids, parent2_ids, child_ids)):
+            if parent1_id in self.bank and parent2_id in self.bank:
+                children.append({'child_id': child_id, 'success': True})
+                valid.append(row)
+            else:
+                children.append({'child_id': child_id, 'success': False, 'error': 'Parent brains not found'})
+
+        if valid:
+            # One read for both sides: a second one could fault brains into slots the first read's views use
+            parent_ids = list(dict.fromkeys([parent1_ids[row] for row in valid] + [parent2_ids[row] for row in valid]))
+            parents = self.bank.read_stacked(parent_ids)
+            rows = {entity_id: row for row, entity_id in enumerate(parent_ids)}
+            rows1 = torch.tensor([rows[parent1_ids[row]] for row in valid], dtype=torch.long, device=self.device)
+            rows2 = torch.tensor([rows[parent2_ids[row]] for row in valid], dtype=torch.long, device=self.device)
+            self.breed_many(
+                {name: stacked[rows1] for name, stacked in parents.items()},
+                {name: stacked[rows2] for name, stacked in parents.items()},
+                [child_ids[row] for row in valid],
+                seed=seed,
+                mutation_rate=mutation_rate
             )
 
-            self.entity_brains[entity_id] = brain.to(self.device)
-        
-        brain = self.entity_brains[entity_id]
-        
-        input_tensor = torch.FloatTensor(inputs).unsqueeze(0).to(self.device)
-        
-        with torch.no_grad():
-            # Run inference
-            decision_tensor = brain(input_tensor).squeeze()
-            
-            # Move result back to CPU for NumPy processing (.cpu())
-            decision_probs = decision_tensor.cpu().numpy()
-        
-        # Get the action with highest probability
-        action_index = np.argmax(decision_probs)
-        
-        # Map action index to action type
-        action_types = ['wander', 'gather', 'fight', 'mate', 'socialize']
- 
-        action_type = action_types[min(action_index, len(action_types) - 1)]
-        
-        if action_type == 'gather' and state.get('nearby_food', 0) == 0:
-            action_type = 'wander'
-        if action_type == 'fight' and state.get('nearby_enemies', 0) == 0:
-            action_type = 'wander'
-        if action_type == 'mate' and state.get('nearby_allies', 0) == 0:
-            action_type = 'wander'
-                    
-        #action response
-        action = {
-            'type': action_type,
-            'vx': 0.0,
-            'vy': 0.0
-        }
-        
-        
-        if action_type == 'gather' and state.get('nearby_food', 0) > 0:
-            action['target_x'] = state.get('food_x', 0)
-            action['target_y'] = state.get('food_y', 0)
-            
-        elif action_type == 'fight' and state.get('nearby_enemies', 0) > 0:
-            action['target_x'] = state.get('enemy_x', 0)
-            action['target_y'] = state.get('enemy_y', 0)
-            
-        elif action_type == 'mate' and state.get('nearby_allies', 0) > 0:
-            action['target_x'] = state.get('ally_x', 0)
-            action['target_y'] = state.get('ally_y', 0)
-        
         return {
-            'type': 'decision_result',
-            'entity_id': entity_id,
-            'action': action,
-            'action_probabilities': decision_probs.tolist()
+            'type': 'children_created',
+            'created': len(valid),
+            'children': children
         }
-    
-    async def reproduce(self, parent1_id: int, parent2_id: int, child_id: int):
-        """Create child brain from two parents"""
-        if parent1_id not in self.entity_brains or parent2_id not in self.entity_brains:
-            return {
-                'type': 'child_created',
-                'child_id': child_id,
-                'success': False,
-                'error': 'Parent brains not found'
-            }
-        
-        parent1 = self.entity_brains[parent1_id]
-        parent2 = self.entity_brains[parent2_id]
-        
-        # Perform crossover
-        child = EntityBrain.crossover(parent1, parent2)
-        
-        # Mutate weights
-        child.mutate(mutation_rate=settings.MUTATION_RATE)
-        
-        
-        # Ensure the new child is explicitly moved to the accelerator
-        self.entity_brains[child_id] = child.to(self.device)
-        
+
+    def breed_many(self, parents1: Dict[str, torch.Tensor], parents2: Dict[str, torch.Tensor], child_ids: List[int],
+                   seed: Optional[int] = None, mutation_rate: Optional[float] = None):
+        """Store children of stacked float32 parent weights, which may come from other nodes"""
+        weights = self.genetics.reproduce(
+            parents1,
+            parents2,
+            mutation_rate=settings.MUTATION_RATE if mutation_rate is None else mutation_rate,
+            seed=seed
+        )
+        self.bank.put_many(child_ids, weights)
+        self.forget(child_ids)
+
+    def breed(self, parent1: EntityBrain, parent2: EntityBrain, child_id: int) -> dict:
+        """Store the child of two parent brains, which may come from another node"""
+        stacked1 = {name: tensor.unsqueeze(0) for name, tensor in parent1.state_dict().items()}
+        stacked2 = {name: tensor.unsqueeze(0) for name, tensor in parent2.state_dict().items()}
+        weights = self.genetics.reproduce(stacked1, stacked2, mutation_rate=settings.MUTATION_RATE)
+        self.bank.put_many([child_id], weights)
+        self.forget([child_id])
+
         return {
             'type': 'child_created',
             'child_id': child_id,
@@ -117,11 +322,58 @@ class BrainService:
         }
     
     def get_brain(self, entity_id: int) -> Optional[EntityBrain]:
-        """Get brain for entity"""
-        return self.entity_brains.get(entity_id)
+        """Get a copy of the brain for entity"""
+        return self.bank.get_brain(entity_id)
     
+    def batch_stats(self) -> dict:
+        """Batch size and queueing latency histograms of the decision batcher"""
+        return self.batcher.stats()
+
+    def cache_stats(self) -> dict:
+        """Hot set and spill statistics of the brain store"""
+        return self.bank.cache_stats()
+
+    def memory_stats(self) -> dict:
+        """Entities remembered and size of the episodic memory"""
+        if self.memory is None:
+            return {'enabled': False}
+        return self.memory.stats()
+
+    def decision_cache_stats(self) -> dict:
+        """Hit rate and occupancy of the decision cache"""
+        if self.decision_cache is None:
+            return {'enabled': False}
+        return self.decision_cache.stats()
+
+    def close(self):
+        """Stop inference workers, if any"""
+        if self.shards is not None:
+            self.shards.close()
+
     def remove_brain(self, entity_id: int):
         """Remove brain to free up memory"""
-        if entity_id in self.entity_brains:
-            del self.entity_brains[entity_id]
+        self.bank.remove(entity_id)
+        self.forget([entity_id])
+
+    def reset(self):
+        """Drop every brain, memory and cached decision, for a fresh world"""
+        for entity_id in self.bank.entity_ids():
+            self.bank.remove(entity_id)
+        self.forget()
+        if self.decision_cache is not None:
+            self.decision_cache.clear()
+
+    def reward(self, entity_ids: Sequence[int], rewards: np.ndarray):
+        """Credit rewards to each entity's last remembered decision, if memory is on"""
+        if self.memory is not None:
+            self.memory.add_rewards(entity_ids, rewards)
+
+    def forget(self, entity_ids: Optional[Sequence[int]] = None):
+        """Drop the episodic memory of the given entities, or of everyone"""
+        if self.memory is None:
+            return
+        if entity_ids is None:
+            self.memory.clear()
+        else:
+            self.memory.remove(entity_ids)
             
\ No newline at end of file
@@ -0,0 +1,380 @@
+import asyncio
+import numpy as np
+import torch
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.core.neural_network import EntityBrain
+from app.services.brain_service import BrainService, States, decisions_result, state_columns
+from app.utils.binary_protocol import (
+    decode_decision_request,
+    decode_decision_result,
+    encode_decision_request,
+    encode_decision_result
+)
+from app.utils.broker import Broker, LocalBroker
+from app.utils.hash_ring import HashRing
+from app.utils.storage import pack_snapshot, unpack_snapshot
+
+# Brains per import_brains message while rebalancing
+MIGRATION_BATCH = 1024
+
+
+class ClusterService:
+    """
+    Routes entity traffic to the node that owns each entity's brain.
+
+    Ownership comes from a consistent hash ring over the node IDs, so every
+    node agrees on it without coordination. Decisions for other nodes'
+    entities are forwarded through the broker as binary decision frames,
+    reproduction runs on the child's owner (fetching parents from wherever
+    they live), and when the node list changes each node hands the brains it
+    no longer owns to their new owners before dropping its own copy.
+
+    With a single node everything goes straight to the local BrainService.
+    Nodes reach each other through the broker: LocalBroker for nodes in one
+    process, UnixSocketBroker for processes on one host (CLUSTER_NODES).
+    """
+
+    def __init__(
+        self,
+        brain_service: BrainService,
+        node_id: str = "local",
+        nodes: Optional[Sequence[str]] = None,
+        broker: Optional[Broker] = None,
+        vnodes: int = 64
+    ):
+        self.brain_service = brain_service
+        self.node_id = node_id
+        self.vnodes = vnodes
+        self.ring = HashRing(nodes or [node_id], vnodes)
+        self.broker = broker or LocalBroker()
+        self.broker.register(node_id, self.handle)
+        self.forwarded_requests = 0
+        self.forwarded_rows = 0
+        self.served_rows = 0
+        self.migrated_out = 0
+        self.migrated_in = 0
+
+    @property
+    def single_node(self) -> bool:
+        return self.ring.nodes == [self.node_id]
+
+    def owner(self, entity_id: int) -> str:
+        return self.ring.owner(entity_id)
+
+    # Routed entry points, same results as the BrainService methods
+
+    async def decide(self, entity_ids: Sequence[int], inputs, states: States):
+        """BrainService.decide across nodes: each owner runs its rows, results come back in request order"""
+        if self.single_node or len(entity_ids) == 0:
+            return await self.brain_service.decide_batched(entity_ids, inputs, states)
+
+        ids = np.asarray(entity_ids, dtype=np.int64)
+        inputs = np.asarray(inputs, dtype=np.float32).reshape(len(ids), -1)
+        columns = state_columns(states, len(ids))
+        parts = self.ring.partition(ids)
+
+        async def run(node: str, rows: np.ndarray):
+            part_states = {key: values[rows] for key, values in columns.items()}
+            if node == self.node_id:
+                return await self.brain_service.decide_batched(ids[rows].tolist(), inputs[rows], part_states)
+            self.forwarded_requests += 1
+            self.forwarded_rows += len(rows)
+            reply = await self.broker.request(node, {
+                'type': 'decide',
+                'frame': encode_decision_request(ids[rows], inputs[rows], part_states)
+            })
+            result = decode_decision_result(reply['frame'])
+            return (result['action_index'], result['target_x'], result['target_y'],
+                    result['has_target'], result['action_probabilities'])
+
+        results = await asyncio.gather(*(run(node, rows) for node, rows in parts.items()))
+
+        count = len(ids)
+        width = results[0][4].shape[1]
+        action_index = np.zeros(count, dtype=np.int64)
+        target_x = np.zeros(count)
+        target_y = np.zeros(count)
+        has_target = np.zeros(count, dtype=bool)
+        decision_probs = np.zeros((count, width), dtype=np.float32)
+        for rows, result in zip(parts.values(), results):
+            for merged, values in zip((action_index, target_x, target_y, has_target, decision_probs), result):
+                merged[rows] = values
+        return action_index, target_x, target_y, has_target, decision_probs
+
+    async def process_decision(self, entity_id: int, inputs: list, state: dict):
+        result = await self.process_decisions([entity_id], [inputs], [state])
+        return {'type': 'decision_result', **result['decisions'][0]}
+
+    async def process_decisions(self, entity_ids: List[int], inputs: List[list], states: States):
+        return decisions_result(entity_ids, *await self.decide(entity_ids, inputs, states))
+
+    async def reproduce(self, parent1_id: int, parent2_id: int, child_id: int):
+        """Create the child brain on the child's owner, whichever nodes hold the parents"""
+        if self.single_node:
+            return await self.brain_service.reproduce(parent1_id, parent2_id, child_id)
+
+        owner = self.owner(child_id)
+        if owner != self.node_id:
+            self.forwarded_requests += 1
+            return await self.broker.request(owner, {
+                'type': 'reproduce', 'parent1_id': parent1_id, 'parent2_id': parent2_id, 'child_id': child_id
+            })
+        return await self._breed_here(parent1_id, parent2_id, child_id)
+
+    async def reproduce_batch(self, parent1_ids: List[int], parent2_ids: List[int], child_ids: List[int],
+                              seed: Optional[int] = None):
+        """
+        BrainService.reproduce_batch across nodes: each child's owner breeds
+        all of its children in one batch, fetching parents from other nodes
+        in bulk. Every owner uses the seed for its own share, so a seeded wave
+        gives the same children for the same node list.
+        """
+        if self.single_node:
+            return await self.brain_service.reproduce_batch(parent1_ids, parent2_ids, child_ids, seed)
+
+        async def run(node: str, rows: np.ndarray) -> List[dict]:
+            part = {
+                'parent1_ids': [parent1_ids[row] for row in rows],
+                'parent2_ids': [parent2_ids[row] for row in rows],
+                'child_ids': [child_ids[row] for row in rows],
+                'seed': seed
+            }
+            if node == self.node_id:
+                return await self._breed_batch_here(**part)
+            self.forwarded_requests += 1
+            reply = await self.broker.request(node, {'type': 'reproduce_batch', **part})
+            return reply['children']
+
+        children: List[Optional[dict]] = [None] * len(child_ids)
+        parts = self.ring.partition(child_ids) if child_ids else {}
+        results = await asyncio.gather(*(run(node, rows) for node, rows in parts.items()))
+        for rows, part in zip(parts.values(), results):
+            for row, child in zip(rows, part):
+                children[row] = child
+        return {
+            'type': 'children_created',
+            'created': sum(1 for child in children if child['success']),
+            'children': children
+        }
+
+    async def _breed_batch_here(self, parent1_ids: List[int], parent2_ids: List[int], child_ids: List[int],
+                                seed: Optional[int] = None) -> List[dict]:
+        """Breed children owned by this node, same results per child as BrainService.reproduce_batch"""
+        found, parents = await self._fetch_stacked(list(dict.fromkeys(parent1_ids + parent2_ids)))
+        rows = {entity_id: row for row, entity_id in enumerate(found)}
+        children = []
+        valid = []
+        for index, (parent1_id, parent2_id, child_id) in enumerate(zip(parent1_ids, parent2_ids, child_ids)):
+            if parent1_id in rows and parent2_id in rows:
+                children.append({'child_id': child_id, 'success': True})
+                valid.append(index)
+            else:
+                children.append({'child_id': child_id, 'success': False, 'error': 'Parent brains not found'})
+        if valid:
+            rows1 = torch.tensor([rows[parent1_ids[index]] for index in valid], dtype=torch.long)
+            rows2 = torch.tensor([rows[parent2_ids[index]] for index in valid], dtype=torch.long)
+            self.brain_service.breed_many(
+                {name: stacked[rows1] for name, stacked in parents.items()},
+                {name: stacked[rows2] for name, stacked in parents.items()},
+                [child_ids[index] for index in valid],
+                seed=seed
+            )
+        return children
+
+    async def _fetch_stacked(self, entity_ids: List[int]) -> Tuple[List[int], Dict[str, torch.Tensor]]:
+        """float32 weights of the given brains that exist anywhere, one request per owning node"""
+        bank = self.brain_service.bank
+        parts = self.ring.partition(entity_ids) if entity_ids else {}
+        local = [entity_ids[row] for row in parts.pop(self.node_id, [])]
+        local = [entity_id for entity_id in local if entity_id in bank]
+        # Copied before awaiting other nodes, the bank may move brains meanwhile
+        fetched = [(local, {name: tensor.clone() for name, tensor in bank.read_stacked(local).items()})] if local else []
+
+        async def fetch(node: str, rows: np.ndarray):
+            self.forwarded_requests += 1
+            reply = await self.broker.request(node, {
+                'type': 'export_brains', 'entity_ids': [entity_ids[row] for row in rows]
+            })
+            if not reply['entity_ids']:
+                return None
+            _, arrays = unpack_snapshot(reply['weights'])
+            return reply['entity_ids'], {name: torch.from_numpy(array.copy()) for name, array in arrays.items()}
+
+        fetched += [part for part in await asyncio.gather(*(fetch(node, rows) for node, rows in parts.items())) if part]
+        if not fetched:
+            return [], {}
+        found = [entity_id for ids, _ in fetched for entity_id in ids]
+        return found, {
+            name: torch.cat([weights[name].to(bank.device) for _, weights in fetched])
+            for name in fetched[0][1]
+        }
+
+    async def _breed_here(self, parent1_id: int, parent2_id: int, child_id: int) -> dict:
+        parent1, parent2 = await asyncio.gather(self._fetch_brain(parent1_id), self._fetch_brain(parent2_id))
+        if parent1 is None or parent2 is None:
+            return {
+                'type': 'child_created',
+                'child_id': child_id,
+                'success': False,
+                'error': 'Parent brains not found'
+            }
+        return self.brain_service.breed(parent1, parent2, child_id)
+
+    async def _fetch_brain(self, entity_id: int) -> Optional[EntityBrain]:
+        owner = self.owner(entity_id)
+        if owner == self.node_id:
+            return self.brain_service.get_brain(entity_id)
+        reply = await self.broker.request(owner, {'type': 'export_brain', 'entity_id': entity_id})
+        if reply.get('weights') is None:
+            return None
+        _, arrays = unpack_snapshot(reply['weights'])
+        brain = EntityBrain(**self.brain_service.bank.brain_kwargs)
+        brain.load_state_dict({name: torch.from_numpy(array) for name, array in arrays.items()})
+        return brain
+
+    async def reward(self, entity_ids: Sequence[int], rewards: np.ndarray):
+        """BrainService.reward on each entity's owner, where its decisions were remembered"""
+        if self.single_node:
+            self.brain_service.reward(entity_ids, rewards)
+            return
+        ids = np.asarray(entity_ids, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float32)
+        parts = self.ring.partition(ids) if len(ids) else {}
+        for node, rows in parts.items():
+            if node == self.node_id:
+                self.brain_service.reward(ids[rows].tolist(), rewards[rows])
+            else:
+                await self.broker.request(node, {
+                    'type': 'reward', 'entity_ids': ids[rows].tolist(), 'rewards': rewards[rows].tolist()
+                })
+
+    async def remove_brains(self, entity_ids: Sequence[int]):
+        """Drop the brains (and memories) of dead entities on their owners"""
+        if self.single_node:
+            for entity_id in entity_ids:
+                self.brain_service.remove_brain(entity_id)
+            return
+        ids = [int(entity_id) for entity_id in entity_ids]
+        parts = self.ring.partition(ids) if ids else {}
+        for node, rows in parts.items():
+            part = [ids[row] for row in rows]
+            if node == self.node_id:
+                for entity_id in part:
+                    self.brain_service.remove_brain(entity_id)
+            else:
+                await self.broker.request(node, {'type': 'remove_brains', 'entity_ids': part})
+
+    # Membership
+
+    async def set_nodes(self, nodes: Sequence[str]) -> dict:
+        """
+        Switch to a new node list, handing every local brain that now belongs
+        elsewhere to its new owner first. Until every transfer is stored this
+        node keeps routing by the old ring and keeps its copies, so requests
+        never reach a node that does not have the brain yet and a failed
+        transfer leaves everything as it was. Local copies are dropped once
+        the new ring is in place.
+        """
+        ring = HashRing(nodes, self.vnodes)
+        bank = self.brain_service.bank
+        local_ids = bank.entity_ids()
+        leaving: List[int] = []
+        if local_ids:
+            for node, rows in ring.partition(local_ids).items():
+                if node == self.node_id:
+                    continue
+                moving = [local_ids[row] for row in rows]
+                for start in range(0, len(moving), MIGRATION_BATCH):
+                    batch = moving[start:start + MIGRATION_BATCH]
+                    await self.broker.request(node, {
+                        'type': 'import_brains',
+                        'entity_ids': batch,
+                        'storage_dtype': bank.storage_dtype,
+                        'records': bank.export_records(batch).tobytes()
+                    })
+                leaving.extend(moving)
+
+        self.ring = ring
+        for entity_id in leaving:
+            self.brain_service.remove_brain(entity_id)
+        moved = len(leaving)
+        self.migrated_out += moved
+        return {'nodes': self.ring.nodes, 'migrated_out': moved, 'local_brains': len(bank)}
+
+    async def start(self):
+        """Start serving other nodes' requests, once the event loop runs"""
+        await self.broker.start()
+
+    async def close(self):
+        await self.broker.close()
+
+    async def leave(self) -> dict:
+        """Hand all local brains to the remaining nodes and stop taking requests"""
+        remaining = [node for node in self.ring.nodes if node != self.node_id]
+        if not remaining:
+            raise ValueError("The last node cannot leave")
+        result = await self.set_nodes(remaining)
+        self.broker.unregister(self.node_id)
+        return result
+
+    # Inbound messages from other nodes
+
+    async def handle(self, message: dict) -> dict:
+        kind = message['type']
+        bank = self.brain_service.bank
+        if kind == 'decide':
+            entity_ids, inputs, states, sequence = decode_decision_request(message['frame'])
+            self.served_rows += len(entity_ids)
+            # Frame views are read-only, torch needs its own writable copy of the inputs
+            result = await self.brain_service.decide_batched(entity_ids.tolist(), inputs.copy(), states)
+            return {'frame': encode_decision_result(entity_ids, result[4], result[0], result[1], result[2], result[3], sequence)}
+        if kind == 'reproduce':
+            # Never forwarded again, even if this node's view of ownership differs from the sender's
+            return await self._breed_here(message['parent1_id'], message['parent2_id'], message['child_id'])
+        if kind == 'reproduce_batch':
+            return {'children': await self._breed_batch_here(
+                message['parent1_ids'], message['parent2_ids'], message['child_ids'], message['seed']
+            )}
+        if kind == 'export_brains':
+            found = [entity_id for entity_id in message['entity_ids'] if entity_id in bank]
+            if not found:
+                return {'entity_ids': [], 'weights': None}
+            stacked = bank.read_stacked(found)
+            return {
+                'entity_ids': found,
+                'weights': pack_snapshot({}, {name: tensor.cpu().numpy() for name, tensor in stacked.items()})
+            }
+        if kind == 'reward':
+            self.brain_service.reward(message['entity_ids'], np.asarray(message['rewards'], dtype=np.float32))
+            return {'rewarded': len(message['entity_ids'])}
+        if kind == 'remove_brains':
+            for entity_id in message['entity_ids']:
+                self.brain_service.remove_brain(entity_id)
+            return {'removed': len(message['entity_ids'])}
+        if kind == 'export_brain':
+            if message['entity_id'] not in bank:
+                return {'weights': None}
+            state_dict = bank.state_dict(message['entity_id'])
+            return {'weights': pack_snapshot({}, {name: tensor.cpu().numpy() for name, tensor in state_dict.items()})}
+        if kind == 'import_brains':
+            if message['storage_dtype'] != bank.storage_dtype:
+                raise ValueError(f"Brains stored as {message['storage_dtype']}, this node uses {bank.storage_dtype}")
+            entity_ids = message['entity_ids']
+            records = np.frombuffer(bytearray(message['records']), dtype=np.uint8).reshape(len(entity_ids), -1)
+            bank.import_records(entity_ids, records)
+            self.migrated_in += len(entity_ids)
+            return {'imported': len(entity_ids)}
+        raise ValueError(f"Unknown cluster message type '{kind}'")
+
+    def stats(self) -> Dict:
+        return {
+            'node_id': self.node_id,
+            'nodes': self.ring.nodes,
+            'vnodes': self.vnodes,
+            'local_brains': len(self.brain_service.bank),
+            'forwarded_requests': self.forwarded_requests,
+            'forwarded_rows': self.forwarded_rows,
+            'served_rows': self.served_rows,
+            'migrated_out': self.migrated_out,
+            'migrated_in': self.migrated_in
+        }
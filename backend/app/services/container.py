@@ -0,0 +1,161 @@
+import importlib
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+from app.config import settings
+from app.services.entity_service import entity_service
+from app.services.statistics_services import StatisticsService
+from app.services.vision_service import VisionService
+from app.utils.connection_manager import ConnectionManager
+
+if TYPE_CHECKING:
+    from app.core.evolution import SimulationLoop
+    from app.services.brain_service import BrainService
+    from app.services.cluster_service import ClusterService
+    from app.services.world_service import WorldService
+
+
+class ServicesUnavailable(RuntimeError):
+    """The brain-backed services could not be built, nothing that needs brains can be served"""
+
+
+class ServiceContainer:
+    """
+    The services of this process, one of each, shared by every router.
+
+    Services without torch are built on import. Brain-backed ones (brains,
+    cluster routing, world persistence, the server-side simulation) are
+    built on first access, which is where torch is imported and the device
+    probed, so the app can answer /health while they warm up. warm_up()
+    builds them all off the event loop and records how long each step took.
+    """
+
+    def __init__(self):
+        self.entity_service = entity_service
+        self.stats_service = StatisticsService()
+        self.manager = ConnectionManager()
+        # Fed by /ws vision updates; the server-side simulation keeps its own
+        self.vision_service = VisionService()
+        self._services: Dict[str, object] = {}
+        # Reentrant: building one service builds the ones it depends on
+        self._lock = threading.RLock()
+        # step -> seconds, in the order the steps ran
+        self.timings: Dict[str, float] = {}
+        # Seconds from importing app.main to accepting requests, set by its lifespan
+        self.app_ready_seconds: Optional[float] = None
+        self.warm_error: Optional[str] = None
+        self.memory_report: Optional[dict] = None
+
+    def _timed(self, step: str, build: Callable[[], object]) -> object:
+        started = time.perf_counter()
+        result = build()
+        self.timings[step] = time.perf_counter() - started
+        return result
+
+    def _get(self, name: str, build: Callable[[], object]) -> object:
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._services[name] = self._timed(name, build)
+        return service
+
+    def built(self, name: str) -> bool:
+        """Whether a lazily built service exists yet, without building it"""
+        return name in self._services
+
+    @property
+    def brain_service(self) -> "BrainService":
+        def build():
+            # Importing the brain modules is what pulls in torch
+            module = self._timed("import_brain_modules", lambda: importlib.import_module("app.services.brain_service"))
+            # Refuse to build a brain architecture that cannot fit MAX_ENTITIES
+            from app.core.neural_network import check_brain_memory_budget
+            try:
+                self.memory_report = self._timed("memory_budget", check_brain_memory_budget)
+            except ValueError as e:
+                self.warm_error = str(e)
+                raise ServicesUnavailable(self.warm_error) from e
+            return module.BrainService()
+
+        # A failed budget check is final, every later access fails the same way
+        if self.warm_error is not None:
+            raise ServicesUnavailable(self.warm_error)
+        return self._get("brain_service", build)
+
+    @property
+    def cluster_service(self) -> "ClusterService":
+        def build():
+            from app.services.cluster_service import ClusterService
+            from app.utils.broker import UnixSocketBroker, claim_node_id
+            # Entity traffic goes through the cluster router, which sends each entity to its brain's owning node
+            if not settings.CLUSTER_NODES:
+                return ClusterService(self.brain_service)
+            node_id = settings.CLUSTER_NODE_ID or claim_node_id(settings.CLUSTER_NODES, settings.CLUSTER_SOCKET_DIR)
+            if node_id not in settings.CLUSTER_NODES:
+                raise ValueError(f"CLUSTER_NODE_ID '{node_id}' is not one of CLUSTER_NODES {settings.CLUSTER_NODES}")
+            print(f"ClusterService: node '{node_id}' of {settings.CLUSTER_NODES}")
+            return ClusterService(
+                self.brain_service, node_id, settings.CLUSTER_NODES, UnixSocketBroker(settings.CLUSTER_SOCKET_DIR)
+            )
+        return self._get("cluster_service", build)
+
+    @property
+    def world_service(self) -> "WorldService":
+        def build():
+            from app.services.world_service import WorldService
+            return WorldService(
+                self.brain_service, broadcast=self.manager.broadcast, cluster_service=self.cluster_service
+            )
+        return self._get("world_service", build)
+
+    @property
+    def simulation(self) -> "SimulationLoop":
+        def build():
+            from app.core.evolution import SimulationLoop
+            # Drives the shared entity store and the brains the entity routes work with
+            return SimulationLoop(
+                self.entity_service,
+                self.brain_service,
+                VisionService(),
+                broadcast=self.manager.broadcast,
+                statistics_service=self.stats_service,
+                cluster_service=self.cluster_service
+            )
+        return self._get("simulation", build)
+
+    def warm_up(self) -> Optional[dict]:
+        """
+        Build every brain-backed service, after checking the brain memory
+        budget. Blocking, run it off the event loop. Returns the memory report.
+        """
+        started = time.perf_counter()
+        try:
+            self.simulation
+            self.cluster_service
+            self.world_service
+            return self.memory_report
+        except ServicesUnavailable:
+            raise
+        except Exception as e:
+            self.warm_error = str(e)
+            raise ServicesUnavailable(self.warm_error) from e
+        finally:
+            self.timings["warm_up"] = time.perf_counter() - started
+
+    @property
+    def ready(self) -> bool:
+        return all(self.built(name) for name in ("brain_service", "cluster_service", "world_service", "simulation"))
+
+    def startup_report(self) -> dict:
+        """Seconds until requests were accepted, and per warm-up step"""
+        return {
+            'app_ready_seconds': self.app_ready_seconds,
+            'services_ready': self.ready,
+            'error': self.warm_error,
+            'steps': dict(self.timings)
+        }
+
+
+services = ServiceContainer()
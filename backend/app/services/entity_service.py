@@ -1,28 +1,243 @@
-from typing import List, Optional, Dict
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.models.entity import GeneticTraits
+from app.models.society import SOCIETIES
+
+GENE_NAMES = list(GeneticTraits.model_fields)
+DEFAULT_GENES = GeneticTraits().model_dump()
+
+# Scalar columns: name -> (dtype, default)
+SCALAR_COLUMNS = {
+    'x': (np.float64, 0.0),
+    'y': (np.float64, 0.0),
+    'velocity_x': (np.float64, 0.0),
+    'velocity_y': (np.float64, 0.0),
+    'energy': (np.float64, 100.0),
+    'age': (np.float64, 0.0),
+    'lifespan': (np.float64, 100.0),
+    'reproduction_cooldown': (np.float64, 0.0),
+    'communication_cooldown': (np.float64, 0.0),
+    'diet_bonus': (np.float64, 0.0),
+    'generation': (np.int32, 1),
+    'society': (np.int16, 0),
+    'is_hybrid': (np.bool_, False),
+    'parent1_id': (np.int64, -1),
+    'parent2_id': (np.int64, -1),
+    'action': (np.int8, 0)  # Index into ACTION_TYPES of the last decision
+}
+
 
 class EntityService:
-    def __init__(self):
-        self.entities: Dict[int, dict] = {}
-    
+    """
+    Structure-of-arrays entity store.
+
+    Every numeric field is a NumPy column indexed by row, with an id->row map
+    on top. Deletes swap the last row into the hole, so rows stay dense and
+    whole-population reads are plain slices. get_entity/add_entity keep the
+    old dict-based API as a thin view over the columns.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.count = 0
+        self.capacity = capacity
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.data: Dict[str, np.ndarray] = {
+            name: np.full(capacity, default, dtype=dtype)
+            for name, (dtype, default) in SCALAR_COLUMNS.items()
+        }
+        self.data['genes'] = np.zeros((capacity, len(GENE_NAMES)), dtype=np.float32)
+        # Anything that is not a column (children_ids, totals, ...) lives per row here
+        self.extras: List[dict] = [{} for _ in range(capacity)]
+        self.rows: Dict[int, int] = {}
+        # Never handed out twice, and past every ID stored so far
+        self.next_id = 1
+        # Society names by code, unknown names are registered on first use
+        self.society_names: List[str] = list(SOCIETIES)
+        # Notified about society/generation/genes of rows coming and going
+        self.observers: List = []
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        self.ids = np.resize(self.ids, capacity)
+        for name, column in self.data.items():
+            grown = np.zeros((capacity, *column.shape[1:]), dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.data[name] = grown
+        self.extras.extend({} for _ in range(capacity - self.capacity))
+        self.capacity = capacity
+
+    def subscribe(self, observer):
+        """
+        Register an observer with on_entities_added(society, generation, genes, new),
+        on_entities_removed(society, generation, genes, died) and on_cleared() methods.
+        """
+        self.observers.append(observer)
+
+    def _tracked(self, rows) -> tuple:
+        """Copies of the observed columns at the given rows"""
+        return (
+            self.data['society'][rows].copy(),
+            self.data['generation'][rows].copy(),
+            self.data['genes'][rows].copy()
+        )
+
+    def _notify_added(self, rows, new: bool):
+        if self.observers:
+            tracked = self._tracked(rows)
+            for observer in self.observers:
+                observer.on_entities_added(*tracked, new)
+
+    def _notify_removed(self, rows, died: bool):
+        if self.observers:
+            tracked = self._tracked(rows)
+            for observer in self.observers:
+                observer.on_entities_removed(*tracked, died)
+
+    def society_code(self, name: str) -> int:
+        """Integer code for a society name"""
+        if name not in self.society_names:
+            self.society_names.append(name)
+        return self.society_names.index(name)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Views of every column over the live rows, writes go straight to the store.
+        Changes to society, generation or genes must go through update_entities
+        so observers see them.
+        """
+        return {name: column[:self.count] for name, column in self.data.items()}
+
+    def entity_ids(self) -> np.ndarray:
+        """Live entity IDs in row order"""
+        return self.ids[:self.count]
+
+    def society_name_array(self) -> np.ndarray:
+        """Society name per live row"""
+        return np.array(self.society_names, dtype=object)[self.data['society'][:self.count]]
+
     def get_all_entity_ids(self) -> List[int]:
         """Get list of all entity IDs"""
-        return list(self.entities.keys())
-    
+        return self.ids[:self.count].tolist()
+
     def get_entity(self, entity_id: int) -> Optional[dict]:
         """Get entity by ID"""
-        return self.entities.get(entity_id)
-    
+        row = self.rows.get(entity_id)
+        if row is None:
+            return None
+        entity = {'id': entity_id}
+        for name in SCALAR_COLUMNS:
+            entity[name] = self.data[name][row].item()
+        entity['society_name'] = self.society_names[entity.pop('society')]
+        for name in ('parent1_id', 'parent2_id'):
+            if entity[name] < 0:
+                entity[name] = None
+        entity['genes'] = dict(zip(GENE_NAMES, self.data['genes'][row].tolist()))
+        entity.update(self.extras[row])
+        return entity
+
+    def new_entity_id(self) -> int:
+        """An ID no entity has had yet"""
+        entity_id = self.next_id
+        self.next_id += 1
+        return entity_id
+
     def add_entity(self, entity_id: int, entity_data: dict):
-        """Add new entity"""
-        self.entities[entity_id] = entity_data
-    
+        """Add new entity, or overwrite an existing one"""
+        self.next_id = max(self.next_id, entity_id + 1)
+        row = self.rows.get(entity_id)
+        new = row is None
+        if new:
+            if self.count == self.capacity:
+                self._grow()
+            row = self.count
+            self.count += 1
+            self.rows[entity_id] = row
+            self.ids[row] = entity_id
+        else:
+            self._notify_removed([row], died=False)
+
+        society_name = entity_data.get('society_name', entity_data.get('society', ''))
+        for name, (dtype, default) in SCALAR_COLUMNS.items():
+            if name == 'society':
+                continue
+            value = entity_data.get(name)
+            self.data[name][row] = default if value is None else value
+        self.data['society'][row] = self.society_code(society_name)
+        genes = {**DEFAULT_GENES, **(entity_data.get('genes') or {})}
+        self.data['genes'][row] = [genes[name] for name in GENE_NAMES]
+        self.extras[row] = {
+            key: value for key, value in entity_data.items()
+            if key not in SCALAR_COLUMNS and key not in ('id', 'genes', 'society_name')
+        }
+        self._notify_added([row], new=new)
+
+    def update_entities(self, entity_ids: Optional[Sequence[int]] = None, **columns):
+        """Vectorized write of whole columns, for every live row or the given IDs"""
+        rows = slice(0, self.count) if entity_ids is None else self.rows_for(entity_ids)
+        tracked = any(name in ('society', 'generation', 'genes') for name in columns)
+        if tracked:
+            self._notify_removed(rows, died=False)
+        for name, values in columns.items():
+            self.data[name][rows] = values
+        if tracked:
+            self._notify_added(rows, new=False)
+
+    def rows_for(self, entity_ids: Sequence[int]) -> np.ndarray:
+        """Row index array for a list of entity IDs"""
+        return np.fromiter((self.rows[entity_id] for entity_id in entity_ids), dtype=np.int64, count=len(entity_ids))
+
     def remove_entity(self, entity_id: int) -> bool:
         """Remove entity"""
-        if entity_id in self.entities:
-            del self.entities[entity_id]
-            return True
-        return False
-    
+        row = self.rows.pop(entity_id, None)
+        if row is None:
+            return False
+        self._notify_removed([row], died=True)
+        last = self.count - 1
+        if row != last:
+            # Swap the last row into the hole to keep rows dense
+            moved_id = int(self.ids[last])
+            self.ids[row] = moved_id
+            for column in self.data.values():
+                column[row] = column[last]
+            self.extras[row] = self.extras[last]
+            self.rows[moved_id] = row
+        self.extras[last] = {}
+        self.count = last
+        return True
+
+    def export_columns(self) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[dict]]:
+        """Live IDs, column views and extras, for snapshots"""
+        return self.entity_ids(), self.columns(), self.extras[:self.count]
+
+    def load_columns(self, entity_ids: np.ndarray, columns: Dict[str, np.ndarray],
+                     society_names: List[str], extras: Optional[List[dict]] = None):
+        """Replace every entity with whole columns, e.g. from a snapshot"""
+        self.clear_all()
+        count = len(entity_ids)
+        while self.capacity < count:
+            self._grow()
+        self.society_names = list(society_names)
+        self.ids[:count] = entity_ids
+        if count:
+            self.next_id = max(self.next_id, int(np.max(entity_ids)) + 1)
+        for name, column in self.data.items():
+            if name in columns:
+                column[:count] = columns[name]
+            else:
+                column[:count] = SCALAR_COLUMNS[name][1]
+        self.extras[:count] = extras or [{} for _ in range(count)]
+        self.rows = {int(entity_id): row for row, entity_id in enumerate(entity_ids)}
+        self.count = count
+        self._notify_added(slice(0, count), new=False)
+
     def clear_all(self):
         """Clear all entities"""
-        self.entities.clear()
\ No newline at end of file
+        self.count = 0
+        self.rows.clear()
+        self.extras = [{} for _ in range(self.capacity)]
+        for observer in self.observers:
+            observer.on_cleared()
+
+
+# Shared store, every route and service reads and writes the same entities
+entity_service = EntityService()
@@ -1 +1,122 @@
-#todo
\ No newline at end of file
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+class MemoryService:
+    """
+    Episodic memory: the last `steps` ticks of every entity.
+
+    Each remembered tick is one row of the entity's observation, its action
+    one-hot and the reward it got, so the whole memory is a single
+    preallocated float32 array of [slots, steps, step_size]. Entities get a
+    slot the first time they are remembered and give it back when they die;
+    each slot is a ring buffer with its own write cursor. Reads and writes
+    for a whole tick are a few vectorized gathers and scatters, never a
+    per-entity Python list, and the array only grows (doubling) when more
+    entities are alive at once than it has slots for.
+    """
+
+    def __init__(self, steps: int, observation_size: int, action_count: int, capacity: int = 64):
+        if steps <= 0:
+            raise ValueError("Episodic memory needs at least one step")
+        self.steps = steps
+        self.observation_size = observation_size
+        self.action_count = action_count
+        self.step_size = observation_size + action_count + 1
+        self.capacity = 0
+        self.buffer = np.zeros((0, steps, self.step_size), dtype=np.float32)
+        # Next step written per slot, and how many steps it holds (up to `steps`)
+        self.cursor = np.zeros(0, dtype=np.int64)
+        self.filled = np.zeros(0, dtype=np.int64)
+        self.slots: Dict[int, int] = {}
+        self.free_slots: List[int] = []
+        self._grow(max(capacity, 1))
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _grow(self, capacity: int):
+        """Reallocate with room for `capacity` entities"""
+        buffer = np.zeros((capacity, self.steps, self.step_size), dtype=np.float32)
+        buffer[:self.capacity] = self.buffer
+        self.buffer = buffer
+        # Same memory as one row per (slot, step), gathering whole rows beats 2-D fancy indexing
+        self.rows = buffer.reshape(-1, self.step_size)
+        self.cursor = np.concatenate([self.cursor, np.zeros(capacity - self.capacity, dtype=np.int64)])
+        self.filled = np.concatenate([self.filled, np.zeros(capacity - self.capacity, dtype=np.int64)])
+        # Popped from the end, so low slots are handed out first
+        self.free_slots = list(range(capacity - 1, self.capacity - 1, -1)) + self.free_slots
+        self.capacity = capacity
+
+    def slots_for(self, entity_ids: Sequence[int]) -> np.ndarray:
+        """Slot of each entity, claiming empty ones for entities not seen before"""
+        new = [entity_id for entity_id in dict.fromkeys(entity_ids) if entity_id not in self.slots]
+        if len(new) > len(self.free_slots):
+            self._grow(max(self.capacity * 2, len(self.slots) + len(new)))
+        for entity_id in new:
+            slot = self.free_slots.pop()
+            self.cursor[slot] = 0
+            self.filled[slot] = 0
+            self.slots[entity_id] = slot
+        return np.fromiter((self.slots[entity_id] for entity_id in entity_ids), dtype=np.int64, count=len(entity_ids))
+
+    def record(self, entity_ids: Sequence[int], observations: np.ndarray, actions: np.ndarray):
+        """
+        Remember one tick per entity: what it saw and what it did. The reward
+        starts at zero and is filled in by add_rewards once the tick played out.
+        An entity listed twice keeps its last row.
+        """
+        slots = self.slots_for(entity_ids)
+        position = self.cursor[slots]
+        step = np.zeros((len(slots), self.step_size), dtype=np.float32)
+        step[:, :self.observation_size] = observations
+        step[np.arange(len(slots)), self.observation_size + np.asarray(actions, dtype=np.int64)] = 1.0
+        self.rows[slots * self.steps + position] = step
+        self.cursor[slots] = (position + 1) % self.steps
+        self.filled[slots] = np.minimum(self.filled[slots] + 1, self.steps)
+
+    def add_rewards(self, entity_ids: Sequence[int], rewards: np.ndarray):
+        """Add rewards to the most recently remembered tick of each entity"""
+        slots = np.fromiter(
+            (self.slots.get(entity_id, -1) for entity_id in entity_ids), dtype=np.int64, count=len(entity_ids)
+        )
+        known = slots >= 0
+        slots = slots[known]
+        latest = (self.cursor[slots] - 1) % self.steps
+        self.rows[slots * self.steps + latest, -1] += np.asarray(rewards, dtype=np.float32)[known]
+
+    def window(self, entity_ids: Sequence[int], steps: int) -> np.ndarray:
+        """
+        The last `steps` remembered ticks of each entity, oldest first and
+        flattened to [len(entity_ids), steps * step_size]. Ticks an entity
+        has not lived yet read as zeros.
+        """
+        if steps > self.steps:
+            raise ValueError(f"Only {self.steps} steps are remembered, {steps} requested")
+        slots = self.slots_for(entity_ids)
+        offsets = np.arange(steps)
+        positions = (self.cursor[slots, None] - steps + offsets) % self.steps
+        window = self.rows[(slots[:, None] * self.steps + positions).ravel()]
+        unlived = (offsets < steps - np.minimum(self.filled[slots], steps)[:, None]).ravel()
+        window[unlived] = 0.0
+        return window.reshape(len(slots), steps * self.step_size)
+
+    def remove(self, entity_ids: Sequence[int]):
+        """Forget entities and free their slots"""
+        for entity_id in entity_ids:
+            slot = self.slots.pop(entity_id, None)
+            if slot is not None:
+                self.free_slots.append(slot)
+
+    def clear(self):
+        self.remove(list(self.slots))
+
+    def stats(self) -> dict:
+        return {
+            'enabled': True,
+            'steps': self.steps,
+            'step_size': self.step_size,
+            'entities': len(self.slots),
+            'capacity': self.capacity,
+            'bytes': self.buffer.nbytes
+        }
@@ -1,31 +1,193 @@
-from app.services.entity_service import EntityService
+import asyncio
+import time
+import numpy as np
+from typing import Optional
+from app.config import settings
+from app.models.society import SOCIETIES
+from app.services.entity_service import EntityService, GENE_NAMES, entity_service as shared_entity_service
+from app.utils.timeseries import MultiResolutionSeries
 
 class StatisticsService:
-    def __init__(self):
-        self.entity_service = EntityService()
-    
+    """
+    Population statistics kept up to date incrementally.
+
+    The service observes the entity store, so every add/remove/update adjusts
+    running sums instead of triggering a rescan. All reads are O(1) in the
+    population size and run length.
+
+    The time series is sampled by the simulation loop while it ticks, and by
+    the sampler task (start_sampler) whenever it does not, such as while the
+    browser drives the world.
+    """
+
+    def __init__(self, entity_service: Optional[EntityService] = None, history_size: int = 512):
+        self.entity_service = entity_service or shared_entity_service
+        self.history = MultiResolutionSeries(
+            ['time', 'population', 'mean_generation', 'max_generation', 'births', 'deaths']
+            + [f"population_{name}" for name in SOCIETIES],
+            capacity=history_size
+        )
+        self._reset_aggregates()
+        # Time and monotonic clock of the last sample, the sampler continues from there
+        self._sample_time = 0.0
+        self._sampled_at = time.monotonic()
+        self._sampler_task: Optional[asyncio.Task] = None
+        self.entity_service.subscribe(self)
+        # Pick up anything already in the store
+        if self.entity_service.count:
+            columns = self.entity_service.columns()
+            self.on_entities_added(columns['society'], columns['generation'], columns['genes'], new=False)
+
+    def _reset_aggregates(self):
+        self.population = 0
+        self.births = 0
+        self.deaths = 0
+        self.generation_sum = 0
+        # Entities per generation, so the max survives removals without a rescan
+        self.generation_counts = np.zeros(64, dtype=np.int64)
+        self.max_generation = 0
+        # Per society code
+        self.society_counts = np.zeros(0, dtype=np.int64)
+        self.society_generation_sum = np.zeros(0)
+        self.gene_sum = np.zeros((0, len(GENE_NAMES)))
+        self.gene_sq_sum = np.zeros((0, len(GENE_NAMES)))
+
+    def _ensure_societies(self, codes: np.ndarray):
+        needed = int(codes.max()) + 1 if len(codes) else 0
+        if needed <= len(self.society_counts):
+            return
+        extra = needed - len(self.society_counts)
+        self.society_counts = np.concatenate([self.society_counts, np.zeros(extra, dtype=np.int64)])
+        self.society_generation_sum = np.concatenate([self.society_generation_sum, np.zeros(extra)])
+        self.gene_sum = np.vstack([self.gene_sum, np.zeros((extra, len(GENE_NAMES)))])
+        self.gene_sq_sum = np.vstack([self.gene_sq_sum, np.zeros((extra, len(GENE_NAMES)))])
+
+    def _accumulate(self, society: np.ndarray, generation: np.ndarray, genes: np.ndarray, sign: int):
+        society = society.astype(np.int64)
+        generation = generation.astype(np.int64)
+        genes = genes.astype(np.float64)
+        self._ensure_societies(society)
+        if len(generation) and generation.max() >= len(self.generation_counts):
+            grown = np.zeros(max(int(generation.max()) + 1, len(self.generation_counts) * 2), dtype=np.int64)
+            grown[:len(self.generation_counts)] = self.generation_counts
+            self.generation_counts = grown
+
+        self.population += sign * len(society)
+        self.generation_sum += sign * int(generation.sum())
+        np.add.at(self.generation_counts, generation, sign)
+        np.add.at(self.society_counts, society, sign)
+        np.add.at(self.society_generation_sum, society, sign * generation)
+        np.add.at(self.gene_sum, society, sign * genes)
+        np.add.at(self.gene_sq_sum, society, sign * genes ** 2)
+
+        if sign > 0 and len(generation):
+            self.max_generation = max(self.max_generation, int(generation.max()))
+        else:
+            # Walk down past emptied generations, amortized O(1)
+            while self.max_generation > 0 and self.generation_counts[self.max_generation] == 0:
+                self.max_generation -= 1
+
+    def on_entities_added(self, society, generation, genes, new: bool):
+        self._accumulate(society, generation, genes, 1)
+        if new:
+            self.births += len(society)
+
+    def on_entities_removed(self, society, generation, genes, died: bool):
+        self._accumulate(society, generation, genes, -1)
+        if died:
+            self.deaths += len(society)
+
+    def on_cleared(self):
+        births, deaths = self.births, self.deaths
+        self._reset_aggregates()
+        self.births, self.deaths = births, deaths
+
     def get_overall_stats(self) -> dict:
         """Calculate overall statistics"""
-        entities = self.entity_service.entities
-        
         return {
-            "total_population": len(entities),
-            "total_generations": self._calculate_max_generation(entities),
-            
+            "total_population": self.population,
+            "total_generations": self.max_generation,
+            "mean_generation": self.generation_sum / self.population if self.population else 0.0,
+            "total_births": self.births,
+            "total_deaths": self.deaths
         }
-    
+
     def get_society_breakdown(self) -> dict:
         """Get statistics per society"""
-        
-        pass
-    
-    def get_evolution_metrics(self) -> dict:
+        breakdown = {}
+        for code, count in enumerate(self.society_counts.tolist()):
+            if count <= 0:
+                continue
+            gene_mean = self.gene_sum[code] / count
+            # E[x^2] - E[x]^2, clamped against rounding below zero
+            gene_variance = np.maximum(self.gene_sq_sum[code] / count - gene_mean ** 2, 0.0)
+            breakdown[self.entity_service.society_names[code]] = {
+                "population": count,
+                "mean_generation": self.society_generation_sum[code] / count,
+                "gene_means": dict(zip(GENE_NAMES, gene_mean.tolist())),
+                "gene_variances": dict(zip(GENE_NAMES, gene_variance.tolist()))
+            }
+        return breakdown
+
+    def get_evolution_metrics(self, resolution: int = 0) -> dict:
         """Get evolution metrics over time"""
-        
-        pass
-    
-    def _calculate_max_generation(self, entities: dict) -> int:
-        """Helper to find max generation"""
-        if not entities:
-            return 0
-        return max([e.get('generation', 1) for e in entities.values()])
\ No newline at end of file
+        resolution = min(max(resolution, 0), len(self.history.levels) - 1)
+        return {
+            "resolution": resolution,
+            "samples_per_point": self.history.factor ** resolution,
+            "series": self.history.series(resolution)
+        }
+
+    def record_sample(self, simulation_time: float):
+        """Append the current aggregates to the time series"""
+        society_population = {
+            f"population_{name}": int(self.society_counts[code]) if code < len(self.society_counts) else 0
+            for code, name in enumerate(self.entity_service.society_names[:len(SOCIETIES)])
+        }
+        self.history.append(
+            time=simulation_time,
+            population=self.population,
+            mean_generation=self.generation_sum / self.population if self.population else 0.0,
+            max_generation=self.max_generation,
+            births=self.births,
+            deaths=self.deaths,
+            **society_population
+        )
+        self._sample_time = simulation_time
+        self._sampled_at = time.monotonic()
+
+    def sample_if_idle(self, interval: float) -> bool:
+        """
+        Record a sample if none was recorded for `interval` seconds, timed
+        by the wall clock since the last one. Returns whether it sampled.
+        """
+        idle = time.monotonic() - self._sampled_at
+        if idle < interval:
+            return False
+        self.record_sample(self._sample_time + idle)
+        return True
+
+    def start_sampler(self, interval: Optional[float] = None) -> bool:
+        """Sample every `interval` seconds (STATS_SAMPLE_INTERVAL by default, 0 disables) unless a loop already does"""
+        interval = settings.STATS_SAMPLE_INTERVAL if interval is None else interval
+        if interval <= 0 or self._sampler_task:
+            return False
+        self._sampler_task = asyncio.create_task(self._sample(interval))
+        return True
+
+    async def stop_sampler(self) -> bool:
+        """Stop the sampler task, returns False if it was not running"""
+        if not self._sampler_task:
+            return False
+        self._sampler_task.cancel()
+        try:
+            await self._sampler_task
+        except asyncio.CancelledError:
+            pass
+        self._sampler_task = None
+        return True
+
+    async def _sample(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.sample_if_idle(interval)
@@ -1 +1,345 @@
-#todo
\ No newline at end of file
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.models.society import SOCIETIES
+
+# Integer codes used in the spatial index
+SOCIETY_CODES = {name: code for code, name in enumerate(SOCIETIES)}
+RESOURCE_TYPES = ['meat', 'plant', 'mineral', 'universal']
+RESOURCE_CODES = {name: code for code, name in enumerate(RESOURCE_TYPES)}
+
+
+def society_codes(names: Sequence[str]) -> List[int]:
+    """Spatial index codes of society names, ValueError naming any unknown society"""
+    unknown = [name for name in dict.fromkeys(names) if name not in SOCIETY_CODES]
+    if unknown:
+        raise ValueError(f"Unknown societies {unknown}, expected one of {list(SOCIETY_CODES)}")
+    return [SOCIETY_CODES[name] for name in names]
+
+
+# EDIBLE[society code, resource code] -> society can eat that resource
+EDIBLE = np.array([
+    [resource in society.preferred_food for resource in RESOURCE_TYPES]
+    for society in SOCIETIES.values()
+], dtype=bool)
+
+# Radii used by the frontend for neighbour counts
+FOOD_RADIUS = 250.0
+ENEMY_RADIUS = 150.0
+ALLY_RADIUS = 150.0
+
+# Cell keys pack (cx, cy) into one int64
+_KEY_OFFSET = 1 << 20
+_KEY_STRIDE = 1 << 21
+
+# Offsets of the 3x3 block of cells around a query cell
+_NEIGHBOUR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+class _PointSet:
+    """Columnar set of points bucketed into a uniform grid"""
+
+    def __init__(self, cell_size: float, capacity: int = 256):
+        self.cell_size = cell_size
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.group = np.zeros(capacity, dtype=np.int16)
+        self.amount = np.zeros(capacity, dtype=np.float32)
+        self.keys = np.zeros(capacity, dtype=np.int64)
+        self.rows: Dict[int, int] = {}
+        self._dirty = True
+        self._order = np.zeros(0, dtype=np.int64)
+        self._cell_keys = np.zeros(0, dtype=np.int64)
+        self._cell_start = np.zeros(0, dtype=np.int64)
+        self._cell_count = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, needed: int):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('ids', 'x', 'y', 'group', 'amount', 'keys'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def cell_keys(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        cx = np.floor_divide(x, self.cell_size).astype(np.int64) + _KEY_OFFSET
+        cy = np.floor_divide(y, self.cell_size).astype(np.int64) + _KEY_OFFSET
+        return cx * _KEY_STRIDE + cy
+
+    def upsert(self, ids: Sequence[int], x: Sequence[float], y: Sequence[float],
+               group: Optional[Sequence[int]] = None, amount: Optional[Sequence[float]] = None):
+        """Insert new points or move existing ones"""
+        rows = np.empty(len(ids), dtype=np.int64)
+        for index, point_id in enumerate(ids):
+            row = self.rows.get(point_id)
+            if row is None:
+                self._grow(self.count + 1)
+                row = self.count
+                self.rows[point_id] = row
+                self.ids[row] = point_id
+                self.count += 1
+                self._dirty = True
+            rows[index] = row
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keys = self.cell_keys(x, y)
+        # Only a change of cell invalidates the grid, plain moves inside a cell do not
+        if not self._dirty and np.any(self.keys[rows] != keys):
+            self._dirty = True
+        self.x[rows] = x
+        self.y[rows] = y
+        self.keys[rows] = keys
+        if group is not None:
+            self.group[rows] = group
+        if amount is not None:
+            self.amount[rows] = amount
+
+    def remove(self, ids: Sequence[int]):
+        """Swap-remove points by ID"""
+        for point_id in ids:
+            row = self.rows.pop(point_id, None)
+            if row is None:
+                continue
+            last = self.count - 1
+            if row != last:
+                for name in ('ids', 'x', 'y', 'group', 'amount', 'keys'):
+                    column = getattr(self, name)
+                    column[row] = column[last]
+                self.rows[int(self.ids[row])] = row
+            self.count = last
+            self._dirty = True
+
+    def _index(self):
+        """Rebuild the cell -> rows CSR layout if anything changed cell"""
+        if not self._dirty:
+            return
+        keys = self.keys[:self.count]
+        self._order = np.argsort(keys, kind='stable')
+        self._cell_keys, self._cell_start, self._cell_count = np.unique(
+            keys[self._order], return_index=True, return_counts=True
+        )
+        self._dirty = False
+
+    def candidate_pairs(self, x: np.ndarray, y: np.ndarray):
+        """
+        (query index, point row) for every point in the 3x3 block of cells
+        around each query position.
+        """
+        self._index()
+        if self.count == 0 or len(x) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+
+        query_keys = self.cell_keys(x, y)[:, None] + (
+            _NEIGHBOUR_OFFSETS[:, 0] * _KEY_STRIDE + _NEIGHBOUR_OFFSETS[:, 1]
+        )[None, :]
+        query_keys = query_keys.ravel()
+        position = np.searchsorted(self._cell_keys, query_keys)
+        position = np.minimum(position, len(self._cell_keys) - 1)
+        found = self._cell_keys[position] == query_keys
+        starts = np.where(found, self._cell_start[position], 0)
+        counts = np.where(found, self._cell_count[position], 0)
+
+        query_index = np.repeat(np.arange(len(x)), len(_NEIGHBOUR_OFFSETS))
+        pair_query = np.repeat(query_index, counts)
+        ends = np.cumsum(counts)
+        within = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+        pair_row = self._order[np.repeat(starts, counts) + within]
+        return pair_query, pair_row
+
+
+def _nearest(count: int, pair_query: np.ndarray, pair_row: np.ndarray, dist_sq: np.ndarray) -> np.ndarray:
+    """
+    Row of the closest point per query, -1 where there is none. Pairs must be
+    grouped by query in ascending order, as candidate_pairs emits them.
+    """
+    nearest = np.full(count, -1, dtype=np.int64)
+    if len(pair_query) == 0:
+        return nearest
+    # Segmented argmin: the first pair of each query at that query's minimum distance
+    starts = np.flatnonzero(np.concatenate(([True], pair_query[1:] != pair_query[:-1])))
+    lengths = np.diff(np.append(starts, len(pair_query)))
+    closest = np.minimum.reduceat(dist_sq, starts)
+    hits = np.flatnonzero(dist_sq == np.repeat(closest, lengths))
+    first = np.ones(len(hits), dtype=bool)
+    first[1:] = pair_query[hits[1:]] != pair_query[hits[:-1]]
+    nearest[pair_query[hits[first]]] = pair_row[hits[first]]
+    return nearest
+
+
+class VisionService:
+    """
+    Server-side spatial index over entity and resource positions.
+
+    Entities and resources live in uniform grids whose cell size matches
+    the largest query radius, so every neighbour query only inspects the
+    3x3 block of cells around the entity. Counts and nearest targets for
+    the whole population come out of one vectorized NumPy pass.
+    """
+
+    def __init__(self, chunk_size: int = 2048):
+        self.entities = _PointSet(cell_size=max(ENEMY_RADIUS, ALLY_RADIUS))
+        self.resources = _PointSet(cell_size=FOOD_RADIUS)
+        # Bounds the size of the candidate pair arrays for huge populations
+        self.chunk_size = chunk_size
+
+    def update_entities(self, ids: Sequence[int], x: Sequence[float], y: Sequence[float],
+                        societies: Optional[Sequence[str]] = None):
+        """Add entities or move them to new positions"""
+        groups = None if societies is None else society_codes(societies)
+        self.entities.upsert(ids, x, y, group=groups)
+
+    def update_resources(self, ids: Sequence[int], x: Sequence[float], y: Sequence[float],
+                         types: Optional[Sequence[str]] = None, amounts: Optional[Sequence[float]] = None):
+        """Add resources, move them or change how much is left"""
+        groups = None if types is None else [RESOURCE_CODES.get(name, RESOURCE_CODES['universal']) for name in types]
+        self.resources.upsert(ids, x, y, group=groups, amount=amounts)
+
+    def remove_entities(self, ids: Sequence[int]):
+        """Drop entities from the index"""
+        self.entities.remove(ids)
+
+    def remove_resources(self, ids: Sequence[int]):
+        """Drop resources from the index"""
+        self.resources.remove(ids)
+
+    def clear(self):
+        """Empty both indexes"""
+        self.entities = _PointSet(cell_size=self.entities.cell_size)
+        self.resources = _PointSet(cell_size=self.resources.cell_size)
+
+    def observe(self, entity_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """
+        Neighbour counts and nearest-target coordinates, one row per entity.
+
+        Nearest targets are searched within the neighbourhood of each
+        entity, which always covers the count radius, so they are exact
+        whenever the matching count is non-zero (the only time
+        process_decision reads them). Raises ValueError for IDs no vision
+        update has placed yet.
+        """
+        if entity_ids is None:
+            rows = np.arange(self.entities.count)
+        else:
+            known = self.entities.rows
+            unknown = [entity_id for entity_id in entity_ids if entity_id not in known]
+            if unknown:
+                raise ValueError(f"Unknown entity IDs {unknown[:10]}{' ...' if len(unknown) > 10 else ''}, "
+                                 "send a vision_update with their positions first")
+            rows = np.fromiter((known[entity_id] for entity_id in entity_ids), dtype=np.int64, count=len(entity_ids))
+
+        columns = {
+            'entity_id': self.entities.ids[rows].copy(),
+            'nearby_food': np.zeros(len(rows), dtype=np.int64),
+            'food_x': np.zeros(len(rows)),
+            'food_y': np.zeros(len(rows)),
+            'nearby_enemies': np.zeros(len(rows), dtype=np.int64),
+            'enemy_x': np.zeros(len(rows)),
+            'enemy_y': np.zeros(len(rows)),
+            'nearby_allies': np.zeros(len(rows), dtype=np.int64),
+            'ally_x': np.zeros(len(rows)),
+            'ally_y': np.zeros(len(rows))
+        }
+        for start in range(0, len(rows), self.chunk_size):
+            self._observe_chunk(rows[start:start + self.chunk_size], start, columns)
+        return columns
+
+    def _observe_chunk(self, rows: np.ndarray, offset: int, columns: Dict[str, np.ndarray]):
+        count = len(rows)
+        qx = self.entities.x[rows]
+        qy = self.entities.y[rows]
+        society = self.entities.group[rows]
+        span = slice(offset, offset + count)
+
+        # Food: edible, not depleted, within FOOD_RADIUS
+        resources = self.resources
+        query, row = resources.candidate_pairs(qx, qy)
+        dist_sq = (resources.x[row] - qx[query]) ** 2 + (resources.y[row] - qy[query]) ** 2
+        edible = EDIBLE[society[query], resources.group[row]] & (resources.amount[row] > 0)
+        in_range = edible & (dist_sq < FOOD_RADIUS ** 2)
+        columns['nearby_food'][span] = np.bincount(query[in_range], minlength=count)
+        nearest = _nearest(count, query[edible], row[edible], dist_sq[edible])
+        found = nearest >= 0
+        columns['food_x'][span][found] = resources.x[nearest[found]]
+        columns['food_y'][span][found] = resources.y[nearest[found]]
+
+        # Enemies and allies from the entity grid
+        entities = self.entities
+        query, row = entities.candidate_pairs(qx, qy)
+        not_self = row != rows[query]
+        query, row = query[not_self], row[not_self]
+        dist_sq = (entities.x[row] - qx[query]) ** 2 + (entities.y[row] - qy[query]) ** 2
+        same_society = entities.group[row] == society[query]
+
+        for (count_key, x_key, y_key), mask, radius in (
+            (('nearby_enemies', 'enemy_x', 'enemy_y'), ~same_society, ENEMY_RADIUS),
+            (('nearby_allies', 'ally_x', 'ally_y'), same_society, ALLY_RADIUS)
+        ):
+            in_range = mask & (dist_sq < radius ** 2)
+            columns[count_key][span] = np.bincount(query[in_range], minlength=count)
+            nearest = _nearest(count, query[mask], row[mask], dist_sq[mask])
+            found = nearest >= 0
+            columns[x_key][span][found] = entities.x[nearest[found]]
+            columns[y_key][span][found] = entities.y[nearest[found]]
+
+    def consume_food(self, x: Sequence[float], y: Sequence[float], societies: Sequence[str],
+                     bite: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Let each entity eat from the closest edible resource within radius.
+
+        An eater takes up to bite[society code, resource code]. When several
+        entities share a resource it is handed out in query order until it
+        runs out, as if they had eaten one after another. Returns the
+        resource code eaten per query (-1 for none) and the amount taken.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        count = len(x)
+        eaten = np.full(count, -1, dtype=np.int64)
+        taken = np.zeros(count)
+        if count == 0:
+            return eaten, taken
+
+        society = np.array(society_codes(societies), dtype=np.int64)
+        resources = self.resources
+        query, row = resources.candidate_pairs(x, y)
+        dist_sq = (resources.x[row] - x[query]) ** 2 + (resources.y[row] - y[query]) ** 2
+        # Cut down to pairs in reach first, the radius is far smaller than a grid cell
+        close = dist_sq < radius ** 2
+        query, row, dist_sq = query[close], row[close], dist_sq[close]
+        reachable = EDIBLE[society[query], resources.group[row]] & (resources.amount[row] > 0)
+        nearest = _nearest(count, query[reachable], row[reachable], dist_sq[reachable])
+        eaters = np.flatnonzero(nearest >= 0)
+        if eaters.size == 0:
+            return eaten, taken
+
+        # Group eaters by resource, in query order within a resource
+        order = np.lexsort((eaters, nearest[eaters]))
+        eaters = eaters[order]
+        rows = nearest[eaters]
+        wanted = bite[society[eaters], resources.group[rows]].astype(np.float64)
+        served = np.cumsum(wanted)
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(rows)), 0))
+        # Amount already taken from the same resource by earlier eaters
+        before = served - wanted - (served[group_start] - wanted[group_start])
+        got = np.clip(resources.amount[rows] - before, 0.0, wanted)
+        np.subtract.at(resources.amount, rows, got.astype(resources.amount.dtype))
+
+        eaten[eaters] = np.where(got > 0, resources.group[rows], -1)
+        taken[eaters] = got
+        return eaten, taken
+
+    def states(self, entity_ids: Sequence[int]) -> List[dict]:
+        """Per-entity state dicts in the shape process_decision reads"""
+        columns = self.observe(entity_ids)
+        keys = [key for key in columns if key != 'entity_id']
+        values = [columns[key].tolist() for key in keys]
+        return [dict(zip(keys, row)) for row in zip(*values)]
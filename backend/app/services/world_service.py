@@ -1,59 +1,460 @@
+import asyncio
 import json
 import os
+import time
+import numpy as np
 import torch
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from app.config import settings
+from app.core.brain_bank import BankSnapshot
 from app.services.brain_service import BrainService
+from app.services.entity_service import EntityService, entity_service as shared_entity_service
+from app.utils.checkpoints import CheckpointStore
+from app.utils.metrics import metrics
+from app.utils.storage import SNAPSHOT_EXTENSION, pack_snapshot, read_snapshot, unpack_snapshot, write_snapshot
+
+SNAPSHOT_VERSION = 1
+PROGRESS_EVERY = 500  # Brains written between checkpoint progress events
+PERSISTENCE_SECONDS = metrics.histogram(
+    "world_persistence_seconds",
+    "Seconds per completed save or load, by operation",
+    ["operation"]
+)
+
+# One persistence thread for the whole process, so saves, loads and chunk
+# garbage collection never overlap and never run on the event loop
+_persistence = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world-persistence")
+
+
+def _tensor_to_array(tensor: torch.Tensor) -> np.ndarray:
+    """NumPy view of a CPU tensor; bfloat16 travels as raw int16 bits"""
+    tensor = tensor.detach().cpu().contiguous()
+    if tensor.dtype == torch.bfloat16:
+        return tensor.view(torch.int16).numpy()
+    return tensor.numpy()
+
+
+def _array_to_tensor(array: np.ndarray, dtype_name: str) -> torch.Tensor:
+    """Tensor sharing memory with the array (no copy)"""
+    tensor = torch.from_numpy(array)
+    if dtype_name == "bfloat16":
+        return tensor.view(torch.bfloat16)
+    return tensor
+
 
 class WorldService:
-    def __init__(self):
-        self.brain_service = BrainService()
+    """
+    Saves and loads whole worlds.
+
+    The event loop only takes a snapshot (entity columns are copied, brains
+    are shared copy-on-write with the bank); hashing, serialization and disk
+    I/O run on the persistence thread, so a save costs the simulation a few
+    milliseconds however large the world is.
+
+    Worlds hold every brain in one bank, so saving and loading are refused
+    while brains are spread over a multi-node cluster_service.
+    """
+
+    def __init__(
+        self,
+        brain_service: Optional[BrainService] = None,
+        entity_service: Optional[EntityService] = None,
+        broadcast: Optional[Callable[[dict], Awaitable[None]]] = None,
+        cluster_service=None
+    ):
+        self.brain_service = brain_service or BrainService()
+        self.cluster_service = cluster_service
+        self.entity_service = entity_service or shared_entity_service
+        self.broadcast = broadcast
+        self.last_save_stats: Optional[dict] = None
+        self.last_load_stats: Optional[dict] = None
         os.makedirs(settings.WORLD_STATES_DIR, exist_ok=True)
         os.makedirs(settings.NEURAL_MODELS_DIR, exist_ok=True)
-    
-    async def save_world(self, world_state: dict, filename: Optional[str] = None) -> bool:
-        """Save world state and neural networks"""
+        self.checkpoints = CheckpointStore(settings.CHECKPOINTS_DIR)
+        # entity_id -> (bank version, chunk digest) as of the last checkpoint,
+        # only touched by the persistence thread or while holding _lock
+        self._brain_digests: Dict[int, Tuple[int, str]] = {}
+        self._lock = asyncio.Lock()
+        self._autosave_task: Optional[asyncio.Task] = None
+
+    def _check_single_node(self):
+        """Raise unless this node holds every brain"""
+        if self.cluster_service is not None and not self.cluster_service.single_node:
+            raise ValueError(
+                f"Node '{self.cluster_service.node_id}' holds only its share of the brains "
+                f"of {len(self.cluster_service.ring.nodes)} nodes, worlds cannot be saved or loaded per node"
+            )
+
+    def _world_header(self, world_state: dict, extras: List[dict], brains: BankSnapshot) -> dict:
+        return {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": datetime.now().isoformat(),
+            "world_state": world_state,
+            "society_names": list(self.entity_service.society_names),
+            "entity_extras": extras,
+            "brain_storage_dtype": brains.storage_dtype,
+            "brain_config": brains.brain_kwargs
+        }
+
+    def _capture(self, world_state: dict) -> dict:
+        """Consistent copy of the world for the persistence thread, taken on the event loop"""
+        entity_ids, columns, extras = self.entity_service.export_columns()
+        brains = self.brain_service.bank.snapshot()
+        return {
+            "header": self._world_header(world_state, [dict(extra) for extra in extras], brains),
+            "entity_ids": entity_ids.copy(),
+            "columns": {name: column.copy() for name, column in columns.items()},
+            "brains": brains
+        }
+
+    async def _save_in_worker(self, capture: dict, fn: Callable, *args):
+        """Run a save on the persistence thread, releasing the brain snapshot once it is done"""
+        loop = asyncio.get_running_loop()
+        bank = self.brain_service.bank
+        future = _persistence.submit(fn, capture, *args)
+        # Released when the thread finishes, even if the awaiting task is cancelled
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(bank.release))
+        return await asyncio.wrap_future(future)
+
+    async def _run_in_worker(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(_persistence, fn, *args)
+
+    def _progress_reporter(self, name: str) -> Optional[Callable[[int, int], None]]:
+        """Callback for the persistence thread that pushes progress events from the event loop"""
+        if not self.broadcast:
+            return None
+        loop = asyncio.get_running_loop()
+
+        def report(done: int, total: int):
+            asyncio.run_coroutine_threadsafe(self.broadcast({
+                "type": "save_progress",
+                "name": name,
+                "brains_done": done,
+                "brains_total": total
+            }), loop)
+        return report
+
+    async def _notify(self, message: dict):
+        if self.broadcast:
+            await self.broadcast(message)
+
+    def _write_world(self, capture: dict, filepath: str) -> int:
+        """Persistence thread: write one packed snapshot file"""
+        arrays: Dict[str, np.ndarray] = {"entities/ids": capture["entity_ids"]}
+        for name, column in capture["columns"].items():
+            arrays[f"entities/{name}"] = column
+
+        # All brain weights, already stacked per parameter in the bank
+        brain_ids, packed = capture["brains"].packed()
+        brain_dtypes = {}
+        arrays["brains/ids"] = np.asarray(brain_ids, dtype=np.int64)
+        for name, tensor in packed.items():
+            arrays[f"brains/{name}"] = _tensor_to_array(tensor)
+            brain_dtypes[name] = str(tensor.dtype).replace("torch.", "")
+
+        header = {**capture["header"], "brain_dtypes": brain_dtypes}
+        return write_snapshot(filepath, header, arrays, compression=settings.SNAPSHOT_COMPRESSION)
+
+    async def save_world(self, world_state: dict, filename: Optional[str] = None) -> Optional[dict]:
+        """
+        Save world state, entity columns and every brain into one packed snapshot file.
+        Returns save stats (bytes, seconds, MB/s), or None on failure.
+        """
         try:
-            if not filename:
-                filename = f"world_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            
-            filepath = os.path.join(settings.WORLD_STATES_DIR, filename)
-            
-            with open(filepath, 'w') as f:
-                json.dump(world_state, f, indent=2)
-            
-            # Save neural networks
-            for entity_id, brain in self.brain_service.entity_brains.items():
-                model_path = os.path.join(
-                    settings.NEURAL_MODELS_DIR,
-                    f"entity_{entity_id}.pt"
-                )
-                torch.save(brain.state_dict(), model_path)
-            
-            return True
+            self._check_single_node()
+            async with self._lock:
+                started = time.perf_counter()
+                if not filename:
+                    filename = f"world_{datetime.now().strftime('%Y%m%d_%H%M%S')}{SNAPSHOT_EXTENSION}"
+                if not filename.endswith(SNAPSHOT_EXTENSION):
+                    filename = os.path.splitext(filename)[0] + SNAPSHOT_EXTENSION
+
+                filepath = os.path.join(settings.WORLD_STATES_DIR, filename)
+                capture = self._capture(world_state)
+                capture_seconds = time.perf_counter() - started
+                size = await self._save_in_worker(capture, self._write_world, filepath)
+
+                seconds = time.perf_counter() - started
+                PERSISTENCE_SECONDS.observe(seconds, "save_world")
+                self.last_save_stats = {
+                    "type": "world_saved",
+                    "filename": filename,
+                    "entities": len(capture["entity_ids"]),
+                    "brains": len(capture["brains"]),
+                    "bytes": size,
+                    "seconds": seconds,
+                    "capture_ms": capture_seconds * 1000,
+                    "mb_per_s": size / 1024 ** 2 / seconds if seconds > 0 else 0.0
+                }
+            print(f"Saved {filename}: {size / 1024 ** 2:.1f} MB in {seconds * 1000:.0f} ms "
+                  f"({self.last_save_stats['mb_per_s']:.0f} MB/s)")
+            await self._notify(self.last_save_stats)
+            return self.last_save_stats
         except Exception as e:
             print(f"Error saving world: {e}")
-            return False
-    
+            return None
+
     async def load_world(self, filename: str) -> Optional[dict]:
-        """Load world state"""
+        """Load world state, restoring entities and brains from packed snapshots"""
         try:
+            self._check_single_node()
             filepath = os.path.join(settings.WORLD_STATES_DIR, filename)
-            
-            with open(filepath, 'r') as f:
-                world_state = json.load(f)
-            
-            return world_state
+
+            # Saves from before packed snapshots are plain JSON
+            if filename.endswith('.json'):
+                def read_json():
+                    with open(filepath, 'r') as f:
+                        return json.load(f)
+                return await self._run_in_worker(read_json)
+
+            async with self._lock:
+                started = time.perf_counter()
+                header, arrays = await self._run_in_worker(read_snapshot, filepath)
+
+                # Brain tensors keep pointing into the memory-mapped file
+                packed = {
+                    name.split("/", 1)[1]: _array_to_tensor(array, header["brain_dtypes"][name.split("/", 1)[1]])
+                    for name, array in arrays.items()
+                    if name.startswith("brains/") and name != "brains/ids"
+                }
+                brain_ids = arrays["brains/ids"].tolist()
+                # Nothing is replaced unless the brains fit this server's architecture
+                self.brain_service.bank.check_compatible(header["brain_config"], packed, len(brain_ids))
+
+                columns = {
+                    name.split("/", 1)[1]: array for name, array in arrays.items()
+                    if name.startswith("entities/") and name != "entities/ids"
+                }
+                self.entity_service.load_columns(
+                    arrays["entities/ids"], columns, header["society_names"], header["entity_extras"]
+                )
+                self.brain_service.bank.adopt(brain_ids, packed, header["brain_storage_dtype"])
+                # Memories belong to the world that was replaced
+                self.brain_service.forget()
+                self._brain_digests = {}
+
+                seconds = time.perf_counter() - started
+                PERSISTENCE_SECONDS.observe(seconds, "load_world")
+                size = os.path.getsize(filepath)
+                self.last_load_stats = {
+                    "filename": filename,
+                    "entities": len(arrays["entities/ids"]),
+                    "brains": len(arrays["brains/ids"]),
+                    "bytes": size,
+                    "seconds": seconds,
+                    "mb_per_s": size / 1024 ** 2 / seconds if seconds > 0 else 0.0
+                }
+            print(f"Loaded {filename}: {size / 1024 ** 2:.1f} MB in {seconds * 1000:.0f} ms "
+                  f"({self.last_load_stats['mb_per_s']:.0f} MB/s)")
+            return header["world_state"]
         except Exception as e:
             print(f"Error loading world: {e}")
             return None
-    
+
+    def _write_checkpoint(self, capture: dict, name: str, prune_prefix: Optional[str], keep: int,
+                          progress: Optional[Callable[[int, int], None]]) -> dict:
+        """Persistence thread: store changed brains and the manifest, then prune"""
+        store = self.checkpoints
+
+        # Entity columns change every tick, so they go in whole as one chunk
+        entity_digest, bytes_written = store.put_chunk(
+            pack_snapshot({}, {"ids": capture["entity_ids"], **capture["columns"]})
+        )
+
+        brains: BankSnapshot = capture["brains"]
+        brain_ids = brains.entity_ids()
+        digests: Dict[int, Tuple[int, str]] = {}
+        changed: List[int] = []
+        for entity_id in brain_ids:
+            cached = self._brain_digests.get(entity_id)
+            if cached and cached[0] == brains.versions[entity_id] and store.has_chunk(cached[1]):
+                digests[entity_id] = cached
+            else:
+                changed.append(entity_id)
+
+        # One chunk per brain: its rows of every packed tensor, back to back
+        _, packed = brains.packed(changed)
+        arrays = {key: _tensor_to_array(tensor) for key, tensor in packed.items()}
+        for row, entity_id in enumerate(changed):
+            chunk = b"".join(array[row].tobytes() for array in arrays.values())
+            digest, written = store.put_chunk(chunk)
+            bytes_written += written
+            digests[entity_id] = (brains.versions[entity_id], digest)
+            if progress and (row + 1) % PROGRESS_EVERY == 0:
+                progress(row + 1, len(changed))
+        self._brain_digests = digests
+
+        manifest = dict(capture["header"])
+        manifest["entities"] = {"chunks": [entity_digest]}
+        manifest["brains"] = {
+            "ids": brain_ids,
+            "chunks": [digests[entity_id][1] for entity_id in brain_ids],
+            # [key, torch dtype, on-disk numpy dtype, per-brain shape]
+            "layout": [
+                [key, str(tensor.dtype).replace("torch.", ""), arrays[key].dtype.str, list(tensor.shape[1:])]
+                for key, tensor in packed.items()
+            ]
+        }
+        bytes_written += store.write_manifest(name, manifest)
+        pruned = store.prune(max(keep, 1), prune_prefix) if prune_prefix else {}
+        return {"brains_written": len(changed), "bytes": bytes_written, **pruned}
+
+    async def save_checkpoint(self, world_state: dict, name: Optional[str] = None,
+                              autosave: bool = False) -> Optional[dict]:
+        """
+        Write an incremental checkpoint: only brains changed since the last
+        checkpoint are hashed and stored, everything else is referenced by digest.
+        Unnamed checkpoints and autosaves are pruned to CHECKPOINT_RETENTION
+        and AUTOSAVE_RETENTION respectively; named ones are kept.
+        """
+        try:
+            self._check_single_node()
+            async with self._lock:
+                started = time.perf_counter()
+                prefix = "autosave" if autosave else "checkpoint"
+                prune_prefix = None
+                if not name:
+                    name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+                    prune_prefix = f"{prefix}_"
+                keep = settings.AUTOSAVE_RETENTION if autosave else settings.CHECKPOINT_RETENTION
+
+                capture = self._capture(world_state)
+                capture_seconds = time.perf_counter() - started
+                written = await self._save_in_worker(
+                    capture, self._write_checkpoint, name, prune_prefix, keep, self._progress_reporter(name)
+                )
+
+                seconds = time.perf_counter() - started
+                PERSISTENCE_SECONDS.observe(seconds, "autosave" if autosave else "save_checkpoint")
+                self.last_save_stats = {
+                    "type": "checkpoint_saved",
+                    "name": name,
+                    "autosave": autosave,
+                    "entities": len(capture["entity_ids"]),
+                    "brains": len(capture["brains"]),
+                    "seconds": seconds,
+                    "capture_ms": capture_seconds * 1000,
+                    **written
+                }
+            print(f"Checkpoint {name}: {written['brains_written']}/{self.last_save_stats['brains']} brains written, "
+                  f"{written['bytes'] / 1024 ** 2:.1f} MB in {seconds * 1000:.0f} ms")
+            await self._notify(self.last_save_stats)
+            return self.last_save_stats
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+            return None
+
+    def _read_checkpoint(self, name: str) -> Tuple[dict, Dict[str, np.ndarray], Dict[str, np.ndarray], int]:
+        """Persistence thread: manifest, entity columns and packed brain arrays of a checkpoint"""
+        store = self.checkpoints
+        manifest = store.read_manifest(name)
+        _, entity_arrays = unpack_snapshot(store.get_chunk(manifest["entities"]["chunks"][0]))
+
+        brains = manifest["brains"]
+        count = len(brains["ids"])
+        layout = []
+        packed_arrays: Dict[str, np.ndarray] = {}
+        for key, _, dtype_str, shape in brains["layout"]:
+            dtype = np.dtype(dtype_str)
+            layout.append((key, dtype, shape, int(np.prod(shape)) * dtype.itemsize))
+            packed_arrays[key] = np.empty((count, *shape), dtype=dtype)
+
+        # Brains that were cloned share a chunk, read each one once
+        chunks: Dict[str, bytes] = {}
+        for row, digest in enumerate(brains["chunks"]):
+            if digest not in chunks:
+                chunks[digest] = store.get_chunk(digest)
+            chunk = chunks[digest]
+            offset = 0
+            for key, dtype, shape, nbytes in layout:
+                packed_arrays[key][row] = np.frombuffer(
+                    chunk, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset
+                ).reshape(shape)
+                offset += nbytes
+        return manifest, entity_arrays, packed_arrays, len(chunks)
+
+    async def load_checkpoint(self, name: str) -> Optional[dict]:
+        """Rebuild entities and brains from a checkpoint manifest, returns the world state"""
+        try:
+            self._check_single_node()
+            async with self._lock:
+                started = time.perf_counter()
+                manifest, entity_arrays, packed_arrays, unique_brains = await self._run_in_worker(
+                    self._read_checkpoint, name
+                )
+
+                brains = manifest["brains"]
+                bank = self.brain_service.bank
+                packed = {
+                    key: _array_to_tensor(packed_arrays[key], dtype_name) for key, dtype_name, *_ in brains["layout"]
+                }
+                bank.check_compatible(manifest["brain_config"], packed, len(brains["ids"]))
+
+                entity_ids = entity_arrays.pop("ids")
+                self.entity_service.load_columns(
+                    entity_ids, entity_arrays, manifest["society_names"], manifest["entity_extras"]
+                )
+                bank.adopt(brains["ids"], packed, manifest["brain_storage_dtype"])
+                self.brain_service.forget()
+                # Nothing has changed since this checkpoint yet
+                self._brain_digests = {
+                    entity_id: (bank.versions[entity_id], digest)
+                    for entity_id, digest in zip(brains["ids"], brains["chunks"])
+                }
+
+                seconds = time.perf_counter() - started
+                PERSISTENCE_SECONDS.observe(seconds, "load_checkpoint")
+                self.last_load_stats = {
+                    "name": name,
+                    "entities": len(entity_ids),
+                    "brains": len(brains["ids"]),
+                    "unique_brains": unique_brains,
+                    "seconds": seconds
+                }
+            print(f"Loaded checkpoint {name}: {len(brains['ids'])} brains in {seconds * 1000:.0f} ms")
+            return manifest["world_state"]
+        except Exception as e:
+            print(f"Error loading checkpoint: {e}")
+            return None
+
+    def start_autosave(self, world_state: Callable[[], dict], interval: Optional[float] = None) -> bool:
+        """Checkpoint every `interval` seconds (AUTOSAVE_INTERVAL by default, 0 disables)"""
+        interval = settings.AUTOSAVE_INTERVAL if interval is None else interval
+        if interval <= 0 or self._autosave_task:
+            return False
+        if self.cluster_service is not None and not self.cluster_service.single_node:
+            print("WorldService: autosave disabled, brains are spread over several nodes")
+            return False
+        self._autosave_task = asyncio.create_task(self._autosave(world_state, interval))
+        return True
+
+    async def stop_autosave(self) -> bool:
+        """Stop periodic autosaves, a save already on the persistence thread still completes"""
+        if not self._autosave_task:
+            return False
+        self._autosave_task.cancel()
+        try:
+            await self._autosave_task
+        except asyncio.CancelledError:
+            pass
+        self._autosave_task = None
+        return True
+
+    async def _autosave(self, world_state: Callable[[], dict], interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.save_checkpoint(world_state(), autosave=True)
+
+    def list_checkpoints(self) -> List[str]:
+        """List checkpoint names, oldest first"""
+        return self.checkpoints.list_checkpoints()
+
     def list_saves(self) -> list:
         """List all save files"""
         try:
             files = os.listdir(settings.WORLD_STATES_DIR)
-            return [f for f in files if f.endswith('.json')]
+            return [f for f in files if f.endswith(SNAPSHOT_EXTENSION) or f.endswith('.json')]
         except:
             return []
-
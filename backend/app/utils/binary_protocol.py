@@ -0,0 +1,138 @@
+"""
+Binary WebSocket frames for decision traffic.
+
+Every frame starts with a 16-byte little-endian header:
+
+    magic     2s   b"EV"
+    version   u8   PROTOCOL_VERSION
+    kind      u8   DECISION_REQUEST or DECISION_RESULT
+    flags     u16  FLAG_STATES when a request carries states
+    width     u16  input size (requests) or number of actions (results)
+    count     u32  number of entities
+    sequence  u32  chosen by the client, echoed back in the result
+
+followed by packed arrays, each starting on a 4-byte boundary:
+
+    request:  ids int64[count], inputs float32[count, width],
+              states float32[count, len(STATE_FIELDS)] if FLAG_STATES
+    result:   ids int64[count], probabilities float32[count, width],
+              target_x float32[count], target_y float32[count],
+              action uint8[count], has_target uint8[count]
+
+Requests are decoded with np.frombuffer, so arrays are views of the frame.
+"""
+import struct
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+PROTOCOL_VERSION = 1
+MAGIC = b"EV"
+HEADER = struct.Struct("<2sBBHHII")
+
+DECISION_REQUEST = 1
+DECISION_RESULT = 2
+
+FLAG_STATES = 1
+
+# Per-entity state columns a request may carry, in frame order
+STATE_FIELDS = (
+    'nearby_food', 'food_x', 'food_y',
+    'nearby_enemies', 'enemy_x', 'enemy_y',
+    'nearby_allies', 'ally_x', 'ally_y'
+)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _header(data: bytes, kind: int) -> Tuple[int, int, int, int]:
+    if len(data) < HEADER.size:
+        raise ProtocolError("Frame shorter than header")
+    magic, version, frame_kind, flags, width, count, sequence = HEADER.unpack_from(data)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported frame (magic {magic!r}, version {version})")
+    if frame_kind != kind:
+        raise ProtocolError(f"Expected frame kind {kind}, got {frame_kind}")
+    return flags, width, count, sequence
+
+
+def encode_decision_request(entity_ids, inputs, states: Optional[Dict[str, np.ndarray]] = None,
+                            sequence: int = 0) -> bytes:
+    """Pack a batch decision request, states as columns keyed by STATE_FIELDS"""
+    entity_ids = np.ascontiguousarray(entity_ids, dtype='<i8')
+    inputs = np.ascontiguousarray(inputs, dtype='<f4')
+    # An empty batch keeps the width it was given, -1 cannot be inferred from zero rows
+    inputs = inputs.reshape(len(entity_ids), inputs.shape[-1] if len(entity_ids) == 0 and inputs.ndim > 1 else -1)
+    parts = [
+        HEADER.pack(MAGIC, PROTOCOL_VERSION, DECISION_REQUEST, FLAG_STATES if states is not None else 0,
+                    inputs.shape[1], len(entity_ids), sequence),
+        entity_ids.tobytes(),
+        inputs.tobytes()
+    ]
+    if states is not None:
+        parts.append(np.column_stack([
+            np.asarray(states[field], dtype='<f4') for field in STATE_FIELDS
+        ]).astype('<f4', copy=False).tobytes())
+    return b"".join(parts)
+
+
+def decode_decision_request(data: bytes) -> Tuple[np.ndarray, np.ndarray, Optional[Dict[str, np.ndarray]], int]:
+    """Unpack a decision request: ids, inputs [count, width], state columns or None, sequence"""
+    flags, width, count, sequence = _header(data, DECISION_REQUEST)
+    state_width = len(STATE_FIELDS) if flags & FLAG_STATES else 0
+    expected = HEADER.size + count * (8 + 4 * width + 4 * state_width)
+    if len(data) != expected:
+        raise ProtocolError(f"Frame is {len(data)} bytes, expected {expected}")
+
+    offset = HEADER.size
+    entity_ids = np.frombuffer(data, dtype='<i8', count=count, offset=offset)
+    offset += 8 * count
+    inputs = np.frombuffer(data, dtype='<f4', count=count * width, offset=offset).reshape(count, width)
+    offset += 4 * count * width
+
+    states = None
+    if state_width:
+        packed = np.frombuffer(data, dtype='<f4', count=count * state_width, offset=offset).reshape(count, state_width)
+        states = {field: packed[:, column] for column, field in enumerate(STATE_FIELDS)}
+    return entity_ids, inputs, states, sequence
+
+
+def encode_decision_result(entity_ids, probabilities: np.ndarray, action_index: np.ndarray,
+                           target_x: np.ndarray, target_y: np.ndarray, has_target: np.ndarray,
+                           sequence: int = 0) -> bytes:
+    """Pack batched decisions, as returned by BrainService.decide"""
+    probabilities = np.ascontiguousarray(probabilities, dtype='<f4')
+    count, width = probabilities.shape
+    return b"".join([
+        HEADER.pack(MAGIC, PROTOCOL_VERSION, DECISION_RESULT, 0, width, count, sequence),
+        np.ascontiguousarray(entity_ids, dtype='<i8').tobytes(),
+        probabilities.tobytes(),
+        np.asarray(target_x, dtype='<f4').tobytes(),
+        np.asarray(target_y, dtype='<f4').tobytes(),
+        np.asarray(action_index, dtype=np.uint8).tobytes(),
+        np.asarray(has_target, dtype=np.uint8).tobytes()
+    ])
+
+
+def decode_decision_result(data: bytes) -> Dict[str, np.ndarray]:
+    """Unpack a decision result into arrays, plus the echoed sequence"""
+    _, width, count, sequence = _header(data, DECISION_RESULT)
+    expected = HEADER.size + count * (8 + 4 * width + 4 + 4 + 1 + 1)
+    if len(data) != expected:
+        raise ProtocolError(f"Frame is {len(data)} bytes, expected {expected}")
+    offset = HEADER.size
+    result = {'sequence': sequence}
+    for name, dtype, size in (
+        ('entity_ids', '<i8', count),
+        ('action_probabilities', '<f4', count * width),
+        ('target_x', '<f4', count),
+        ('target_y', '<f4', count),
+        ('action_index', np.uint8, count),
+        ('has_target', np.uint8, count)
+    ):
+        result[name] = np.frombuffer(data, dtype=dtype, count=size, offset=offset)
+        offset += np.dtype(dtype).itemsize * size
+    result['action_probabilities'] = result['action_probabilities'].reshape(count, width)
+    result['has_target'] = result['has_target'].astype(bool)
+    return result
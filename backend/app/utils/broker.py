@@ -0,0 +1,215 @@
+import asyncio
+import fcntl
+import json
+import os
+import struct
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+# A node's inbound handler: message in, reply out. Messages and replies are
+# dicts of JSON-compatible values and bytes, so any transport can carry them.
+Handler = Callable[[dict], Awaitable[dict]]
+
+# Frame prefix: JSON header length, then total length of the byte values after it
+FRAME_PREFIX = struct.Struct("<II")
+
+
+class Broker(ABC):
+    """Delivers a message to a node and returns its reply"""
+
+    @abstractmethod
+    def register(self, node_id: str, handler: Handler):
+        """Route requests for node_id to handler"""
+
+    @abstractmethod
+    def unregister(self, node_id: str):
+        """Stop routing requests for node_id"""
+
+    @abstractmethod
+    async def request(self, node_id: str, message: dict) -> dict:
+        """Send a message to node_id and return its reply"""
+
+    async def start(self):
+        """Start accepting requests for registered nodes, on the running event loop"""
+
+    async def close(self):
+        """Stop accepting requests and drop connections"""
+
+
+class LocalBroker(Broker):
+    """
+    In-process stand-in for a network broker: every node lives in this
+    process and requests are plain awaits of the target's handler.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+
+    def register(self, node_id: str, handler: Handler):
+        self.handlers[node_id] = handler
+
+    def unregister(self, node_id: str):
+        self.handlers.pop(node_id, None)
+
+    async def request(self, node_id: str, message: dict) -> dict:
+        handler = self.handlers.get(node_id)
+        if handler is None:
+            raise ConnectionError(f"No node '{node_id}' on this broker")
+        return await handler(message)
+
+
+def encode_message(message: dict, error: Optional[str] = None) -> bytes:
+    """
+    One frame per message: the JSON-compatible values as a JSON header, and
+    top-level bytes values appended raw after it (no base64, no pickle). A
+    reply to a failed request carries the error instead of a message.
+    """
+    blobs = [(key, bytes(value)) for key, value in message.items() if isinstance(value, (bytes, bytearray, memoryview))]
+    header = json.dumps({
+        'values': {key: value for key, value in message.items() if not isinstance(value, (bytes, bytearray, memoryview))},
+        'blobs': [[key, len(value)] for key, value in blobs],
+        'error': error
+    }, separators=(",", ":")).encode()
+    return b"".join([FRAME_PREFIX.pack(len(header), sum(len(value) for _, value in blobs)), header]
+                    + [value for _, value in blobs])
+
+
+async def read_message(reader: asyncio.StreamReader) -> Tuple[dict, Optional[str]]:
+    """Read one encode_message frame as (message, error), IncompleteReadError if the stream ends first"""
+    header_size, blobs_size = FRAME_PREFIX.unpack(await reader.readexactly(FRAME_PREFIX.size))
+    header = json.loads(await reader.readexactly(header_size))
+    blobs = await reader.readexactly(blobs_size)
+    message = header['values']
+    offset = 0
+    for key, size in header['blobs']:
+        message[key] = blobs[offset:offset + size]
+        offset += size
+    return message, header['error']
+
+
+class UnixSocketBroker(Broker):
+    """
+    Broker between processes on one host. Each registered node listens on
+    <socket_dir>/<node_id>.sock; requests open a connection to the target's
+    socket, send one frame and wait for the reply frame. Idle connections
+    are kept for reuse, one request at a time each.
+
+    Handler errors are sent back and raised from request() as RuntimeError;
+    an unreachable node raises ConnectionError.
+    """
+
+    def __init__(self, socket_dir: str):
+        self.socket_dir = socket_dir
+        self.handlers: Dict[str, Handler] = {}
+        self.servers: Dict[str, asyncio.AbstractServer] = {}
+        self.idle: Dict[str, List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        # Connections other nodes opened to this one
+        self.serving: Set[asyncio.StreamWriter] = set()
+        os.makedirs(socket_dir, exist_ok=True)
+
+    def socket_path(self, node_id: str) -> str:
+        return os.path.join(self.socket_dir, f"{node_id}.sock")
+
+    def register(self, node_id: str, handler: Handler):
+        self.handlers[node_id] = handler
+
+    def unregister(self, node_id: str):
+        self.handlers.pop(node_id, None)
+        server = self.servers.pop(node_id, None)
+        if server is not None:
+            server.close()
+            if os.path.exists(self.socket_path(node_id)):
+                os.remove(self.socket_path(node_id))
+
+    async def start(self):
+        for node_id, handler in self.handlers.items():
+            if node_id in self.servers:
+                continue
+            path = self.socket_path(node_id)
+            # Left behind by a process that did not shut down cleanly
+            if os.path.exists(path):
+                os.remove(path)
+            self.servers[node_id] = await asyncio.start_unix_server(
+                lambda reader, writer, handler=handler: self._serve(handler, reader, writer), path
+            )
+
+    async def _serve(self, handler: Handler, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.serving.add(writer)
+        try:
+            while True:
+                try:
+                    message, _ = await read_message(reader)
+                except asyncio.IncompleteReadError:
+                    return
+                try:
+                    frame = encode_message(await handler(message))
+                except Exception as e:
+                    frame = encode_message({}, f"{type(e).__name__}: {e}")
+                writer.write(frame)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.serving.discard(writer)
+            writer.close()
+
+    async def request(self, node_id: str, message: dict) -> dict:
+        idle = self.idle.setdefault(node_id, [])
+        if idle:
+            reader, writer = idle.pop()
+        else:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path(node_id))
+            except OSError as e:
+                raise ConnectionError(f"Node '{node_id}' is not reachable: {e}") from e
+        try:
+            writer.write(encode_message(message))
+            await writer.drain()
+            reply, error = await read_message(reader)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            writer.close()
+            raise ConnectionError(f"Lost connection to node '{node_id}': {e}") from e
+        except BaseException:
+            # Cancelled mid-request, the connection is out of step with its replies
+            writer.close()
+            raise
+        idle.append((reader, writer))
+        if error is not None:
+            raise RuntimeError(f"Node '{node_id}' failed: {error}")
+        return reply
+
+    async def close(self):
+        for node_id in list(self.servers):
+            self.unregister(node_id)
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle = {}
+        # Ends each connection's serving task with end of stream
+        for writer in list(self.serving):
+            writer.close()
+        await asyncio.sleep(0)
+
+
+# Lock files of node IDs claimed by this process, held open until it exits
+_claimed: Dict[str, int] = {}
+
+
+def claim_node_id(nodes: Sequence[str], socket_dir: str) -> str:
+    """
+    First node ID of `nodes` not already claimed by another process sharing
+    socket_dir, so every worker of `uvicorn --workers N` takes its own node.
+    """
+    os.makedirs(socket_dir, exist_ok=True)
+    for node_id in nodes:
+        if node_id in _claimed:
+            return node_id
+        fd = os.open(os.path.join(socket_dir, f"{node_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        _claimed[node_id] = fd
+        return node_id
+    raise ValueError(f"Every node of {list(nodes)} is already taken in {socket_dir}")
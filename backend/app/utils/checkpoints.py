@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+MANIFEST_EXTENSION = ".manifest.json"
+
+
+def chunk_digest(data) -> str:
+    """Content address of a chunk"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Content-addressed chunk store plus one small manifest per checkpoint.
+
+    Chunks are immutable files named by the hash of their bytes, so a chunk
+    shared by many checkpoints is stored once and writing it again is a no-op.
+    A manifest is a JSON document that names the chunks its checkpoint needs
+    (in any "chunks" lists it contains). The store counts how many manifests
+    name each chunk, so deleting a checkpoint removes exactly the chunks no
+    other checkpoint needs without listing the chunk directories;
+    collect_garbage is the full sweep for chunks left behind by a save that
+    never wrote its manifest.
+
+    Chunks and the directories they land in are fsynced before the manifest
+    naming them is written, so a manifest on disk never outlives its chunks.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.manifests_dir = os.path.join(root, "manifests")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        # digest -> number of manifests naming it, read from the manifests on first use
+        self._refcounts: Optional[Counter] = None
+        # Directories with entries not yet fsynced, flushed before the next manifest
+        self._unsynced_dirs: Set[str] = set()
+
+    def _chunk_path(self, digest: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.chunks_dir, digest[:2], digest[2:])
+
+    def has_chunk(self, digest: str) -> bool:
+        return os.path.exists(self._chunk_path(digest))
+
+    def put_chunk(self, data, digest: Optional[str] = None) -> Tuple[str, int]:
+        """Store a chunk if it is new, returns (digest, bytes written)"""
+        digest = digest or chunk_digest(data)
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            self._unsynced_dirs.add(self.chunks_dir)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self._unsynced_dirs.add(directory)
+        return digest, len(data)
+
+    def get_chunk(self, digest: str) -> bytes:
+        with open(self._chunk_path(digest), "rb") as f:
+            return f.read()
+
+    def chunk_digests(self) -> Set[str]:
+        """Every chunk currently on disk"""
+        digests = set()
+        for prefix in os.listdir(self.chunks_dir):
+            directory = os.path.join(self.chunks_dir, prefix)
+            for name in os.listdir(directory):
+                if not name.endswith(".tmp"):
+                    digests.add(prefix + name)
+        return digests
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self.manifests_dir, name + MANIFEST_EXTENSION)
+
+    @staticmethod
+    def _fsync_dir(directory: str):
+        """Make renames and new entries in a directory durable"""
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _sync_chunks(self):
+        """fsync every directory a chunk was added to since the last manifest"""
+        # Fan-out directories before the chunks directory that names them
+        for directory in sorted(self._unsynced_dirs, key=len, reverse=True):
+            self._fsync_dir(directory)
+        self._unsynced_dirs.clear()
+
+    def _references(self) -> Counter:
+        if self._refcounts is None:
+            refcounts = Counter()
+            for name in self.list_checkpoints():
+                refcounts.update(set(self.referenced_chunks(self.read_manifest(name))))
+            self._refcounts = refcounts
+        return self._refcounts
+
+    def write_manifest(self, name: str, manifest: dict) -> int:
+        """Write a checkpoint manifest atomically once its chunks are durable, returns its size"""
+        references = self._references()
+        self._sync_chunks()
+        data = json.dumps(manifest).encode()
+        path = self._manifest_path(name)
+        replaced = set(self.referenced_chunks(self.read_manifest(name))) if os.path.exists(path) else set()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self._fsync_dir(self.manifests_dir)
+        references.update(set(self.referenced_chunks(manifest)))
+        self._release(replaced)
+        return len(data)
+
+    def read_manifest(self, name: str) -> dict:
+        with open(self._manifest_path(name), "r") as f:
+            return json.load(f)
+
+    def list_checkpoints(self) -> List[str]:
+        """Checkpoint names, oldest first"""
+        names = [
+            name[:-len(MANIFEST_EXTENSION)] for name in os.listdir(self.manifests_dir)
+            if name.endswith(MANIFEST_EXTENSION)
+        ]
+        return sorted(names, key=lambda name: os.path.getmtime(self._manifest_path(name)))
+
+    def delete_checkpoint(self, name: str) -> Optional[Dict[str, int]]:
+        """Delete a checkpoint and the chunks only it needed, None if there is no such checkpoint"""
+        path = self._manifest_path(name)
+        if not os.path.exists(path):
+            return None
+        # Counted before the manifest goes, or a first count would miss it
+        self._references()
+        digests = set(self.referenced_chunks(self.read_manifest(name)))
+        os.remove(path)
+        self._fsync_dir(self.manifests_dir)
+        return self._release(digests)
+
+    def _release(self, digests: Iterable[str]) -> Dict[str, int]:
+        """Drop one reference to each chunk, removing those nothing names any more"""
+        references = self._references()
+        removed = 0
+        freed = 0
+        for digest in digests:
+            references[digest] -= 1
+            if references[digest] > 0:
+                continue
+            del references[digest]
+            path = self._chunk_path(digest)
+            if os.path.exists(path):
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        return {"chunks_removed": removed, "bytes_freed": freed}
+
+    @staticmethod
+    def referenced_chunks(manifest: dict) -> Iterable[str]:
+        for value in manifest.values():
+            if isinstance(value, dict) and "chunks" in value:
+                yield from value["chunks"]
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        Mark chunks named by any manifest, sweep the rest. Reads every
+        manifest and lists every chunk; deleting checkpoints already removes
+        their chunks, this only finds ones orphaned by an interrupted save.
+        Must not run while a checkpoint is being written, since its chunks
+        land before its manifest does.
+        """
+        self._refcounts = None
+        live = set(self._references())
+
+        removed = 0
+        freed = 0
+        for digest in self.chunk_digests() - live:
+            path = self._chunk_path(digest)
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+        return {"chunks_removed": removed, "bytes_freed": freed}
+
+    def prune(self, keep: int, prefix: str = "") -> Dict[str, int]:
+        """Delete all but the newest `keep` checkpoints named `prefix`*, with the chunks only they needed"""
+        checkpoints = [name for name in self.list_checkpoints() if name.startswith(prefix)]
+        expired = checkpoints[:max(len(checkpoints) - keep, 0)]
+        totals = {"checkpoints_removed": len(expired), "chunks_removed": 0, "bytes_freed": 0}
+        for name in expired:
+            for key, value in (self.delete_checkpoint(name) or {}).items():
+                totals[key] += value
+        return totals
@@ -1,24 +1,191 @@
+import asyncio
+import json
+from collections import deque
 from fastapi import WebSocket
-from typing import List
+from typing import Dict, List, Optional
+from app.config import settings
+
+# Message types that only matter in their latest version: a queued one is
+# replaced by a newer one, and they are the first dropped for slow clients
+COALESCED_TYPES = {'world_state', 'save_progress'}
+
+# Close code for clients that cannot keep up with events that must not be dropped
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientChannel:
+    """
+    Bounded outbound queue of one client, drained by its own writer task so a
+    slow socket only ever delays itself. Every send on the socket, queued or
+    direct, holds `lock`, so frames from different tasks never interleave.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.max_queue = max(max_queue, 1)
+        # (coalesce key or None, serialized message)
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.writer = asyncio.create_task(self._write())
+
+    def push(self, key: Optional[str], text: str) -> bool:
+        """Queue a message without waiting, False if the client is too slow to keep"""
+        if self.closed:
+            return True
+        if key is not None:
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key == key:
+                    self.queue[index] = (key, text)
+                    self.coalesced += 1
+                    return True
+        if len(self.queue) >= self.max_queue:
+            stale = next((index for index, (queued_key, _) in enumerate(self.queue) if queued_key is not None), None)
+            if stale is None:
+                return False
+            del self.queue[stale]
+            self.dropped += 1
+        self.queue.append((key, text))
+        self.ready.set()
+        return True
+
+    async def send(self, data):
+        """Send text or bytes now, after any send already in progress"""
+        async with self.lock:
+            if isinstance(data, bytes):
+                await self.websocket.send_bytes(data)
+            else:
+                await self.websocket.send_text(data)
+
+    async def _write(self):
+        while not self.closed:
+            await self.ready.wait()
+            while self.queue:
+                _, text = self.queue.popleft()
+                try:
+                    async with self.lock:
+                        if self.closed:
+                            return
+                        await self.websocket.send_text(text)
+                except Exception as e:
+                    print(f"Broadcast send failed, dropping client: {e}")
+                    self.closed = True
+                    self.queue.clear()
+                    return
+                self.sent += 1
+            self.ready.clear()
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        if self.lock.locked():
+            # Cancelling mid-send could cut a frame short, the writer stops once the send is done
+            self.ready.set()
+        else:
+            self.writer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': len(self.queue),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue: int = settings.BROADCAST_QUEUE_SIZE):
         self.active_connections: List[WebSocket] = []
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        self.max_queue = max_queue
+        self.messages_broadcast = 0
+        self.bytes_serialized = 0
+        self.slow_disconnects = 0
+        # Counters of channels already gone, so totals survive disconnects
+        self._closed_totals = {'sent': 0, 'coalesced': 0, 'dropped': 0}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        self.channels[websocket] = ClientChannel(websocket, self.max_queue)
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        channel = self.channels.pop(websocket, None)
+        if channel is not None:
+            channel.close()
+            for key in self._closed_totals:
+                self._closed_totals[key] += getattr(channel, key)
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        await websocket.send_json(message)
+        await self._send(websocket, json.dumps(message, separators=(",", ":"), ensure_ascii=False))
+
+    async def send_bytes(self, data: bytes, websocket: WebSocket):
+        await self._send(websocket, data)
+
+    async def _send(self, websocket: WebSocket, data):
+        """Send to one client without interleaving with its broadcast writer"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            if isinstance(data, bytes):
+                await websocket.send_bytes(data)
+            else:
+                await websocket.send_text(data)
+        else:
+            await channel.send(data)
+
+    async def close(self, websocket: WebSocket, code: int = 1000):
+        """Disconnect a client and close its socket once a send in progress is done"""
+        channel = self.channels.get(websocket)
+        self.disconnect(websocket)
+        await self._close(websocket, code, channel.lock if channel is not None else asyncio.Lock())
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
\ No newline at end of file
+        """Serialize once and queue the same text for every client, never waits on a socket"""
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        self.messages_broadcast += 1
+        self.bytes_serialized += len(text)
+        message_type = message.get('type')
+        key = message_type if message_type in COALESCED_TYPES else None
+
+        for websocket, channel in list(self.channels.items()):
+            if channel.closed:
+                self.disconnect(websocket)
+            elif not channel.push(key, text):
+                print("Client too slow for broadcast events, closing its connection")
+                self.slow_disconnects += 1
+                self.disconnect(websocket)
+                asyncio.create_task(self._close(websocket, SLOW_CONSUMER_CLOSE_CODE, channel.lock))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int, lock: asyncio.Lock):
+        try:
+            async with lock:
+                await websocket.close(code=code)
+        except Exception as e:
+            print(f"Closing client failed: {e}")
+
+    def stats(self) -> dict:
+        """Queue depth and drop counters, totals include disconnected clients"""
+        clients = [channel.stats() for channel in self.channels.values()]
+        totals = dict(self._closed_totals)
+        for client in clients:
+            for key in totals:
+                totals[key] += client[key]
+        depths = [client['queue_depth'] for client in clients]
+        return {
+            'clients': len(clients),
+            'max_queue': self.max_queue,
+            'messages_broadcast': self.messages_broadcast,
+            'bytes_serialized': self.bytes_serialized,
+            'slow_disconnects': self.slow_disconnects,
+            'queue_depth_total': sum(depths),
+            'queue_depth_max': max(depths, default=0),
+            **totals,
+            'per_client': clients
+        }
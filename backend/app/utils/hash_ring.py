@@ -0,0 +1,56 @@
+import hashlib
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, spreads consecutive entity IDs evenly over the ring"""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class HashRing:
+    """
+    Consistent hashing of entity IDs onto nodes.
+
+    Each node owns `vnodes` points on a 64-bit ring and an entity belongs to
+    the node of the first point at or after its hash. Adding or removing a
+    node only moves the entities next to that node's points, about 1/n of
+    them, and every node computes the same owners from the same node list.
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 64):
+        if not nodes:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes: List[str] = sorted(set(nodes))
+        self.vnodes = vnodes
+        points = []
+        owners = []
+        for index, node in enumerate(self.nodes):
+            for replica in range(vnodes):
+                digest = hashlib.blake2b(f"{node}#{replica}".encode(), digest_size=8).digest()
+                points.append(int.from_bytes(digest, "little"))
+                owners.append(index)
+        order = np.argsort(np.array(points, dtype=np.uint64), kind="stable")
+        self.points = np.array(points, dtype=np.uint64)[order]
+        self.point_owners = np.array(owners, dtype=np.int64)[order]
+
+    def owner_indices(self, entity_ids) -> np.ndarray:
+        """Index into self.nodes of each entity's owner"""
+        hashes = _mix(np.asarray(entity_ids, dtype=np.int64))
+        positions = np.searchsorted(self.points, hashes, side="left") % len(self.points)
+        return self.point_owners[positions]
+
+    def owner(self, entity_id: int) -> str:
+        return self.nodes[int(self.owner_indices([entity_id])[0])]
+
+    def partition(self, entity_ids) -> Dict[str, np.ndarray]:
+        """Row positions of the given entities, grouped by owning node"""
+        owners = self.owner_indices(entity_ids)
+        return {
+            self.nodes[index]: np.flatnonzero(owners == index)
+            for index in np.unique(owners)
+        }
@@ -0,0 +1,160 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class Histogram:
+    """Counts of observed values in fixed buckets, each bucket counts values <= its upper bound"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        # One extra bucket for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile, None past the last bound"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets
+        }
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+# Latency buckets in seconds, 100 µs to 10 s
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# A scrape-time sample: label values by name, and the value
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class HistogramFamily:
+    """One Histogram per combination of label values, rendered as a Prometheus histogram"""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = list(labels)
+        self.buckets = sorted(buckets)
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, value: float, *values: str):
+        self.labels(*values).observe(value)
+
+    @contextmanager
+    def time(self, *values: str) -> Iterator[None]:
+        """Observe the seconds spent in the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.labels(*values).observe(time.perf_counter() - started)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, histogram in sorted(self.children.items()):
+            labels = dict(zip(self.label_names, values))
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': repr(float(bound))})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in the Prometheus text exposition format.
+
+    Latencies are histograms updated where the work happens. Gauges and
+    counters are read from their owners by callbacks at scrape time, so
+    keeping them current costs nothing between scrapes.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, HistogramFamily] = {}
+        # name -> (type, help, collect) for values read at scrape time
+        self.collected: Dict[str, Tuple[str, str, Callable[[], List[Sample]]]] = {}
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> HistogramFamily:
+        """Get or create a histogram family"""
+        family = self.histograms.get(name)
+        if family is None:
+            family = self.histograms[name] = HistogramFamily(name, help, labels, buckets)
+        return family
+
+    def gauge(self, name: str, help: str, collect: Callable[[], List[Sample]]):
+        """Register a gauge whose samples come from collect() at scrape time"""
+        self.collected[name] = ("gauge", help, collect)
+
+    def counter(self, name: str, help: str, collect: Callable[[], List[Sample]]):
+        """Register a counter kept by its owner, read through collect() at scrape time"""
+        self.collected[name] = ("counter", help, collect)
+
+    def render(self) -> str:
+        lines = []
+        for family in self.histograms.values():
+            lines += family.render()
+        for name, (kind, help, collect) in self.collected.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every service and route in the process
+metrics = MetricsRegistry()
@@ -0,0 +1,121 @@
+import json
+import os
+import struct
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Single-file snapshot layout:
+#   magic (8 bytes) | header length (uint64, little endian) | JSON header
+#   | padding to ALIGNMENT | data sections, each starting on an ALIGNMENT boundary
+SNAPSHOT_MAGIC = b"EVSNAP01"
+SNAPSHOT_EXTENSION = ".evsnap"
+ALIGNMENT = 64
+COMPRESSIONS = (None, "zlib")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(header: dict, arrays: Dict[str, np.ndarray], compression: Optional[str]) -> Tuple[bytes, int, List[Tuple[int, object]], int]:
+    """Encode the header and place each array: (header bytes, data start, [(offset, payload)], total size)"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown snapshot compression '{compression}'")
+
+    sections = {}
+    payloads = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        payload = memoryview(array).cast("B") if array.size else b""
+        if compression == "zlib":
+            payload = zlib.compress(payload, level=1)
+        sections[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+            "nbytes": len(payload),
+            "raw_nbytes": array.nbytes
+        }
+        payloads.append((offset, payload))
+        offset = _align(offset + len(payload))
+
+    header_bytes = json.dumps({**header, "compression": compression, "sections": sections}).encode()
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+    return header_bytes, data_start, payloads, data_start + offset
+
+
+def write_snapshot(path: str, header: dict, arrays: Dict[str, np.ndarray], compression: Optional[str] = None) -> int:
+    """
+    Write a header and named arrays into one file, returns bytes written.
+    Uncompressed arrays are written straight from their buffers; the file
+    is written to a temp path and renamed so readers never see a partial save.
+    """
+    header_bytes, data_start, payloads, size = _layout(header, arrays, compression)
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for section_offset, payload in payloads:
+            f.seek(data_start + section_offset)
+            f.write(payload)
+        f.truncate(size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return size
+
+
+def pack_snapshot(header: dict, arrays: Dict[str, np.ndarray], compression: Optional[str] = None) -> bytes:
+    """Same layout as write_snapshot, built in memory"""
+    header_bytes, data_start, payloads, size = _layout(header, arrays, compression)
+    buffer = bytearray(size)
+    buffer[:len(SNAPSHOT_MAGIC)] = SNAPSHOT_MAGIC
+    buffer[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 8] = struct.pack("<Q", len(header_bytes))
+    buffer[len(SNAPSHOT_MAGIC) + 8:len(SNAPSHOT_MAGIC) + 8 + len(header_bytes)] = header_bytes
+    for section_offset, payload in payloads:
+        start = data_start + section_offset
+        buffer[start:start + len(payload)] = payload
+    return bytes(buffer)
+
+
+def _parse(buffer) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Header and array views over a uint8 buffer holding a whole snapshot"""
+    if bytes(buffer[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+        raise ValueError("Not a world snapshot")
+    (header_length,) = struct.unpack("<Q", bytes(buffer[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + 8]))
+    header = json.loads(bytes(buffer[len(SNAPSHOT_MAGIC) + 8:len(SNAPSHOT_MAGIC) + 8 + header_length]))
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + header_length)
+
+    arrays = {}
+    for name, section in header["sections"].items():
+        dtype = np.dtype(section["dtype"])
+        if section["raw_nbytes"] == 0:
+            arrays[name] = np.zeros(section["shape"], dtype=dtype)
+            continue
+        start = data_start + section["offset"]
+        raw = buffer[start:start + section["nbytes"]]
+        if header["compression"] == "zlib":
+            raw = np.frombuffer(bytearray(zlib.decompress(raw)), dtype=np.uint8)
+        arrays[name] = raw.view(dtype).reshape(section["shape"])
+    return header, arrays
+
+
+def read_snapshot(path: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Read a snapshot written by write_snapshot.
+    Uncompressed arrays are copy-on-write views into a memory map of the
+    file, so nothing is copied until an array is modified.
+    """
+    try:
+        return _parse(np.memmap(path, dtype=np.uint8, mode="c"))
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}")
+
+
+def unpack_snapshot(data: bytes) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Read a snapshot built by pack_snapshot; arrays are writable copies"""
+    return _parse(np.frombuffer(bytearray(data), dtype=np.uint8))
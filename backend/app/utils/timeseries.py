@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+class RingBuffer:
+    """Fixed-size ring buffer of float rows, oldest rows are overwritten"""
+
+    def __init__(self, capacity: int, width: int):
+        self.data = np.zeros((capacity, width))
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+
+    def append(self, row: Sequence[float]):
+        end = (self.start + self.size) % self.capacity
+        self.data[end] = row
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def values(self) -> np.ndarray:
+        """Rows in insertion order, oldest first"""
+        index = (self.start + np.arange(self.size)) % self.capacity
+        return self.data[index]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
+class MultiResolutionSeries:
+    """
+    Time series kept at several resolutions in fixed memory.
+
+    Level 0 stores every sample, level k stores the mean of each block of
+    factor**k consecutive samples. Every level is a ring buffer of the same
+    capacity, so memory and read cost stay constant however long the run is,
+    while coarser levels cover a proportionally longer history.
+    """
+
+    def __init__(self, fields: List[str], capacity: int = 512, factor: int = 10, levels: int = 3):
+        self.fields = fields
+        self.factor = factor
+        self.levels = [RingBuffer(capacity, len(fields)) for _ in range(levels)]
+        # Running block sums feeding each coarser level
+        self._sums = np.zeros((levels, len(fields)))
+        self._counts = np.zeros(levels, dtype=np.int64)
+
+    def append(self, **values: float):
+        row = np.array([values.get(field, 0.0) for field in self.fields], dtype=float)
+        self.levels[0].append(row)
+        for level in range(1, len(self.levels)):
+            self._sums[level] += row
+            self._counts[level] += 1
+            if self._counts[level] < self.factor:
+                break
+            # Block complete: its mean becomes one sample of this level
+            row = self._sums[level] / self._counts[level]
+            self.levels[level].append(row)
+            self._sums[level] = 0.0
+            self._counts[level] = 0
+
+    def series(self, level: int = 0) -> Dict[str, list]:
+        """Columns of one resolution level, oldest first"""
+        values = self.levels[level].values()
+        return {field: values[:, index].tolist() for index, field in enumerate(self.fields)}
+
+    def clear(self):
+        for buffer in self.levels:
+            buffer.clear()
+        self._sums[:] = 0.0
+        self._counts[:] = 0
@@ -0,0 +1,58 @@
+"""
+Decisions per second of brain inference, in-process vs sharded over worker
+processes. Run from backend/:
+
+    python -m benchmarks.inference_scaling --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+import torch
+from app.core.brain_bank import BrainBank
+from app.core.brain_shards import ShardedInference
+from app.core.neural_network import EntityBrain
+
+
+def measure(forward, rounds: int) -> float:
+    """Mean seconds per call, after one warm-up call"""
+    forward()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        forward()
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[64, 5000], help="Rows per decide call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"CPU cores: {os.cpu_count()}, torch threads in-process: {torch.get_num_threads()}")
+    bank = BrainBank(EntityBrain.from_settings(), torch.device("cpu"), capacity=args.entities)
+    bank.training = False
+    entity_ids = list(range(args.entities))
+    bank.add_random(entity_ids)
+
+    configs = [("in-process", None)] + [(f"{workers} workers", workers) for workers in args.workers]
+    print(f"{'':<14}" + "".join(f"{f'batch {batch}':>16}" for batch in args.batch))
+    for label, workers in configs:
+        shards = ShardedInference(bank, workers) if workers else None
+        row = f"{label:<14}"
+        for batch in args.batch:
+            ids = entity_ids[:batch]
+            x = torch.rand(len(ids), bank.shapes["fc1.weight"][1])
+            if shards is None:
+                seconds = measure(lambda: bank.forward(bank.slots_for(ids), x), args.rounds)
+            else:
+                seconds = measure(lambda: shards.forward(ids, bank.slots_for(ids), x), args.rounds)
+            row += f"{len(ids) / seconds:>12.0f} d/s"
+        print(row)
+        if shards is not None:
+            shards.close()
+
+
+if __name__ == "__main__":
+    main()
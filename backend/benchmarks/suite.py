@@ -0,0 +1,443 @@
+"""
+Benchmark suite for the backend hot paths, with regression tracking.
+Run from backend/:
+
+    python -m benchmarks.suite run --out results.json
+    python -m benchmarks.suite run --quick --only decisions genetics
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.3
+    python -m benchmarks.suite run --baseline baseline.json
+
+`run` writes one JSON document with the environment and one entry per case
+(seconds per operation as median/mean/p95/min, and operations per second).
+`compare` matches cases by name and flags any whose median got slower than
+the baseline by more than the threshold, exiting with status 1 if there is
+one. Runs with --baseline do both.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+import numpy as np
+import torch
+from app.config import settings
+
+# Population sizes for the decision cases, full and --quick
+POPULATIONS = [100, 500, 1000, 5000]
+QUICK_POPULATIONS = [100, 1000]
+# World sizes (entities, each with a brain) for save/load
+WORLD_SIZES = [1000, 5000]
+QUICK_WORLD_SIZES = [1000]
+# Median slowdown flagged as a regression; timings on a busy machine easily move 10%
+DEFAULT_THRESHOLD = 0.20
+
+
+def summarize(durations: List[float], ops_per_call: int = 1) -> dict:
+    """Per-operation timings of a list of call durations"""
+    per_op = np.asarray(durations) / ops_per_call
+    median = float(np.median(per_op))
+    return {
+        'samples': len(durations),
+        'ops_per_call': ops_per_call,
+        'median_s': median,
+        'mean_s': float(per_op.mean()),
+        'p95_s': float(np.percentile(per_op, 95)),
+        'min_s': float(per_op.min()),
+        'ops_per_s': 1.0 / median if median > 0 else 0.0
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 2, ops_per_call: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations, ops_per_call)
+
+
+async def measure_async(fn: Callable[[], Awaitable[object]], repeat: int, warmup: int = 2,
+                        ops_per_call: int = 1) -> dict:
+    for _ in range(warmup):
+        await fn()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations, ops_per_call)
+
+
+def random_inputs(count: int) -> np.ndarray:
+    return np.random.random((count, settings.NN_INPUT_SIZE)).astype(np.float32)
+
+
+def random_states(count: int) -> Dict[str, np.ndarray]:
+    """Neighbour states with something nearby for every targeted action"""
+    return {
+        'nearby_food': np.random.randint(1, 5, count),
+        'food_x': np.random.random(count) * 100,
+        'food_y': np.random.random(count) * 100,
+        'nearby_enemies': np.random.randint(0, 3, count),
+        'enemy_x': np.random.random(count) * 100,
+        'enemy_y': np.random.random(count) * 100,
+        'nearby_allies': np.random.randint(0, 3, count),
+        'ally_x': np.random.random(count) * 100,
+        'ally_y': np.random.random(count) * 100
+    }
+
+
+def bench_decisions(quick: bool) -> Dict[str, dict]:
+    """process_decision latency and process_decisions throughput at several populations"""
+    from app.services.brain_service import BrainService
+
+    brain_service = BrainService()
+    cases = {}
+
+    async def run():
+        for population in (QUICK_POPULATIONS if quick else POPULATIONS):
+            entity_ids = list(range(population))
+            brain_service.bank.add_random([entity_id for entity_id in entity_ids if entity_id not in brain_service.bank])
+            inputs = random_inputs(population)
+            states = random_states(population)
+            state_rows = [
+                {key: values[row].item() for key, values in states.items()}
+                for row in range(population)
+            ]
+            picks = iter(np.random.randint(0, population, 10 ** 6).tolist())
+
+            def one():
+                row = next(picks)
+                return brain_service.process_decision(entity_ids[row], inputs[row].tolist(), state_rows[row])
+
+            cases[f"decisions.process_decision[population={population}]"] = await measure_async(
+                one, repeat=50 if quick else 200
+            )
+            cases[f"decisions.process_decisions[population={population}]"] = await measure_async(
+                lambda: brain_service.process_decisions(entity_ids, inputs, states),
+                repeat=5 if quick else 20,
+                ops_per_call=population
+            )
+
+    asyncio.run(run())
+    brain_service.close()
+    return cases
+
+
+def bench_genetics(quick: bool) -> Dict[str, dict]:
+    """EntityBrain crossover/mutate and BrainService reproduce, single and batched"""
+    from app.core.neural_network import EntityBrain
+    from app.services.brain_service import BrainService
+
+    cases = {}
+    parent1 = EntityBrain.from_settings()
+    parent2 = EntityBrain.from_settings()
+    repeat = 20 if quick else 100
+    cases["genetics.EntityBrain.crossover"] = measure(lambda: EntityBrain.crossover(parent1, parent2), repeat)
+    cases["genetics.EntityBrain.mutate"] = measure(lambda: parent1.mutate(settings.MUTATION_RATE), repeat)
+
+    brain_service = BrainService()
+    parents = 1000
+    brain_service.bank.add_random(list(range(parents)))
+    next_child = iter(range(parents, 10 ** 7))
+
+    def pairs(count: int):
+        return np.random.randint(0, parents, count).tolist(), np.random.randint(0, parents, count).tolist()
+
+    async def run():
+        async def reproduce():
+            parent1_ids, parent2_ids = pairs(1)
+            child_id = next(next_child)
+            await brain_service.reproduce(parent1_ids[0], parent2_ids[0], child_id)
+            brain_service.remove_brain(child_id)
+
+        cases["genetics.reproduce"] = await measure_async(reproduce, repeat)
+
+        batch = 500
+
+        async def reproduce_batch():
+            parent1_ids, parent2_ids = pairs(batch)
+            child_ids = [next(next_child) for _ in range(batch)]
+            await brain_service.reproduce_batch(parent1_ids, parent2_ids, child_ids)
+            for child_id in child_ids:
+                brain_service.remove_brain(child_id)
+
+        cases[f"genetics.reproduce_batch[children={batch}]"] = await measure_async(
+            reproduce_batch, repeat=5 if quick else 20, ops_per_call=batch
+        )
+
+    asyncio.run(run())
+    brain_service.close()
+    return cases
+
+
+def bench_world(quick: bool) -> Dict[str, dict]:
+    """WorldService.save_world/load_world of whole worlds"""
+    from app.services.brain_service import BrainService
+    from app.services.entity_service import GENE_NAMES, EntityService
+    from app.services.world_service import WorldService
+
+    cases = {}
+
+    async def run():
+        for size in (QUICK_WORLD_SIZES if quick else WORLD_SIZES):
+            entity_service = EntityService()
+            brain_service = BrainService()
+            world_service = WorldService(brain_service, entity_service)
+            entity_ids = np.arange(size)
+            entity_service.load_columns(entity_ids, {
+                'x': np.random.random(size) * 1600 - 800,
+                'y': np.random.random(size) * 1200 - 600,
+                'energy': np.random.random(size) * 100,
+                'age': np.random.random(size) * 200,
+                'society': np.random.randint(0, 3, size),
+                'genes': np.random.random((size, len(GENE_NAMES))).astype(np.float32)
+            }, entity_service.society_names)
+            brain_service.bank.add_random(entity_ids.tolist())
+            world_state = {'tick': 0, 'entities': size}
+            filename = f"bench_{size}"
+
+            async def save():
+                if await world_service.save_world(world_state, filename) is None:
+                    raise RuntimeError("save_world failed")
+
+            async def load():
+                if await world_service.load_world(world_service.last_save_stats['filename']) is None:
+                    raise RuntimeError("load_world failed")
+
+            repeat = 3 if quick else 10
+            cases[f"world.save_world[entities={size}]"] = await measure_async(save, repeat, warmup=1)
+            cases[f"world.load_world[entities={size}]"] = await measure_async(load, repeat, warmup=1)
+            brain_service.close()
+
+    # save/load report every call on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run())
+    return cases
+
+
+def bench_websocket(quick: bool) -> Dict[str, dict]:
+    """End-to-end /ws round trips through the FastAPI TestClient"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.utils.binary_protocol import encode_decision_request
+
+    cases = {}
+    repeat = 50 if quick else 200
+    batch = 1000
+    inputs = random_inputs(batch)
+    states = random_states(batch)
+    entity_ids = list(range(batch))
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            single = {
+                'type': 'entity_decision',
+                'id': 0,
+                'inputs': inputs[0].tolist(),
+                'state': {key: values[0].item() for key, values in states.items()}
+            }
+
+            def decision():
+                websocket.send_json(single)
+                websocket.receive_json()
+
+            cases["websocket.entity_decision"] = measure(decision, repeat)
+
+            batch_message = {
+                'type': 'entity_decisions_batch',
+                'ids': entity_ids,
+                'inputs': inputs.tolist(),
+                'states': [
+                    {key: values[row].item() for key, values in states.items()}
+                    for row in range(batch)
+                ]
+            }
+
+            def decisions_batch():
+                websocket.send_json(batch_message)
+                websocket.receive_json()
+
+            cases[f"websocket.entity_decisions_batch[entities={batch}]"] = measure(
+                decisions_batch, repeat=max(5, repeat // 10), ops_per_call=batch
+            )
+
+        with client.websocket_connect("/ws?protocol=binary") as websocket:
+            websocket.receive_json()
+            frame = encode_decision_request(entity_ids, inputs, states)
+
+            def binary_batch():
+                websocket.send_bytes(frame)
+                websocket.receive_bytes()
+
+            cases[f"websocket.binary_decisions[entities={batch}]"] = measure(
+                binary_batch, repeat=max(5, repeat // 10), ops_per_call=batch
+            )
+    return cases
+
+
+def bench_rest(quick: bool) -> Dict[str, dict]:
+    """Requests per second of the REST decision routes through the FastAPI TestClient"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    cases = {}
+    repeat = 100 if quick else 500
+    batch = 1000
+    inputs = random_inputs(batch)
+    states = random_states(batch)
+    state_rows = [{key: values[row].item() for key, values in states.items()} for row in range(batch)]
+
+    with TestClient(app) as client:
+        # Brains load in the background after startup
+        while client.get("/health").json().get("brains") != "ready":
+            time.sleep(0.05)
+        # A full entity state, as REST clients used to be required to send
+        single = {
+            'id': 0,
+            'inputs': inputs[0].tolist(),
+            'state': {
+                'id': 0, 'generation': 1, 'society_name': 'Warriors', 'x': 10.0, 'y': 20.0,
+                'genes': {}, 'energy': 80.0, **state_rows[0]
+            }
+        }
+
+        def decision():
+            client.post("/api/entities/decision", json=single).raise_for_status()
+
+        cases["rest.decision"] = measure(decision, repeat)
+
+        batch_body = {'ids': list(range(batch)), 'inputs': inputs.tolist(), 'states': state_rows}
+
+        def decisions_batch():
+            client.post("/api/entities/decisions", json=batch_body).raise_for_status()
+
+        cases[f"rest.decisions[entities={batch}]"] = measure(decisions_batch, repeat=max(5, repeat // 10))
+    return cases
+
+
+BENCHMARKS = {
+    'decisions': bench_decisions,
+    'genetics': bench_genetics,
+    'world': bench_world,
+    'websocket': bench_websocket,
+    'rest': bench_rest
+}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'numpy': np.__version__,
+        'brain_storage_dtype': settings.BRAIN_STORAGE_DTYPE,
+        'nn_hidden_size': settings.NN_HIDDEN_SIZE,
+        'nn_hidden_layers': settings.NN_HIDDEN_LAYERS
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print a comparison table, returns True if any case regressed"""
+    regressed = False
+    base_cases = baseline['cases']
+    current_cases = current['cases']
+    print(f"{'case':<58}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, case in current_cases.items():
+        base = base_cases.get(name)
+        if base is None:
+            print(f"{name:<58}{'-':>12}{case['median_s'] * 1000:>10.3f}ms{'new':>9}")
+            continue
+        ratio = case['median_s'] / base['median_s'] if base['median_s'] > 0 else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<58}{base['median_s'] * 1000:>10.3f}ms{case['median_s'] * 1000:>10.3f}ms"
+              f"{(ratio - 1) * 100:>+8.1f}%{flag}")
+    for name in base_cases.keys() - current_cases.keys():
+        print(f"{name:<58}  missing from the current run")
+    return regressed
+
+
+def run(names: List[str], quick: bool) -> dict:
+    results = {'environment': environment(), 'quick': quick, 'cases': {}}
+    for name in names:
+        started = time.perf_counter()
+        cases = BENCHMARKS[name](quick)
+        results['cases'].update(cases)
+        print(f"{name}: {len(cases)} cases in {time.perf_counter() - started:.1f}s")
+        for case, stats in cases.items():
+            print(f"  {case:<56}{stats['median_s'] * 1000:>10.3f} ms/op {stats['ops_per_s']:>12.0f} op/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks and write results")
+    run_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    run_parser.add_argument("--quick", action="store_true", help="Fewer sizes and samples")
+    run_parser.add_argument("--out", default=os.path.join(
+        settings.DATA_DIR, "benchmarks", f"results_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    ))
+    run_parser.add_argument("--baseline", help="Results file to compare against after the run")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Slowdown ratio flagged as a regression")
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Slowdown ratio flagged as a regression")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    # Worlds and spilled brains written by the benchmarks go to a scratch directory
+    with tempfile.TemporaryDirectory(prefix="benchmarks_") as scratch:
+        settings.WORLD_STATES_DIR = os.path.join(scratch, "world_states")
+        settings.NEURAL_MODELS_DIR = os.path.join(scratch, "neural_models")
+        settings.CHECKPOINTS_DIR = os.path.join(scratch, "checkpoints")
+        settings.BRAIN_SPILL_DIR = os.path.join(scratch, "brain_spill")
+        settings.AUTOSAVE_INTERVAL = 0
+        results = run(args.only, args.quick)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
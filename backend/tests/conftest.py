@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import pytest
+
+# Settings are read once on import, so point every data directory at a
+# scratch directory before any app module is imported
+DATA_DIR = tempfile.mkdtemp(prefix="evolving-societies-tests-")
+for name, directory in {
+    "DATA_DIR": "",
+    "WORLD_STATES_DIR": "world_states",
+    "NEURAL_MODELS_DIR": "neural_models",
+    "CHECKPOINTS_DIR": "checkpoints",
+    "BRAIN_SPILL_DIR": "brain_spill",
+    "CLUSTER_SOCKET_DIR": "cluster"
+}.items():
+    os.environ[name] = os.path.join(DATA_DIR, directory)
+# Without dropout the same inputs always give the same decisions
+os.environ["BRAIN_EVAL_MODE"] = "true"
+os.environ["AUTOSAVE_INTERVAL"] = "0"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def world(tmp_path, monkeypatch):
+    """WorldService saving under tmp_path, see tests/worlds.py"""
+    from app.config import settings
+    from tests.worlds import make_world
+    monkeypatch.setattr(settings, "WORLD_STATES_DIR", str(tmp_path / "world_states"))
+    monkeypatch.setattr(settings, "CHECKPOINTS_DIR", str(tmp_path / "checkpoints"))
+    return make_world()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from app.utils.binary_protocol import (
+    HEADER,
+    ProtocolError,
+    STATE_FIELDS,
+    decode_decision_request,
+    decode_decision_result,
+    encode_decision_request,
+    encode_decision_result
+)
+
+
+def make_states(count: int) -> dict:
+    return {field: np.arange(count, dtype=np.float32) + index for index, field in enumerate(STATE_FIELDS)}
+
+
+def test_request_round_trip_with_states():
+    entity_ids = np.array([3, 1, 2], dtype=np.int64)
+    inputs = np.random.rand(3, 20).astype(np.float32)
+    states = make_states(3)
+
+    decoded_ids, decoded_inputs, decoded_states, sequence = decode_decision_request(
+        encode_decision_request(entity_ids, inputs, states, sequence=7)
+    )
+
+    assert decoded_ids.tolist() == [3, 1, 2]
+    np.testing.assert_array_equal(decoded_inputs, inputs)
+    assert list(decoded_states) == list(STATE_FIELDS)
+    for field in STATE_FIELDS:
+        np.testing.assert_array_equal(decoded_states[field], states[field])
+    assert sequence == 7
+
+
+def test_request_round_trip_without_states():
+    _, inputs, states, _ = decode_decision_request(encode_decision_request([5], np.ones(20)))
+    assert inputs.shape == (1, 20)
+    assert states is None
+
+
+def test_empty_request_keeps_its_width():
+    entity_ids, inputs, states, _ = decode_decision_request(
+        encode_decision_request(np.zeros(0, dtype=np.int64), np.zeros((0, 20)), make_states(0))
+    )
+    assert entity_ids.shape == (0,)
+    assert inputs.shape == (0, 20)
+    assert all(column.shape == (0,) for column in states.values())
+
+
+def test_result_round_trip():
+    probabilities = np.random.rand(2, 5).astype(np.float32)
+    frame = encode_decision_result(
+        [10, 11], probabilities, np.array([1, 4]), np.array([1.5, 0.0]), np.array([2.5, 0.0]),
+        np.array([True, False]), sequence=3
+    )
+
+    result = decode_decision_result(frame)
+
+    assert result['entity_ids'].tolist() == [10, 11]
+    np.testing.assert_array_equal(result['action_probabilities'], probabilities)
+    assert result['action_index'].tolist() == [1, 4]
+    assert result['target_x'].tolist() == [1.5, 0.0]
+    assert result['has_target'].tolist() == [1, 0]
+    assert result['sequence'] == 3
+
+
+@pytest.mark.parametrize("change", [
+    lambda frame: frame[:-1],
+    lambda frame: frame + b"\0",
+    lambda frame: frame[:HEADER.size - 1]
+])
+def test_request_length_errors(change):
+    frame = encode_decision_request([1, 2], np.zeros((2, 20)), make_states(2))
+    with pytest.raises(ProtocolError):
+        decode_decision_request(change(frame))
+
+
+def test_result_length_errors():
+    frame = encode_decision_result([1], np.zeros((1, 5)), [0], [0.0], [0.0], [False])
+    with pytest.raises(ProtocolError):
+        decode_decision_result(frame[:-1])
+    with pytest.raises(ProtocolError):
+        decode_decision_result(frame + b"\0")
+
+
+def test_wrong_frame_kind_and_magic():
+    request = encode_decision_request([1], np.zeros((1, 20)))
+    with pytest.raises(ProtocolError):
+        decode_decision_result(request)
+    with pytest.raises(ProtocolError):
+        decode_decision_request(b"XX" + request[2:])
@@ -0,0 +1,124 @@
+import pytest
+import torch
+from app.core.brain_bank import BrainBank, precision_drift_report
+from app.core.genetics import GeneticsEngine
+from app.core.neural_network import EntityBrain
+from app.core.quantization import dequantize_per_channel, quantize_per_channel
+
+
+def make_bank(**kwargs) -> BrainBank:
+    bank = BrainBank(EntityBrain.from_settings(), torch.device("cpu"), **kwargs)
+    bank.training = False
+    return bank
+
+
+def assert_forward_matches_brains(bank: BrainBank, entity_ids):
+    """The batched forward pass gives each entity what its own EntityBrain gives"""
+    inputs = torch.rand(len(entity_ids), bank.brain_kwargs['input_size'])
+    batched = bank.forward(bank.slots_for(entity_ids), inputs)
+    for row, entity_id in enumerate(entity_ids):
+        brain = bank.get_brain(entity_id).eval()
+        with torch.no_grad():
+            expected = brain(inputs[row:row + 1])
+        torch.testing.assert_close(batched[row:row + 1], expected, rtol=1e-5, atol=1e-6)
+
+
+def test_forward_matches_brains_after_remove_and_growth():
+    torch.manual_seed(0)
+    bank = make_bank(capacity=4)
+    bank.add_random([1, 2, 3, 4])
+    assert_forward_matches_brains(bank, [1, 2, 3, 4])
+
+    freed = bank.slots[2]
+    assert bank.remove(2)
+    assert 2 not in bank
+    bank.add_random([5])
+    assert bank.slots[5] == freed
+    assert bank.capacity == 4
+    assert_forward_matches_brains(bank, [5, 1, 4, 3])
+
+    bank.add_random([6, 7, 8])
+    assert bank.capacity == 8
+    assert sorted(bank.slots.values()) == list(range(7))
+    # Out of slot order and with a repeat, so the index path runs as well as the slice one
+    assert_forward_matches_brains(bank, [8, 1, 5, 7, 3, 6, 4, 1])
+    assert_forward_matches_brains(bank, sorted(bank.slots, key=bank.slots.get))
+
+
+@pytest.mark.parametrize("storage_dtype, max_error", [("float16", 1e-3), ("bfloat16", 1e-2), ("int8", 1e-2)])
+@pytest.mark.parametrize("lowp_matmul", [False, True])
+def test_precision_drift_is_bounded(storage_dtype, max_error, lowp_matmul):
+    report = precision_drift_report(storage_dtype, lowp_matmul=lowp_matmul)
+    assert report['max_abs_error'] < max_error
+    assert report['mean_abs_error'] < max_error / 4
+    assert report['argmax_agreement'] >= 0.98
+    assert report['compression_ratio'] > 1.5
+
+
+@pytest.mark.parametrize("mutation_rate", [0.0, 1.0])
+def test_int8_reproduction_round_trips_through_quantization(mutation_rate):
+    torch.manual_seed(1)
+    bank = make_bank(capacity=8, storage_dtype='int8')
+    bank.add_random([1, 2, 3, 4])
+    genetics = GeneticsEngine(bank.shapes, bank.device)
+    parents1 = {name: tensor.clone() for name, tensor in bank.read_stacked([1, 2]).items()}
+    parents2 = {name: tensor.clone() for name, tensor in bank.read_stacked([3, 4]).items()}
+    children = genetics.reproduce(parents1, parents2, mutation_rate=mutation_rate, mutation_strength=0.05, seed=3)
+    bank.put_many([5, 6], children)
+
+    stored = bank.read_stacked([5, 6])
+    for name, weights in children.items():
+        if name not in bank.scales:
+            assert bank.params[name].dtype == torch.float32
+            assert torch.equal(stored[name], weights), name
+            continue
+        assert bank.params[name].dtype == torch.int8
+        # Exactly one quantization step from the float32 children
+        quantized, scale = quantize_per_channel(weights)
+        assert torch.equal(stored[name], dequantize_per_channel(quantized, scale)), name
+        assert ((stored[name] - weights).abs() <= scale.unsqueeze(-1) / 2 + 1e-7).all(), name
+        if mutation_rate == 0.0:
+            # Crossover alone only picks weights the parents already had
+            assert ((weights == parents1[name]) | (weights == parents2[name])).all(), name
+
+
+def test_hot_set_spills_faults_in_and_stays_bounded(tmp_path):
+    torch.manual_seed(2)
+    bank = make_bank(capacity=4, max_resident=4, spill_dir=str(tmp_path))
+    bank.add_random([1, 2, 3, 4])
+    weights = {entity_id: state_dict for entity_id, state_dict in bank.items()}
+
+    # Room for two more means spilling the two least recently used
+    bank.add_random([5, 6])
+    weights.update({entity_id: bank.state_dict(entity_id) for entity_id in (5, 6)})
+    stats = bank.cache_stats()
+    assert (stats['resident'], stats['spilled'], stats['evictions']) == (4, 2, 2)
+    assert set(bank.slots) == {3, 4, 5, 6} and len(bank) == 6
+
+    hits = bank.hits
+    bank.slots_for([3, 1])
+    stats = bank.cache_stats()
+    assert (stats['hits'] - hits, stats['misses'], stats['evictions']) == (1, 1, 3)
+    assert 1 in bank.slots and 4 not in bank.slots
+
+    # Larger than the hot set: served whole, then trimmed back to the bound
+    everything = [1, 2, 3, 4, 5, 6]
+    stacked = bank.read_stacked(everything)
+    stats = bank.cache_stats()
+    assert (stats['hits'] - hits, stats['misses'], stats['evictions']) == (5, 3, 5)
+    assert (stats['resident'], bank.capacity) == (4, 4)
+    for row, entity_id in enumerate(everything):
+        for name, tensor in weights[entity_id].items():
+            assert torch.equal(stacked[name][row], tensor), (entity_id, name)
+
+    inputs = torch.rand(len(everything), bank.brain_kwargs['input_size'])
+    batched = bank.forward(bank.slots_for(everything), inputs)
+    assert bank.cache_stats()['resident'] == 6
+    bank.trim()
+    stats = bank.cache_stats()
+    assert (stats['resident'], stats['spilled'], bank.capacity) == (4, 2, 4)
+    for row, entity_id in enumerate(everything):
+        brain = bank.get_brain(entity_id).eval()
+        with torch.no_grad():
+            torch.testing.assert_close(batched[row:row + 1], brain(inputs[row:row + 1]), rtol=1e-5, atol=1e-6)
+        assert bank.cache_stats()['resident'] <= 4
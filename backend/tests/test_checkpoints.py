@@ -0,0 +1,61 @@
+import asyncio
+from app.config import settings
+from app.utils.checkpoints import CheckpointStore
+from tests.worlds import assert_same_brains, brains_of, entities_of, scramble
+
+
+def test_checkpoint_round_trip_only_writes_changed_brains(world):
+    brains = brains_of(world)
+    entities = entities_of(world)
+
+    first = asyncio.run(world.save_checkpoint({'tick': 1}, "first"))
+    assert first["brains_written"] == 3
+    assert asyncio.run(world.save_checkpoint({'tick': 2}, "second"))["brains_written"] == 0
+
+    world.brain_service.bank.put(1, brains[2])
+    assert asyncio.run(world.save_checkpoint({'tick': 3}, "third"))["brains_written"] == 1
+    scramble(world)
+
+    assert asyncio.run(world.load_checkpoint("first")) == {'tick': 1}
+    assert entities_of(world) == entities
+    assert_same_brains(brains_of(world), brains)
+
+
+def test_pruning_keeps_every_chunk_a_checkpoint_needs(world, monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_RETENTION", 2)
+    bank = world.brain_service.bank
+    for tick in range(4):
+        bank.add_random([10 + tick])
+        asyncio.run(world.save_checkpoint({'tick': tick}))
+
+    store = world.checkpoints
+    kept = store.list_checkpoints()
+    assert len(kept) == 2
+    # Nothing is left for a full sweep to find
+    assert store.collect_garbage()["chunks_removed"] == 0
+
+    scramble(world)
+    assert asyncio.run(world.load_checkpoint(kept[0])) == {'tick': 2}
+    assert len(world.brain_service.bank) == 6
+
+
+def test_store_counts_references_across_reopening(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+
+    def save(store, name, blobs):
+        digests = [store.put_chunk(blob)[0] for blob in blobs]
+        store.write_manifest(name, {"brains": {"chunks": digests}})
+        return digests
+
+    save(store, "c_1", [b"a", b"shared"])
+    kept = save(store, "c_2", [b"b", b"shared", b"shared"])
+    assert store.prune(1, "c_") == {"checkpoints_removed": 1, "chunks_removed": 1, "bytes_freed": 1}
+    assert store.chunk_digests() == set(kept)
+
+    # Counts are rebuilt from the manifests on disk
+    reopened = CheckpointStore(str(tmp_path))
+    save(reopened, "c_3", [b"c"])
+    assert reopened.prune(1, "c_")["chunks_removed"] == 2
+    reopened.put_chunk(b"orphan")
+    assert reopened.collect_garbage()["chunks_removed"] == 1
+    assert len(reopened.chunk_digests()) == 1
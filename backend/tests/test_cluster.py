@@ -0,0 +1,220 @@
+import asyncio
+import numpy as np
+import pytest
+import torch
+from app.config import settings
+from app.core.evolution import SimulationLoop
+from app.services.brain_service import BrainService
+from app.services.cluster_service import ClusterService
+from app.services.entity_service import EntityService
+from app.services.vision_service import VisionService
+from app.utils.broker import Broker, LocalBroker, UnixSocketBroker
+from app.utils.hash_ring import HashRing
+
+ENTITY_IDS = list(range(1, 601))
+
+
+def test_ring_owners_do_not_depend_on_node_order():
+    ring = HashRing(["a", "b", "c"])
+    assert HashRing(["c", "a", "b"]).owner_indices(ENTITY_IDS).tolist() == ring.owner_indices(ENTITY_IDS).tolist()
+    parts = ring.partition(ENTITY_IDS)
+    assert set(parts) == {"a", "b", "c"}
+    assert sorted(np.concatenate(list(parts.values())).tolist()) == list(range(len(ENTITY_IDS)))
+
+
+def test_adding_a_node_only_moves_entities_to_it():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    owners_before = [before.owner(entity_id) for entity_id in ENTITY_IDS]
+    owners_after = [after.owner(entity_id) for entity_id in ENTITY_IDS]
+    moved = [new for old, new in zip(owners_before, owners_after) if old != new]
+    assert set(moved) == {"d"}
+    # About a quarter, far from a reshuffle of everything
+    assert 0.1 < len(moved) / len(ENTITY_IDS) < 0.4
+
+
+def make_cluster(nodes, broker):
+    return {node: ClusterService(BrainService(), node, nodes, broker) for node in nodes}
+
+
+def decide(node: ClusterService, inputs: np.ndarray):
+    return asyncio.run(node.decide(ENTITY_IDS, inputs, [{}] * len(ENTITY_IDS)))
+
+
+def assert_brains_on_owners(cluster):
+    """Every brain lives on exactly its owner, and none is lost"""
+    held = {}
+    for node_id, node in cluster.items():
+        for entity_id in node.brain_service.bank.entity_ids():
+            assert entity_id not in held, f"{entity_id} on {held[entity_id]} and {node_id}"
+            held[entity_id] = node_id
+    assert sorted(held) == ENTITY_IDS
+    ring = next(iter(cluster.values())).ring
+    assert all(ring.owner(entity_id) == node_id for entity_id, node_id in held.items())
+
+
+def test_decisions_and_brains_survive_membership_changes():
+    broker = LocalBroker()
+    cluster = make_cluster(["a", "b", "c"], broker)
+    inputs = np.random.default_rng(0).random((len(ENTITY_IDS), settings.NN_INPUT_SIZE), dtype=np.float32)
+    expected = decide(cluster["a"], inputs)[4]
+    assert_brains_on_owners(cluster)
+
+    cluster["d"] = ClusterService(BrainService(), "d", ["a", "b", "c", "d"], broker)
+    moved = sum(asyncio.run(node.set_nodes(["a", "b", "c", "d"]))["migrated_out"] for node in cluster.values())
+    assert 0 < moved < len(ENTITY_IDS) / 2
+    assert_brains_on_owners(cluster)
+    for node in cluster.values():
+        np.testing.assert_array_equal(decide(node, inputs)[4], expected)
+
+    asyncio.run(cluster.pop("d").leave())
+    for node in cluster.values():
+        asyncio.run(node.set_nodes(["a", "b", "c"]))
+    assert_brains_on_owners(cluster)
+    np.testing.assert_array_equal(decide(cluster["b"], inputs)[4], expected)
+
+
+class FailingBroker(LocalBroker):
+    async def request(self, node_id: str, message: dict) -> dict:
+        if message['type'] == 'import_brains':
+            raise ConnectionError("unreachable")
+        return await super().request(node_id, message)
+
+
+def test_failed_migration_keeps_ring_and_brains():
+    cluster = make_cluster(["a"], FailingBroker())
+    node = cluster["a"]
+    node.brain_service.bank.add_random(ENTITY_IDS)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(node.set_nodes(["a", "b"]))
+
+    assert node.ring.nodes == ["a"]
+    assert sorted(node.brain_service.bank.entity_ids()) == ENTITY_IDS
+
+
+class CountingBroker(LocalBroker):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def request(self, node_id: str, message: dict) -> dict:
+        self.sent.append((node_id, message['type']))
+        return await super().request(node_id, message)
+
+
+def test_seeded_reproduce_batch_is_batched_per_owner():
+    broker = CountingBroker()
+    cluster = make_cluster(["a", "b", "c"], broker)
+    node = cluster["a"]
+    decide(node, np.zeros((len(ENTITY_IDS), settings.NN_INPUT_SIZE), dtype=np.float32))
+    child_ids = list(range(1001, 1101))
+    parents1 = ENTITY_IDS[:100]
+    parents2 = ENTITY_IDS[100:200]
+
+    def breed() -> dict:
+        broker.sent = []
+        result = asyncio.run(node.reproduce_batch(parents1 + [9999], parents2 + [1], child_ids + [1101], seed=7))
+        assert result['created'] == len(child_ids)
+        assert [child['success'] for child in result['children']] == [True] * len(child_ids) + [False]
+        return {
+            child_id: cluster[node.owner(child_id)].brain_service.bank.state_dict(child_id)
+            for child_id in child_ids
+        }
+
+    first = breed()
+    assert sorted(node_id for node_id, kind in broker.sent if kind == 'reproduce_batch') == ["b", "c"]
+    for child_id in child_ids:
+        assert all(child_id not in other.brain_service.bank for other_id, other in cluster.items()
+                   if other_id != node.owner(child_id))
+
+    asyncio.run(node.remove_brains(child_ids))
+    assert not any(child_id in other.brain_service.bank for other in cluster.values() for child_id in child_ids)
+    second = breed()
+    for child_id, state_dict in first.items():
+        for name, tensor in state_dict.items():
+            assert torch.equal(second[child_id][name], tensor), (child_id, name)
+
+
+def test_simulation_loop_keeps_brains_on_owners():
+    cluster = make_cluster(["a", "b"], LocalBroker())
+    node = cluster["a"]
+    entities = EntityService()
+    for entity_id in ENTITY_IDS:
+        # Every tenth entity starves on the first tick
+        entities.add_entity(entity_id, {
+            'x': float(entity_id), 'y': 0.0, 'energy': 0.01 if entity_id % 10 else 50.0, 'society_name': 'Triangles'
+        })
+    loop = SimulationLoop(entities, node.brain_service, VisionService(), cluster_service=node)
+    asyncio.run(loop.step())
+
+    survivors = [entity_id for entity_id in ENTITY_IDS if entity_id % 10 == 0]
+    assert sorted(entities.get_all_entity_ids()) == survivors
+    for node_id, member in cluster.items():
+        assert sorted(member.brain_service.bank.entity_ids()) == [
+            entity_id for entity_id in survivors if node.owner(entity_id) == node_id
+        ]
+
+
+def test_world_persistence_refused_across_nodes(world):
+    world.cluster_service = make_cluster(["a", "b"], LocalBroker())["a"]
+    assert asyncio.run(world.save_world({}, "split.world")) is None
+    assert asyncio.run(world.save_checkpoint({})) is None
+    assert world.list_checkpoints() == []
+    assert not world.start_autosave(lambda: {}, interval=1)
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+def test_unix_socket_broker_round_trip(tmp_path):
+    async def run():
+        async def echo(message: dict) -> dict:
+            if message['type'] == 'fail':
+                raise ValueError("bad message")
+            return {'type': 'echo', 'size': len(message['payload']), 'payload': message['payload'][::-1]}
+
+        server = UnixSocketBroker(str(tmp_path))
+        server.register("server", echo)
+        await server.start()
+        client = UnixSocketBroker(str(tmp_path))
+        try:
+            replies = await asyncio.gather(*(
+                client.request("server", {'type': 'echo', 'payload': bytes([index]) * 3 + b"\0"})
+                for index in range(5)
+            ))
+            assert [reply['payload'] for reply in replies] == [b"\0" + bytes([index]) * 3 for index in range(5)]
+            assert replies[0]['size'] == 4
+            with pytest.raises(RuntimeError, match="bad message"):
+                await client.request("server", {'type': 'fail'})
+            with pytest.raises(ConnectionError):
+                await client.request("nobody", {'type': 'echo'})
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_nodes_over_unix_sockets_match_one_node(tmp_path):
+    async def run():
+        nodes = {
+            node_id: ClusterService(BrainService(), node_id, ["a", "b"], UnixSocketBroker(str(tmp_path)))
+            for node_id in ("a", "b")
+        }
+        for node in nodes.values():
+            await node.start()
+        try:
+            inputs = np.random.default_rng(1).random((len(ENTITY_IDS), settings.NN_INPUT_SIZE), dtype=np.float32)
+            states = [{}] * len(ENTITY_IDS)
+            from_a = await nodes["a"].decide(ENTITY_IDS, inputs, states)
+            from_b = await nodes["b"].decide(ENTITY_IDS, inputs, states)
+            np.testing.assert_array_equal(from_a[4], from_b[4])
+            assert nodes["a"].forwarded_rows + nodes["a"].served_rows == len(ENTITY_IDS)
+        finally:
+            for node in nodes.values():
+                await node.close()
+
+    asyncio.run(run())
@@ -0,0 +1,106 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from app.core.decision_batcher import DecisionBatcher
+
+
+class FakeBrains:
+    """decide() stand-in recording every batch, failing on negative entity IDs"""
+
+    def __init__(self):
+        self.calls = []
+
+    def decide(self, entity_ids, inputs, states):
+        self.calls.append(list(entity_ids))
+        if any(entity_id < 0 for entity_id in entity_ids):
+            raise ValueError(f"Unknown entities {[entity_id for entity_id in entity_ids if entity_id < 0]}")
+        return np.asarray(entity_ids), inputs.sum(axis=1), states['x']
+
+
+def columns(states, count):
+    return {'x': np.asarray([state.get('x', 0.0) for state in states] if states else np.zeros(count))}
+
+
+def make_batcher(**kwargs):
+    brains = FakeBrains()
+    return brains, DecisionBatcher(brains.decide, columns, **kwargs)
+
+
+def run_together(batcher, requests):
+    async def run():
+        return await asyncio.gather(
+            *(batcher.submit(entity_ids, inputs, states) for entity_ids, inputs, states in requests),
+            return_exceptions=True
+        )
+    return asyncio.run(run())
+
+
+def test_requests_are_grouped_by_input_width():
+    brains, batcher = make_batcher(max_wait=0.05)
+    results = run_together(batcher, [
+        ([1, 2], np.ones((2, 3)), [{'x': 1.0}, {'x': 2.0}]),
+        ([3], np.ones((1, 5)), [{'x': 3.0}]),
+        ([4], np.ones((1, 3)), [{'x': 4.0}])
+    ])
+    assert sorted(brains.calls) == [[1, 2, 4], [3]]
+    assert batcher.requests == 3 and batcher.batches == 2
+    ids, sums, x = results[0]
+    assert ids.tolist() == [1, 2] and sums.tolist() == [3.0, 3.0] and x.tolist() == [1.0, 2.0]
+    assert results[1][1].tolist() == [5.0]
+    assert results[2][0].tolist() == [4] and results[2][2].tolist() == [4.0]
+
+
+def test_a_malformed_request_cannot_fail_the_rest():
+    brains, batcher = make_batcher(max_wait=0.05)
+    results = run_together(batcher, [
+        ([1], np.ones((1, 3)), [{}]),
+        ([-7], np.ones((1, 3)), [{}]),
+        ([2, 3], np.ones((2, 3)), [{}, {}]),
+        ([4], np.ones((1, 2)), [{}])
+    ])
+    assert isinstance(results[1], ValueError) and "-7" in str(results[1])
+    assert results[0][0].tolist() == [1]
+    assert results[2][0].tolist() == [2, 3]
+    assert results[3][0].tolist() == [4]
+    # The shared batch failed once, then each of its requests ran alone
+    assert [1, -7, 2, 3] in brains.calls and [-7] in brains.calls
+
+
+def test_full_batch_flushes_without_waiting():
+    brains, batcher = make_batcher(max_batch_size=4, max_wait=10.0)
+    started = time.perf_counter()
+    results = run_together(batcher, [([1, 2], np.ones((2, 3)), [{}, {}]), ([3, 4], np.ones((2, 3)), [{}, {}])])
+    assert time.perf_counter() - started < 5.0
+    assert brains.calls == [[1, 2, 3, 4]]
+    assert [ids.tolist() for ids, *_ in results] == [[1, 2], [3, 4]]
+
+
+def test_partial_batch_flushes_after_max_wait():
+    brains, batcher = make_batcher(max_batch_size=1000, max_wait=0.05)
+
+    async def run():
+        first = asyncio.ensure_future(batcher.submit([1], np.ones((1, 3)), [{}]))
+        await asyncio.sleep(0.01)
+        # Joins the batch the first request is still waiting to fill
+        second = await batcher.submit([2], np.ones((1, 3)), [{}])
+        return await first, second
+
+    started = time.perf_counter()
+    first, second = asyncio.run(run())
+    assert time.perf_counter() - started >= 0.045
+    assert brains.calls == [[1, 2]]
+    assert first[0].tolist() == [1] and second[0].tolist() == [2]
+
+
+def test_zero_wait_only_merges_queued_requests():
+    brains, batcher = make_batcher(max_wait=0.0)
+
+    async def run():
+        await batcher.submit([1], np.ones((1, 3)), [{}])
+        await batcher.submit([2], np.ones((1, 3)), [{}])
+
+    asyncio.run(run())
+    assert brains.calls == [[1], [2]]
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.submit([-1], np.ones((1, 3)), [{}]))
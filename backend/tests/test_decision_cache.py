@@ -0,0 +1,71 @@
+import asyncio
+import numpy as np
+import pytest
+from app.config import settings
+from app.services.brain_service import BrainService
+
+ENTITY_IDS = [1, 2]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "DECISION_CACHE_SIZE", 64)
+    service = BrainService()
+    service.bank.add_random(ENTITY_IDS)
+    return service
+
+
+def decide(service: BrainService) -> np.ndarray:
+    # The same inputs for both, so equal weights give equal decisions
+    inputs = np.full((len(ENTITY_IDS), settings.NN_INPUT_SIZE), 0.5, dtype=np.float32)
+    return service.decide(ENTITY_IDS, inputs, [{}] * len(ENTITY_IDS))[4]
+
+
+def counts(service: BrainService):
+    stats = service.decision_cache_stats()
+    return stats['hits'], stats['misses']
+
+
+def test_repeated_decisions_hit(service):
+    first = decide(service)
+    assert counts(service) == (0, 2)
+    np.testing.assert_array_equal(decide(service), first)
+    assert counts(service) == (2, 2)
+
+
+@pytest.mark.parametrize("rewrite", ["put", "reproduce", "import_records"])
+def test_writing_a_brain_forces_a_miss(service, rewrite):
+    before = decide(service)
+    bank = service.bank
+    version = bank.versions[1]
+    if rewrite == "put":
+        bank.put(1, bank.state_dict(2))
+    elif rewrite == "reproduce":
+        result = asyncio.run(service.reproduce(2, 2, 1))
+        assert result['success']
+    else:
+        bank.import_records([1], bank.export_records([2]))
+    assert bank.versions[1] != version
+
+    after = decide(service)
+    # Entity 1 missed and runs its new weights, entity 2 is still cached
+    assert counts(service) == (1, 3)
+    np.testing.assert_array_equal(after[1], before[1])
+    if rewrite != "reproduce":
+        np.testing.assert_allclose(after[0], before[1], rtol=1e-6)
+
+
+def test_cache_needs_eval_mode(monkeypatch):
+    monkeypatch.setattr(settings, "DECISION_CACHE_SIZE", 64)
+    monkeypatch.setattr(settings, "BRAIN_EVAL_MODE", False)
+    service = BrainService()
+    assert service.decision_cache is None
+    assert service.bank.training
+    assert service.decision_cache_stats() == {'enabled': False}
+
+
+def test_cache_is_bypassed_while_dropout_is_on(service):
+    decide(service)
+    service.bank.training = True
+    decide(service)
+    assert counts(service) == (0, 2)
@@ -0,0 +1,92 @@
+import asyncio
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.services.brain_service import BrainService
+from app.services.cluster_service import ClusterService
+from app.services.vision_service import VisionService
+from app.utils.binary_protocol import STATE_FIELDS, decode_decision_result, encode_decision_request
+from app.utils.broker import LocalBroker
+
+EMPTY_SHAPES = [(0,), (0,), (0,), (0,), (0, settings.NN_OUTPUT_SIZE)]
+
+
+@pytest.fixture(scope="module")
+def brain_service():
+    return BrainService()
+
+
+def assert_empty(result):
+    assert [values.shape for values in result] == EMPTY_SHAPES
+
+
+def test_empty_batch_decide(brain_service):
+    assert_empty(brain_service.decide([], [], []))
+
+
+def test_empty_batch_decide_batched(brain_service):
+    assert_empty(asyncio.run(brain_service.decide_batched([], [], [])))
+    assert_empty(asyncio.run(brain_service.batcher.submit([], [], [])))
+
+
+def test_empty_batch_across_nodes(brain_service):
+    broker = LocalBroker()
+    node = ClusterService(brain_service, "a", ["a", "b"], broker)
+    ClusterService(BrainService(), "b", ["a", "b"], broker)
+    assert_empty(asyncio.run(node.decide([], [], [])))
+    assert asyncio.run(node.process_decisions([], [], []))['decisions'] == []
+
+
+def test_observe_names_unknown_entities():
+    vision = VisionService()
+    vision.update_entities([1], [0.0], [0.0])
+    assert vision.observe([1])['entity_id'].tolist() == [1]
+    with pytest.raises(ValueError, match=r"\[7, 8\]"):
+        vision.observe([1, 7, 8])
+
+
+@pytest.fixture(scope="module")
+def client():
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+
+def request_frame(entity_ids, states: bool = True) -> bytes:
+    count = len(entity_ids)
+    columns = {field: np.zeros(count) for field in STATE_FIELDS} if states else None
+    return encode_decision_request(np.array(entity_ids, dtype=np.int64), np.zeros((count, settings.NN_INPUT_SIZE)), columns)
+
+
+def test_rest_empty_batch(client):
+    response = client.post('/api/entities/decisions', json={'ids': [], 'inputs': [], 'states': []})
+    assert response.status_code == 200
+    assert response.json() == {'type': 'decisions_batch_result', 'decisions': []}
+
+
+def test_websocket_empty_and_unknown_batches(client):
+    with client.websocket_connect('/ws?protocol=binary') as ws:
+        assert ws.receive_json()['status'] == 'connected'
+
+        ws.send_json({'type': 'entity_decisions_batch', 'ids': [], 'inputs': []})
+        assert ws.receive_json()['decisions'] == []
+
+        ws.send_bytes(request_frame([]))
+        assert decode_decision_result(ws.receive_bytes())['action_probabilities'].shape == (0, settings.NN_OUTPUT_SIZE)
+
+        # Neighbours of entities without client states come from vision updates
+        ws.send_json({'type': 'entity_decisions_batch', 'ids': [404], 'inputs': [[0.0] * settings.NN_INPUT_SIZE]})
+        reply = ws.receive_json()
+        assert reply['type'] == 'error' and '404' in reply['error']
+
+        ws.send_bytes(request_frame([405], states=False))
+        reply = ws.receive_json()
+        assert reply['type'] == 'error' and '405' in reply['error']
+
+        ws.send_bytes(b"too short")
+        assert ws.receive_json()['type'] == 'error'
+
+        # Still connected after every error
+        ws.send_bytes(request_frame([1]))
+        assert decode_decision_result(ws.receive_bytes())['entity_ids'].tolist() == [1]
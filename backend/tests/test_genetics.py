@@ -0,0 +1,60 @@
+import asyncio
+import torch
+from app.core.brain_bank import BrainBank
+from app.core.genetics import GeneticsEngine
+from app.core.neural_network import EntityBrain
+from app.services.brain_service import BrainService
+
+
+def make_bank(**kwargs) -> BrainBank:
+    return BrainBank(EntityBrain.from_settings(), torch.device("cpu"), **kwargs)
+
+
+def stacked(bank: BrainBank, entity_ids):
+    state_dicts = [bank.state_dict(entity_id) for entity_id in entity_ids]
+    return {name: torch.stack([state_dict[name] for state_dict in state_dicts]) for name in state_dicts[0]}
+
+
+def assert_same(actual: dict, expected: dict):
+    assert list(actual) == list(expected)
+    for name, tensor in expected.items():
+        assert torch.equal(actual[name], tensor), name
+
+
+def test_seeded_reproduce_is_deterministic():
+    bank = make_bank()
+    bank.add_random([1, 2, 3, 4])
+    parents1, parents2 = stacked(bank, [1, 2]), stacked(bank, [3, 4])
+    genetics = GeneticsEngine(bank.shapes, bank.device)
+
+    first = genetics.reproduce(parents1, parents2, mutation_rate=0.5, seed=11)
+    # Unseeded calls in between do not shift a seeded one
+    genetics.reproduce(parents1, parents2, mutation_rate=0.5)
+    assert_same(genetics.reproduce(parents1, parents2, mutation_rate=0.5, seed=11), first)
+    assert_same(GeneticsEngine(bank.shapes, bank.device).reproduce(parents1, parents2, mutation_rate=0.5, seed=11), first)
+
+    other = genetics.reproduce(parents1, parents2, mutation_rate=0.5, seed=12)
+    assert any(not torch.equal(other[name], first[name]) for name in first)
+
+
+def test_reproduce_batch_reads_spilled_parents_intact(tmp_path):
+    service = BrainService()
+    # Fewer resident brains than parents, so reading them spills and faults in
+    service.bank = make_bank(capacity=2, max_resident=2, spill_dir=str(tmp_path))
+    bank = service.bank
+    bank.add_random([1, 2, 3, 4])
+    weights = {entity_id: bank.state_dict(entity_id) for entity_id in (1, 2, 3, 4)}
+    # First parents resident in adjacent slots, so reading them gives views; second ones spilled
+    bank.slots_for([3, 4])
+    parent1_ids = sorted([3, 4], key=bank.slots.get)
+    parent2_ids = [1, 2]
+    expected = service.genetics.reproduce(
+        *({name: torch.stack([weights[entity_id][name] for entity_id in ids]) for name in weights[1]}
+          for ids in (parent1_ids, parent2_ids)),
+        mutation_rate=0.5, seed=5
+    )
+
+    result = asyncio.run(service.reproduce_batch(parent1_ids, parent2_ids, [5, 6], seed=5, mutation_rate=0.5))
+    assert result['created'] == 2
+    assert_same(stacked(bank, [5, 6]), expected)
+    assert bank.cache_stats()['resident'] <= 2
@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def test_request_latency_is_labelled_by_route_template():
+    with TestClient(app) as client:
+        for entity_id in (5, 6):
+            client.get(f"/api/entities/{entity_id}")
+        client.get("/health")
+        client.get("/no/such/path")
+        exposition = client.get("/metrics").text
+
+    series = [line for line in exposition.splitlines() if line.startswith("http_request_seconds_count")]
+    assert any('route="/api/entities/{entity_id}"' in line for line in series)
+    assert any('route="/health"' in line for line in series)
+    assert any('route="unmatched"' in line for line in series)
+    assert not any("/api/entities/5" in line or "/api/entities/6" in line for line in series)
@@ -0,0 +1,38 @@
+import asyncio
+from app.services.entity_service import EntityService
+from app.services.statistics_services import StatisticsService
+
+
+def make_stats() -> StatisticsService:
+    entities = EntityService()
+    for entity_id in (1, 2):
+        entities.add_entity(entity_id, {'society_name': 'Harmonists', 'generation': entity_id})
+    return StatisticsService(entities)
+
+
+def test_sampler_records_without_a_simulation_loop():
+    stats = make_stats()
+
+    async def run():
+        assert stats.start_sampler(interval=0.01)
+        assert not stats.start_sampler(interval=0.01)
+        await asyncio.sleep(0.1)
+        assert await stats.stop_sampler()
+        assert not await stats.stop_sampler()
+
+    asyncio.run(run())
+    series = stats.get_evolution_metrics()['series']
+    assert len(series['population']) >= 2
+    assert set(series['population']) == {2}
+    assert series['max_generation'][-1] == 2
+    assert series['time'] == sorted(series['time']) and series['time'][0] > 0
+
+
+def test_sampler_leaves_sampling_to_a_ticking_loop():
+    stats = make_stats()
+    stats.record_sample(5.0)
+    # A loop sampled just now
+    assert not stats.sample_if_idle(60.0)
+    assert stats.sample_if_idle(0.0)
+    times = stats.get_evolution_metrics()['series']['time']
+    assert len(times) == 2 and times[1] >= 5.0
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.services.vision_service import VisionService, society_codes
+
+
+def test_unknown_societies_are_named():
+    assert society_codes(['Circles', 'Triangles']) == [1, 0]
+    with pytest.raises(ValueError, match="Nomads"):
+        society_codes(['Triangles', 'Nomads', 'Nomads'])
+
+
+def test_vision_rejects_unknown_societies_without_changes():
+    vision = VisionService()
+    with pytest.raises(ValueError, match="Nomads"):
+        vision.update_entities([1, 2], [0.0, 1.0], [0.0, 1.0], ['Triangles', 'Nomads'])
+    with pytest.raises(ValueError):
+        vision.observe([1])
+    with pytest.raises(ValueError, match="Nomads"):
+        vision.consume_food([0.0], [0.0], ['Nomads'], np.ones((1, 4)), 10.0)
+
+
+def test_websocket_reports_unknown_societies():
+    from app.main import app
+    with TestClient(app) as client, client.websocket_connect('/ws') as ws:
+        assert ws.receive_json()['status'] == 'connected'
+        ws.send_json({'type': 'vision_update', 'entities': {
+            'ids': [1], 'x': [0.0], 'y': [0.0], 'societies': ['Nomads']
+        }})
+        reply = ws.receive_json()
+        assert reply['type'] == 'error' and 'Nomads' in reply['error']
+        # Still connected
+        ws.send_json({'type': 'entity_decisions_batch', 'ids': [], 'inputs': []})
+        assert ws.receive_json()['decisions'] == []
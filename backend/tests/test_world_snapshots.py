@@ -0,0 +1,32 @@
+import asyncio
+import torch
+from app.core.brain_bank import BrainBank
+from app.core.neural_network import EntityBrain
+from tests.worlds import assert_same_brains, brains_of, entities_of, scramble
+
+
+def test_snapshot_round_trip(world):
+    entities = entities_of(world)
+    brains = brains_of(world)
+
+    saved = asyncio.run(world.save_world({'tick': 12}, "round_trip"))
+    assert saved["entities"] == 3 and saved["brains"] == 3
+    scramble(world)
+
+    assert asyncio.run(world.load_world(saved["filename"])) == {'tick': 12}
+    assert entities_of(world) == entities
+    assert_same_brains(brains_of(world), brains)
+
+
+def test_load_rejects_another_architecture(world):
+    saved = asyncio.run(world.save_world({}, "other_architecture"))
+    asyncio.run(world.save_checkpoint({}, "other_architecture"))
+    entities = entities_of(world)
+    kwargs = dict(world.brain_service.bank.brain_kwargs, hidden_size=8, hidden_sizes=None)
+    world.brain_service.bank = BrainBank(EntityBrain(**kwargs), torch.device("cpu"))
+
+    assert asyncio.run(world.load_world(saved["filename"])) is None
+    assert asyncio.run(world.load_checkpoint("other_architecture")) is None
+    # Refused before anything was replaced
+    assert entities_of(world) == entities
+    assert len(world.brain_service.bank) == 0
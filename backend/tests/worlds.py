@@ -0,0 +1,48 @@
+import torch
+from app.services.brain_service import BrainService
+from app.services.entity_service import EntityService
+from app.services.world_service import WorldService
+
+ENTITY_IDS = [1, 2, 3]
+
+
+def make_world() -> WorldService:
+    """Three entities with brains, in their own stores"""
+    entities = EntityService()
+    for entity_id in ENTITY_IDS:
+        entities.add_entity(entity_id, {
+            'x': entity_id * 10.0,
+            'y': -entity_id,
+            'energy': 50.0 + entity_id,
+            'society_name': 'Harmonists',
+            'children_ids': [entity_id + 100]
+        })
+    brains = BrainService()
+    brains.bank.add_random(ENTITY_IDS)
+    return WorldService(brains, entity_service=entities)
+
+
+def entities_of(world: WorldService) -> dict:
+    return {entity_id: world.entity_service.get_entity(entity_id) for entity_id in world.entity_service.get_all_entity_ids()}
+
+
+def brains_of(world: WorldService) -> dict:
+    bank = world.brain_service.bank
+    return {entity_id: bank.state_dict(entity_id) for entity_id in sorted(bank.entity_ids())}
+
+
+def assert_same_brains(actual: dict, expected: dict):
+    assert list(actual) == list(expected)
+    for entity_id, state_dict in expected.items():
+        for name, tensor in state_dict.items():
+            assert torch.equal(actual[entity_id][name], tensor), (entity_id, name)
+
+
+def scramble(world: WorldService):
+    """Replace everything a load should restore"""
+    world.entity_service.clear_all()
+    world.entity_service.add_entity(99, {'x': 1.0})
+    bank = world.brain_service.bank
+    for entity_id in bank.entity_ids():
+        bank.remove(entity_id)
+    bank.add_random([99])
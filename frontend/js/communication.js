@@ -1,19 +1,43 @@
+// Binary decision frames, see backend/app/utils/binary_protocol.py
+const BINARY_PROTOCOL_VERSION = 1;
+const FRAME_HEADER_SIZE = 16;
+const DECISION_REQUEST = 1;
+const DECISION_RESULT = 2;
+const FLAG_STATES = 1;
+const STATE_FIELDS = [
+    'nearby_food', 'food_x', 'food_y',
+    'nearby_enemies', 'enemy_x', 'enemy_y',
+    'nearby_allies', 'ally_x', 'ally_y'
+];
+const ACTION_TYPES = ['wander', 'gather', 'fight', 'mate', 'socialize'];
+
 class BackendCommunication {
     constructor() {
         this.ws = null;
         this.messageCallbacks = new Map();
+        // Set once the server confirms binary frames in connection_response
+        this.binary = false;
+        this.sequence = 0;
         this.connect();
     }
     
     connect() {
-        this.ws = new WebSocket('ws://localhost:8000/ws');
+        this.ws = new WebSocket('ws://localhost:8000/ws?protocol=binary');
+        this.ws.binaryType = 'arraybuffer';
         
         this.ws.onopen = () => {
             console.log('Connected to FastAPI backend');
         };
         
         this.ws.onmessage = (event) => {
+            if (event.data instanceof ArrayBuffer) {
+                this.decodeDecisionResult(event.data).forEach(decision => this.handleMessage(decision));
+                return;
+            }
             const data = JSON.parse(event.data);
+            if (data.type === 'connection_response') {
+                this.binary = data.protocol === 'binary' && data.binary_version === BINARY_PROTOCOL_VERSION;
+            }
             this.handleMessage(data);
         };
         
@@ -46,10 +70,72 @@ class BackendCommunication {
     
     send(data) {
         if (this.ws && this.ws.readyState === WebSocket.OPEN) {
-            this.ws.send(JSON.stringify(data));
+            this.ws.send(data instanceof ArrayBuffer ? data : JSON.stringify(data));
         }
     }
     
+    encodeDecisionRequest(ids, inputs, states) {
+        // inputs: one array per entity, states: one object per entity
+        const count = ids.length;
+        const width = inputs[0].length;
+        const buffer = new ArrayBuffer(FRAME_HEADER_SIZE + count * (8 + 4 * width + 4 * STATE_FIELDS.length));
+        const header = new DataView(buffer);
+        header.setUint8(0, 'E'.charCodeAt(0));
+        header.setUint8(1, 'V'.charCodeAt(0));
+        header.setUint8(2, BINARY_PROTOCOL_VERSION);
+        header.setUint8(3, DECISION_REQUEST);
+        header.setUint16(4, FLAG_STATES, true);
+        header.setUint16(6, width, true);
+        header.setUint32(8, count, true);
+        header.setUint32(12, this.sequence++ >>> 0, true);
+        
+        let offset = FRAME_HEADER_SIZE;
+        new BigInt64Array(buffer, offset, count).set(ids.map(id => BigInt(id)));
+        offset += 8 * count;
+        new Float32Array(buffer, offset, count * width).set(inputs.flat());
+        offset += 4 * count * width;
+        new Float32Array(buffer, offset, count * STATE_FIELDS.length).set(
+            states.flatMap(state => STATE_FIELDS.map(field => state[field] || 0))
+        );
+        return buffer;
+    }
+    
+    decodeDecisionResult(buffer) {
+        // Same shape as JSON decision_result messages, one per entity
+        const header = new DataView(buffer);
+        const width = header.getUint16(6, true);
+        const count = header.getUint32(8, true);
+        
+        let offset = FRAME_HEADER_SIZE;
+        const ids = new BigInt64Array(buffer, offset, count);
+        offset += 8 * count;
+        const probs = new Float32Array(buffer, offset, count * width);
+        offset += 4 * count * width;
+        const targetX = new Float32Array(buffer, offset, count);
+        offset += 4 * count;
+        const targetY = new Float32Array(buffer, offset, count);
+        offset += 4 * count;
+        const actions = new Uint8Array(buffer, offset, count);
+        offset += count;
+        const hasTarget = new Uint8Array(buffer, offset, count);
+        
+        const decisions = [];
+        for (let i = 0; i < count; i++) {
+            const action = { type: ACTION_TYPES[actions[i]], vx: 0, vy: 0 };
+            if (hasTarget[i]) {
+                action.target_x = targetX[i];
+                action.target_y = targetY[i];
+            }
+            decisions.push({
+                type: 'decision_result',
+                entity_id: Number(ids[i]),
+                action: action,
+                action_probabilities: Array.from(probs.subarray(i * width, (i + 1) * width))
+            });
+        }
+        return decisions;
+    }
+    
     async getEntityDecision(entity, entities, resources) {
         return new Promise((resolve) => {
             // inputs for neural network 
@@ -135,23 +221,29 @@ class BackendCommunication {
             
             this.on('decision_result', callback);
             
-            this.send({
-                type: 'entity_decision',
-                id: entity.id,
-                inputs: inputs,
-                state: {
-                    energy: entity.energy,
-                    nearby_food: this.countNearbyFood(entity, resources),
-                    food_x: foodX,
-                    food_y: foodY,
-                    nearby_enemies: this.countNearbyEnemies(entity, entities),
-                    enemy_x: enemyX,
-                    enemy_y: enemyY,
-                    nearby_allies: this.countNearbyAllies(entity, entities),
-                    ally_x: allyX,
-                    ally_y: allyY
-                }
-            });
+            const state = {
+                energy: entity.energy,
+                nearby_food: this.countNearbyFood(entity, resources),
+                food_x: foodX,
+                food_y: foodY,
+                nearby_enemies: this.countNearbyEnemies(entity, entities),
+                enemy_x: enemyX,
+                enemy_y: enemyY,
+                nearby_allies: this.countNearbyAllies(entity, entities),
+                ally_x: allyX,
+                ally_y: allyY
+            };
+            
+            if (this.binary) {
+                this.send(this.encodeDecisionRequest([entity.id], [inputs], [state]));
+            } else {
+                this.send({
+                    type: 'entity_decision',
+                    id: entity.id,
+                    inputs: inputs,
+                    state: state
+                });
+            }
         });
     }
     